@@ -0,0 +1,124 @@
+# ack_store.py
+# 喊话“己知晓”记录：(chat_id, message_id) 编码为一个整数，按记录时间先进先出 + TTL 限制条数，合并写入 ack.json，重启不丢
+import os
+import json
+import time
+import atexit
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from datastore import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+ACK_FILE = os.getenv("ACK_FILE", "ack.json")
+ACK_MAX = int(os.getenv("ACK_MAX", "20000"))                # 最多保留的知晓记录
+ACK_TTL = int(os.getenv("ACK_TTL_DAYS", "30")) * 86400      # 知晓记录保留时间（秒）
+ACK_BROADCASTS_KEEP = 50                                    # 保留最近多少次喊话的元信息
+ACK_FLUSH_DELAY = 2.0
+
+
+def ack_key(chat_id: int, message_id: int) -> int:
+    """chat_id 放高位、message_id 放低 32 位，拼成一个整数键"""
+    return (int(chat_id) << 32) | (int(message_id) & 0xFFFFFFFF)
+
+
+class AckStore:
+    """
+    ack.json 结构：
+    {"acks": [[key, 喊话id, 时间], ...]（按记录时间，最早的在前）, "broadcasts": {喊话id: {label, targets, at}}}
+    喊话都是私聊消息，(chat_id, message_id) 即可确定是哪位用户
+    """
+
+    def __init__(self, path: str = ACK_FILE, max_size: int = ACK_MAX, ttl: int = ACK_TTL):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.acks: "OrderedDict[int, Tuple[int, int]]" = OrderedDict()   # key -> (喊话id, 时间)
+        self.broadcasts: Dict[int, dict] = {}
+        self._dirty = False
+        self._flush_handle = None
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("ack.json 读取失败: %s", e)
+            return
+        # 按时间排序：旧版文件重复知晓时会把记录挪到末尾，顺序不一定按时间
+        for key, bid, at in sorted(data.get("acks", []), key=lambda a: a[2]):
+            self.acks[key] = (bid, at)
+        self.broadcasts = {int(k): v for k, v in data.get("broadcasts", {}).items()}
+        self._evict()
+
+    # ---------- 喊话 ----------
+    def new_broadcast(self, label: str, targets: int) -> int:
+        """登记一次喊话，返回写进按钮 callback_data 的整数 id"""
+        bid = int(time.time() * 1000)
+        while bid in self.broadcasts:
+            bid += 1
+        self.broadcasts[bid] = {"label": label[:30], "targets": targets, "at": int(time.time())}
+        for old in sorted(self.broadcasts)[:-ACK_BROADCASTS_KEEP]:
+            del self.broadcasts[old]
+        self._mark_dirty()
+        return bid
+
+    # ---------- 知晓 ----------
+    def add(self, chat_id: int, message_id: int, bid: int = 0) -> bool:
+        """记录一次知晓；已记录过返回 False（不改动原记录，保持按时间排列，TTL 淘汰才能从头部依次进行）"""
+        key = ack_key(chat_id, message_id)
+        if key in self.acks:
+            return False
+        self.acks[key] = (bid, int(time.time()))
+        self._evict()
+        self._mark_dirty()
+        return True
+
+    def _evict(self):
+        while len(self.acks) > self.max_size:
+            self.acks.popitem(last=False)
+        cutoff = time.time() - self.ttl
+        while self.acks:
+            key, (_, at) = next(iter(self.acks.items()))
+            if at >= cutoff:
+                break
+            self.acks.popitem(last=False)
+
+    def counts(self, limit: int = 10) -> List[Tuple[int, dict, int]]:
+        """最近的喊话及其知晓人数：[(喊话id, 元信息, 知晓数)]，新的在前"""
+        per_bid: Dict[int, int] = {}
+        for bid, _ in self.acks.values():
+            per_bid[bid] = per_bid.get(bid, 0) + 1
+        recent = sorted(self.broadcasts, reverse=True)[:limit]
+        return [(bid, self.broadcasts[bid], per_bid.get(bid, 0)) for bid in recent]
+
+    # ---------- 落盘 ----------
+    def _mark_dirty(self):
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(ACK_FLUSH_DELAY, self.flush)
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+        data = {
+            "acks": [[key, bid, at] for key, (bid, at) in self.acks.items()],
+            "broadcasts": self.broadcasts,
+        }
+        atomic_write_json(self.path, data, indent=None)
+        self._dirty = False
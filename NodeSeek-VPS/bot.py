@@ -1,15 +1,13 @@
 # bot.py
 import os
 import json
+import shutil
 import logging
-import random
 import asyncio
 import telegram
-import tempfile
-import shutil
-import subprocess
 from datetime import datetime, time
 from zoneinfo import ZoneInfo
+from urllib.parse import quote
 from dotenv import load_dotenv
 from telegram import (
     Update, BotCommand, InlineKeyboardButton, InlineKeyboardMarkup
@@ -18,39 +16,43 @@ from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler,
     ContextTypes, CallbackContext
 )
-from nodeseek_login import login_and_get_cookie
+from nodeseek_login_async import solve_login_token, use_token_pool, solver, flaresolverr
+from node_pool import NodePool
+from datastore import open_store, ensure_user_structure, STORAGE_BACKEND
+from rollup import DailyRollup, render_summary
+from cookie_health import CookieHealthChecker, COOKIE_CHECK_INTERVAL, COOKIE_CHECK_LEAD, minutes_until_slot
+from turnstile_pool import TurnstilePool, predicted_demand, TURNSTILE_POOL_HORIZON
+from session_pool import pool as session_pool
+from slot_scheduler import SlotScheduler, slot_of
+from slot_planner import SlotPlanner, slot_text
+from singleflight import flights
+from broadcast import Broadcaster
+from menu_sync import MenuSync, DEFAULT_SCOPE, GROUP_SCOPE, chat_scope
+from ack_store import AckStore
+from delete_scheduler import DeleteScheduler
+from outbox import Outbox
+from coordinator import Coordinator
+import metrics
+from metrics import STATS_SECONDS
 
 # ========== 配置 ==========
 load_dotenv()
 TOKEN = os.getenv("TG_BOT_TOKEN")
 ADMIN_IDS = [int(s.strip()) for s in os.getenv("ADMIN_IDS", "").split(",") if s.strip()]
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()   # polling | webhook（webhook 配置见 webhook.py）
 
 DATA_FILE = "data.json"
+# stats.js 的本地信用账本：<LEDGER_DIR>/<uid>/<账号>.json，相对路径以脚本目录为准（与 Node 进程的 cwd 一致）
+LEDGER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.getenv("LEDGER_DIR", "ledger"))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def ensure_user_structure(data, uid):
-    """
-    确保用户数据结构完整，避免 KeyError
-    """
-    if uid not in data["users"]:
-        data["users"][uid] = {}
-
-    u = data["users"][uid]
-
-    if "accounts" not in u:
-        u["accounts"] = {}
-    if "mode" not in u:
-        u["mode"] = False   # 默认模式
-    if "tgUsername" not in u:
-        u["tgUsername"] = ""
-    if "sign_hour" not in u:   # 默认签到时间
-        u["sign_hour"] = 0
-    if "sign_minute" not in u:
-        u["sign_minute"] = 0
+# 常驻 Node 进程池（sign.js / stats.js），大小由 NODE_POOL_SIZE 配置
+node_pool = NodePool()
 
-    return u
+# 签到 / 收益查询的执行方：WORKER_SHARDS>0 时按 uid 分片交给 sign_worker.py 进程；登录始终在本进程内
+coordinator = Coordinator(node_pool)
 
 # ========== 数据存取 ==========
 def ensure_file(file_path, default):
@@ -59,49 +61,59 @@ def ensure_file(file_path, default):
         with open(file_path, "w", encoding="utf-8") as f:
             json.dump(default, f, indent=2, ensure_ascii=False)
 
-def save_data(data):
-    """安全保存 JSON 数据"""
-    with tempfile.NamedTemporaryFile("w", delete=False, encoding="utf-8") as tf:
-        json.dump(data, tf, indent=2, ensure_ascii=False)
-        tempname = tf.name
-    shutil.move(tempname, DATA_FILE)
+# 进程内唯一的数据缓存，所有 handler 共享同一份 data（STORAGE_BACKEND=sqlite 时使用 SQLite）
+store = open_store(DATA_FILE)
 
-def load_data():
-    """加载数据并自动修复缺失字段"""
-    if not os.path.exists(DATA_FILE):
-        return {"users": {}}
+# 当日签到汇总（rollup.json），由 append_user_log 增量更新
+rollup = DailyRollup()
 
-    try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except json.JSONDecodeError:
-        print("⚠️ data.json 损坏，已重置为空")
-        data = {"users": {}}
-        save_data(data)
-        return data
+# 签到前 Cookie 巡检，失效的提前刷新
+cookie_checker = CookieHealthChecker(store, coordinator.login)
 
-    changed = False
-    for uid in data.get("users", {}):
-        before = json.dumps(data["users"][uid], sort_keys=True)
-        ensure_user_structure(data, uid)
-        after = json.dumps(data["users"][uid], sort_keys=True)
-        if before != after:
-            changed = True
+def turnstile_demand() -> int:
+    """预测近期需要的 Turnstile token 数：巡检窗口 + 预测窗口内将签到的账号，加上其中已探测到 cookie 失效的账号"""
+    now = datetime.now(beijing)
+    horizon = COOKIE_CHECK_LEAD + TURNSTILE_POOL_HORIZON
+    upcoming = {
+        uid: len(u.get("accounts", {}))
+        for uid, u in store.users().items()
+        if minutes_until_slot(u, now) <= horizon
+    }
+    return predicted_demand(sum(upcoming.values()), cookie_checker.pending_stale(upcoming))
 
-    if changed:
-        save_data(data)  # 🔥 写回文件，保证 data.json 补齐
+# 预求解 Turnstile token 池，登录时直接取用
+token_pool = TurnstilePool(solve_login_token, turnstile_demand)
+use_token_pool(token_pool)
 
-    return data
+def save_data(data, uid=None):
+    """标记改动（可指定 uid），由 store 合并后原子落盘"""
+    store.save(data, uid)
+
+def load_data():
+    """返回缓存数据（文件被外部修改时自动重新加载并补齐缺失字段）"""
+    return store.load()
 
 
-# 初始化空文件
-ensure_file(DATA_FILE, {"users": {}})
+# 初始化空文件（仅 JSON 后端；SQLite 后端不需要 data.json）
+if STORAGE_BACKEND != "sqlite":
+    ensure_file(DATA_FILE, {"users": {}})
 
     
 # ========== 工具 ==========
 def is_admin(user_id: str) -> bool:
     return int(user_id) in ADMIN_IDS
 
+def delete_ledger(uid: str, name: str = None):
+    """删除 stats.js 的信用账本：指定账号只删该账号，否则删除该用户的全部账本（文件名编码同 encodeURIComponent）"""
+    user_dir = os.path.join(LEDGER_DIR, quote(str(uid), safe="!~*'()"))
+    if name is None:
+        shutil.rmtree(user_dir, ignore_errors=True)
+        return
+    try:
+        os.remove(os.path.join(user_dir, quote(name, safe="!~*'()") + ".json"))
+    except FileNotFoundError:
+        pass
+
 def mask_username(name: str) -> str:
     if len(name) <= 2:
         return name[0] + "***" + (name[1] if len(name) > 1 else "")
@@ -111,39 +123,19 @@ def mode_text(mode: bool) -> str:
     return "随机模式" if mode else "固定模式"
 
 async def notify_admins(app, message: str):
-    for admin_id in ADMIN_IDS:
-        try:
-            await app.bot.send_message(admin_id, message)
-        except:
-            pass
+    """管理员事件：合并进定时摘要，由 outbox 限速发送"""
+    outbox.admin_event(message)
 
 
 async def send_and_auto_delete(chat, text: str, delay: int, user_msg=None):
     # 机器人发送的消息
     sent = await chat.send_message(text)
-    print(f"Bot message sent: {sent.message_id}")  # 日志输出，确认消息发送
-
-    async def _delete_later():
-        print(f"Waiting {delay} seconds before deleting.")  # 日志输出，确认延时
-        await asyncio.sleep(delay)
-
-        # 删掉机器人回复
-        try:
-            await sent.delete()
-            print(f"Deleted bot message: {sent.message_id}")  # 日志输出，确认删除
-        except Exception as e:
-            print(f"Failed to delete bot message {sent.message_id}: {e}")  # 日志输出错误
-
-        # 删掉用户命令消息
-        if user_msg:
-            try:
-                await user_msg.delete()
-                print(f"Deleted user command message: {user_msg.message_id}")  # 日志输出，确认删除
-            except Exception as e:
-                print(f"Failed to delete user message {user_msg.message_id}: {e}")  # 日志输出错误
-
-    # 创建后台任务，不阻塞主流程
-    asyncio.create_task(_delete_later())
+
+    # delay 秒后删掉机器人回复和用户命令消息（由 deleter 统一调度，重启后仍会删除）
+    message_ids = [sent.message_id]
+    if user_msg:
+        message_ids.append(user_msg.message_id)
+    deleter.schedule(chat.id, message_ids, delay)
     return sent
 
 
@@ -152,8 +144,7 @@ def require_account(func):
     """装饰器：限制命令必须绑定账号"""
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user_id = str(update.effective_user.id)
-        data = load_data()
-        if user_id not in data.get("users", {}) or not data["users"][user_id].get("accounts"):
+        if not store.has_accounts(user_id):
             return await send_and_auto_delete(update.message.chat, "⚠️ 无效指令，请添加账号后使用", 3, user_msg=update.message)
         return await func(update, context, *args, **kwargs)
     return wrapper
@@ -175,8 +166,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /stats - 签到统计(默认30天)
 /settime - 自动签到时间（范围 0–10 点）
 /txt  - 管理喊话
+/solver - 验证码服务状态
+/slots - 签到时段负载
+/acks  - 喊话知晓统计
 ------- 【说 明】 --------
-默认每天0 - 0时5分随机时间签到
+默认自动分配空闲时段，在该时间后5分钟内随机签到
 check 格式(/check)所以账号
 check 格式(/check TGID,账号)指定用户的账号
 add 格式(/add 账号@密码)
@@ -189,6 +183,9 @@ stats 格式(/stats 天数)所有账号的指定天数
 settime 格式(/settime 7:00)
 txt 格式(/txt 内容)全体喊话
 txt 格式(/txt TGID,内容)指定喊话
+solver 查看验证码服务状态
+slots 查看每个时段的签到人数
+acks 查看最近喊话的知晓人数
 -------------------------"""
     else:
         text = """欢迎使用 NodeSeek 签到机器人！
@@ -203,7 +200,7 @@ txt 格式(/txt TGID,内容)指定喊话
 /stats - 签到统计(默认30天)
 /settime - 自动签到时间（范围 0–10 点）
 ------- 【说 明】 --------
-默认每天0 - 0时5分随机时间签到
+默认自动分配空闲时段，在该时间后5分钟内随机签到
 check 格式(/check)所以账号
 check 格式(/check 账号)指定账号
 add 格式(/add 账号@密码)
@@ -244,11 +241,23 @@ async def cmd_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
     account_name = account.strip()
     password = password.strip()
 
+    # 已有账号的用户再添加新账号：所在时段也要有容量，已满则提示先换时段（登录前检查，免得白登录）
+    existing = store.user(user_id)
+    if existing and existing.get("accounts") and account_name not in existing["accounts"]:
+        slot = slot_of(existing)
+        accounts = len(existing["accounts"]) + 1
+        if not slot_planner.fits(slot, accounts, slot_planner.load(exclude_uid=user_id)):
+            suggestions = slot_planner.nearby(slot, accounts, exclude_uid=user_id)
+            text = f"⚠️ 你的签到时段 {slot_text(slot)} 已满，无法再添加账号"
+            if suggestions:
+                text += "\n可先用 /settime 换到: " + "、".join(slot_text(s) for s in suggestions)
+            return await send_and_auto_delete(update.message.chat, text, 10, user_msg=update.message)
+
     # 发送临时提示消息
     temp_msg = await update.message.chat.send_message(f"➡️ 正在为 {account_name} 登录...")
 
     # 调用登录逻辑
-    new_cookie = login_and_get_cookie(account_name, password)
+    new_cookie = await coordinator.login(account_name, password)
     if not new_cookie:
         await temp_msg.delete()
         await send_and_auto_delete(update.message.chat, "❌ 登录失败，请检查账号密码", 3, user_msg=update.message)
@@ -259,14 +268,14 @@ async def cmd_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 判断是否是首次添加账号（原本没有用户，或者没有账号）
     is_first_account = user_id not in data["users"] or not data["users"][user_id].get("accounts")
 
-    if user_id not in data["users"]:
-        data["users"][user_id] = {
-            "accounts": {},
-            "mode": False,
-            "tgUsername": tg_username
-        }
-    else:
-        data["users"][user_id]["tgUsername"] = tg_username
+    ensure_user_structure(data, user_id)
+    data["users"][user_id]["tgUsername"] = tg_username
+
+    # 首个账号 → 分配当前最空闲的签到时段，避开 0 点高峰
+    if is_first_account:
+        hour, minute = slot_planner.least_loaded(exclude_uid=user_id)
+        data["users"][user_id]["sign_hour"] = hour
+        data["users"][user_id]["sign_minute"] = minute
 
     # 写入账户信息
     data["users"][user_id]["accounts"][account_name] = {
@@ -275,37 +284,34 @@ async def cmd_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "cookie": new_cookie
     }
 
-    save_data(data)
+    save_data(data, user_id)
+
+    # 首次添加的用户加入其签到时段
+    slot_scheduler.update(user_id)
 
-    # 🚀 如果是首次添加账号 → 刷新菜单
+    # 🚀 如果是首次添加账号 → 刷新该用户的菜单
     if is_first_account:
-        await post_init(context.application)
+        await menu_sync.sync_chat(context.bot, user_id)
 
     # 删除 "正在登录" 提示
     await temp_msg.delete()
 
-    # 创建用户日志文件 date/<TGID>.json，如果不存在就初始化为空 logs
-    import os, json
-    log_file = f"./data/{user_id}.json"
-    os.makedirs(os.path.dirname(log_file), exist_ok=True)  # 确保 data 目录存在
-    if not os.path.exists(log_file):
-        with open(log_file, "w", encoding="utf-8") as f:
-            json.dump({"logs": []}, f, ensure_ascii=False, indent=2)
+    # 创建用户日志（data/<TGID>.jsonl），如果不存在就初始化为空
+    store.init_logs(user_id)
 
     # 给用户反馈
     await send_and_auto_delete(
         update.message.chat,
-        f"✅ 账号 {account_name} 成功获取 Cookie",
+        f"✅ 账号 {account_name} 成功获取 Cookie" + (
+            f"\n⏰ 已分配每日签到时间 {slot_text(slot_of(data['users'][user_id]))} (北京时间)，可用 /settime 修改"
+            if is_first_account else ""
+        ),
         180,
         user_msg=update.message
     )
 
-    # 通知所有管理员成功情况
-    for admin_id in ADMIN_IDS:
-        await context.bot.send_message(
-            chat_id=admin_id,
-            text=f"✅ 用户 {tg_username or user_id} 添加账号 {account_name}"
-        )
+    # 通知所有管理员成功情况（合并进管理员摘要）
+    await notify_admins(context.application, f"✅ 用户 {tg_username or user_id} 添加账号 {account_name}")
 
 
 # ========== /del ==========
@@ -323,39 +329,32 @@ async def delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if args not in data["users"]:
                 return await send_and_auto_delete(update.message.chat, "⚠️ 未找到用户", 3, user_msg=update.message)
             del data["users"][args]
-            save_data(data)
+            save_data(data, args)
 
-            # 删除用户日志
-            log_file = f"./data/{args}.json"
-            if os.path.exists(log_file):
-                os.remove(log_file)
+            # 删除用户日志与信用账本
+            store.delete_logs(args)
+            delete_ledger(args)
+            slot_scheduler.remove(args)
 
-            await post_init(context.application)
-            await context.bot.set_my_commands(
-                [BotCommand("start", "显示帮助"), BotCommand("add", "添加账号")],
-                scope=telegram.BotCommandScopeChat(int(args))
-            )
+            await menu_sync.sync_chat(context.bot, args)
             return await send_and_auto_delete(update.message.chat, f"✅ 已删除用户 {args} 的所有账号", 15, user_msg=update.message)
         else:  # 按账号名删
-            for uid, u in list(data["users"].items()):
+            for uid in store.find_account_owners(args):
+                u = data["users"][uid]
                 if args in u["accounts"]:
                     del u["accounts"][args]
+                    delete_ledger(uid, args)
                     if not u["accounts"]:
                         del data["users"][uid]
-                        save_data(data)
+                        save_data(data, uid)
 
                         # 删除日志
-                        log_file = f"./data/{uid}.json"
-                        if os.path.exists(log_file):
-                            os.remove(log_file)
-
-                        await post_init(context.application)
-                        await context.bot.set_my_commands(
-                            [BotCommand("start", "显示帮助"), BotCommand("add", "添加账号")],
-                            scope=telegram.BotCommandScopeChat(int(uid))
-                        )
+                        store.delete_logs(uid)
+                        slot_scheduler.remove(uid)
+
+                        await menu_sync.sync_chat(context.bot, uid)
                     else:
-                        save_data(data)
+                        save_data(data, uid)
                     await notify_admins(context.application, f"管理员 {tgUsername} 删除了账号: {args}")
                     return await send_and_auto_delete(update.message.chat, f"✅ 已删除账号: {args}", 15, user_msg=update.message)
             return await send_and_auto_delete(update.message.chat, "⚠️ 未找到账号", 3)
@@ -366,40 +365,32 @@ async def delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if args == "-all":
             deleted = list(data["users"][user_id]["accounts"].keys())
             del data["users"][user_id]
-            save_data(data)
+            save_data(data, user_id)
 
-            # 删除日志
-            log_file = f"./data/{user_id}.json"
-            if os.path.exists(log_file):
-                os.remove(log_file)
+            # 删除日志与信用账本
+            store.delete_logs(user_id)
+            delete_ledger(user_id)
+            slot_scheduler.remove(user_id)
 
-            await post_init(context.application)
-            await context.bot.set_my_commands(
-                [BotCommand("start", "显示帮助"), BotCommand("add", "添加账号")],
-                scope=telegram.BotCommandScopeChat(int(user_id))
-            )
+            await menu_sync.sync_chat(context.bot, user_id)
             await notify_admins(context.application, f"用户 {tgUsername} 删除了所有账号: {', '.join(deleted)}")
             return await send_and_auto_delete(update.message.chat, f"🗑 已删除所有账号: {', '.join(deleted)}", 15, user_msg=update.message)
         else:
             if args not in data["users"][user_id]["accounts"]:
                 return await send_and_auto_delete(update.message.chat, "⚠️ 未找到账号", 3, user_msg=update.message)
             del data["users"][user_id]["accounts"][args]
+            delete_ledger(user_id, args)
             if not data["users"][user_id]["accounts"]:
                 del data["users"][user_id]
-                save_data(data)
+                save_data(data, user_id)
 
                 # 删除日志
-                log_file = f"./data/{user_id}.json"
-                if os.path.exists(log_file):
-                    os.remove(log_file)
-
-                await post_init(context.application)
-                await context.bot.set_my_commands(
-                    [BotCommand("start", "显示帮助"), BotCommand("add", "添加账号")],
-                    scope=telegram.BotCommandScopeChat(int(user_id))
-                )
+                store.delete_logs(user_id)
+                slot_scheduler.remove(user_id)
+
+                await menu_sync.sync_chat(context.bot, user_id)
             else:
-                save_data(data)
+                save_data(data, user_id)
             await notify_admins(context.application, f"用户 {tgUsername} 删除了账号: {args}")
             return await send_and_auto_delete(update.message.chat, f"🗑 已删除账号: {args}", 15, user_msg=update.message)
 
@@ -413,7 +404,7 @@ async def mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
         data["users"][user_id] = {"accounts": {}, "logs": [], "mode": False}
     if args in ["true", "false"]:
         data["users"][user_id]["mode"] = args == "true"
-        save_data(data)
+        save_data(data, user_id)
         await send_and_auto_delete(update.message.chat, f"✅ 签到模式: {mode_text(data['users'][user_id]['mode'])}", 5, user_msg=update.message)
     else:
         await send_and_auto_delete(update.message.chat, "⚠️ 参数错误，应为 /mode true 或 /mode false", 5, user_msg=update.message)
@@ -477,20 +468,10 @@ async def log(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return await send_and_auto_delete(update.message.chat, f"⚠️ 账号 {filter_acc} 没有找到或未绑定 Cookie", 5, user_msg=update.message)
         return await send_and_auto_delete(update.message.chat, "⚠️ 你所有账号都没有绑定 Cookie，无法查询", 5, user_msg=update.message)
 
-    payload = {"targets": targets, "days": days}
-
     waiting_msg = await update.message.chat.send_message("⏳ 正在查询中，请稍候...")
 
     try:
-        res = subprocess.run(
-            ["node", "stats.js", json.dumps(payload)],
-            capture_output=True, text=True, timeout=60
-        )
-        if res.returncode != 0:
-            await waiting_msg.delete()
-            return await send_and_auto_delete(update.message.chat, f"⚠️ stats.js 执行失败: {res.stderr}", 3, user_msg=update.message)
-
-        results = json.loads(res.stdout)
+        results = await query_stats(targets, days)
     except Exception as e:
         await waiting_msg.delete()
         return await send_and_auto_delete(update.message.chat, f"⚠️ 查询异常: {e}", 3, user_msg=update.message)
@@ -519,121 +500,92 @@ async def log(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await waiting_msg.delete()
     await send_and_auto_delete(update.message.chat, text, 20, user_msg=update.message)
     
-# ================= 单个账号重试签到 =================
-async def retry_sign_if_invalid(uid, acc_name, res, data, mode):
-    # 仅在第一次失败时才尝试刷新 cookie
-    if "🚫 响应解析失败" not in res["result"]:
-        return res  # 成功或其他错误，不重试
-
-    logging.warning("[%s] %s cookie 失效，尝试自动刷新...", uid, acc_name)
+# ================= 调用 sign.js 并自动刷新 cookie =================
+def sign_succeeded(r: dict) -> bool:
+    """只缓存签到成功 / 已签到的结果；失败结果再次 /check 时应重新签到"""
+    result = str(r.get("result", ""))
+    return "收益" in result or "已签到" in result
 
-    account = data["users"][uid]["accounts"][acc_name]
-    username, password = account["username"], account["password"]
 
-    # 调用自动登录获取新 cookie
-    new_cookie = login_and_get_cookie(username, password)
-    if not new_cookie:
-        logging.error("[%s] %s cookie 刷新失败", uid, acc_name)
-        return {**res, "result": "🚫 Cookie 刷新失败", "no_log": True}
+async def run_sign_and_fix(targets, user_modes, data):
+    """
+    同一账号同时只签到一次：已在签到中（或刚签完）的账号直接共享那次的结果，
+    共享来的结果带 coalesced 标记，不重复写日志
+    """
+    keys = [(uid, name) for uid, accounts in targets.items() for name in accounts]
 
-    # 保存新 cookie
-    account["cookie"] = new_cookie
-    save_data(data)
+    async def run(owned):
+        owned_targets = {}
+        for uid, name in owned:
+            owned_targets.setdefault(uid, {})[name] = targets[uid][name]
+        results = await _run_sign_and_fix(owned_targets, user_modes, data)
+        return {(uid, r["name"]): r for uid, logs in results.items() for r in logs}
 
-    # ⚡ 再跑一次签到
-    payload = {
-        "targets": {uid: {acc_name: new_cookie}},
-        "userModes": {uid: mode}
-    }
+    by_key, shared = await flights.batch("sign", keys, run, cache_if=sign_succeeded)
 
-    try:
-        proc = subprocess.run(
-            ["node", "sign.js", json.dumps(payload, ensure_ascii=False)],
-            capture_output=True,
-            text=True,
-            timeout=60,
-        )
-        if proc.returncode != 0:
-            logging.error("sign.js 重试执行失败: %s", proc.stderr.strip())
-            return {**res, "result": "🚫 Cookie 刷新后签到失败", "no_log": True}
-
-        retry_results = json.loads(proc.stdout)
-        retry_res = retry_results.get(uid, [{}])[0]
+    results = {}
+    for key in keys:
+        r = by_key.get(key)
+        if r is None:
+            continue
+        if key in shared:
+            r = {**r, "coalesced": True}
+        results.setdefault(key[0], []).append(r)
+    return results
 
-        # ✅ 在结果里直接加上刷新标记
-        retry_res["cookie_refreshed"] = True
-        return retry_res
 
-    except Exception as e:
-        logging.error("sign.js 重试调用异常: %s", e)
-        return {**res, "result": "🚫 Cookie 刷新后签到异常", "no_log": True}
+async def _run_sign_and_fix(targets, user_modes, data):
+    # 签到任务只带 cookie；cookie 失效时 coordinator 再按需取账号密码重新登录
+    cookies = {uid: {name: acc["cookie"] for name, acc in accounts.items()} for uid, accounts in targets.items()}
 
+    def credentials(uid, name):
+        return data["users"].get(uid, {}).get("accounts", {}).get(name)
 
-# ================= 调用 sign.js 并自动刷新 cookie =================
-async def run_sign_and_fix(targets, user_modes, data):
-    results = {}
+    results = await coordinator.sign(cookies, user_modes, credentials)
 
-    # 转换为 sign.js 需要的格式 {账号名: cookie字符串}
-    targets_for_js = {
-        uid: {name: acc["cookie"] for name, acc in accounts.items()}
-        for uid, accounts in targets.items()
-    }
-    payload = {"targets": targets_for_js, "userModes": user_modes}
+    # worker 不写 data.json，刷新得到的 cookie 在这里保存
+    for uid, logs in results.items():
+        for r in logs:
+            new_cookie = r.pop("new_cookie", None)
+            account = data["users"].get(uid, {}).get("accounts", {}).get(r.get("name"))
+            if new_cookie and account:
+                account["cookie"] = new_cookie
+                save_data(data, uid)
 
-    try:
-        proc = subprocess.run(
-            ["node", "sign.js", json.dumps(payload, ensure_ascii=False)],
-            capture_output=True,
-            text=True,
-            timeout=120,
-        )
-        if proc.returncode != 0:
-            logging.error("sign.js 执行失败: %s", proc.stderr.strip())
-            return {}
+    return results
 
-        results = json.loads(proc.stdout)
-    except Exception as e:
-        logging.error("调用 sign.js 异常: %s", e)
-        return {}
 
-    # ✅ 遍历每个账号，失败则重试，最终结果全部保留
-    for uid, logs in results.items():
-        fixed_logs = []
-        for res in logs:
-            acc_name = res["name"]
-            mode = user_modes.get(uid, False)
+# ================= 调用 stats.js =================
+async def query_stats(targets, days):
+    """查询签到收益；同一账号同一天数的并发查询合并为一次"""
+    keys = [(uid, name, days) for uid, accounts in targets.items() for name in accounts]
 
-            fixed_res = await retry_sign_if_invalid(uid, acc_name, res, data, mode)
-            fixed_logs.append(fixed_res)  # ✅ 不管是否重试成功，最终记录成功的
+    async def run(owned):
+        owned_targets = {}
+        for uid, name, _ in owned:
+            owned_targets.setdefault(uid, {})[name] = targets[uid][name]
+        results = await coordinator.stats(owned_targets, days)
+        return {(uid, r["name"], days): r for uid, logs in results.items() for r in logs}
 
-        results[uid] = fixed_logs
+    with STATS_SECONDS.time(stage="total"):
+        by_key, _ = await flights.batch("stats", keys, run)
 
+    results = {}
+    for key in keys:
+        if key in by_key:
+            results.setdefault(key[0], []).append(by_key[key])
     return results
 
 
 # ================= 写入日志函数 =================
 def append_user_log(tgid: str, log_entry: dict):
-    """在 data/<TGID>.json 里追加日志，只记录含“收益”的日志"""
-    # 只记录含收益的日志
-    if "收益" not in str(log_entry.get("result", "")):
+    """追加用户签到日志（保留最近 30 条），只记录含“收益”的日志"""
+    # 只记录含收益的日志；与其他签到合并的结果已由那一方记录
+    if "收益" not in str(log_entry.get("result", "")) or log_entry.get("coalesced"):
         return
 
-    path = f"./data/{tgid}.json"
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            user_data = json.load(f)
-    else:
-        user_data = {"logs": []}
-
-    user_data.setdefault("logs", [])
-    user_data["logs"].append(log_entry)
-    # 只保留最近 10 条
-    user_data["logs"] = user_data["logs"][-30:]
-
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(user_data, f, indent=2, ensure_ascii=False)
+    store.append_log(tgid, log_entry)
+    rollup.record(tgid, log_entry)
 
 # ================= 时间工具 =================
 beijing = ZoneInfo("Asia/Shanghai")
@@ -708,44 +660,69 @@ async def check(update: Update, context: ContextTypes.DEFAULT_TYPE):
         pass
 
 # ================= 定时签到 =================
-async def user_daily_check(app: Application, uid: str):
-    uid = str(uid)  # 🔥 确保 uid 是字符串
+async def sign_slot_batch(batch):
+    """执行一个时段子批次：batch = {uid: [账号名]}，签到时重新读取数据，跳过已删除的账号"""
     data = load_data()
-    u = data["users"].get(uid)
-    if not u or not u.get("accounts"):
-        return
-
-    delay = random.randint(0, 5 * 60)
-    await asyncio.sleep(delay)
-
-    targets = {uid: u["accounts"]}
-    user_modes = {uid: u.get("mode")}
+    targets, user_modes = {}, {}
+    for uid, names in batch.items():
+        u = data["users"].get(uid)
+        if not u:
+            continue
+        accounts = {n: u["accounts"][n] for n in names if n in u.get("accounts", {})}
+        if accounts:
+            targets[uid] = accounts
+            user_modes[uid] = u.get("mode")
+    if not targets:
+        return {}
 
     # 执行签到（含重试逻辑）
     results = await run_sign_and_fix(targets, user_modes, data)
     results = {str(k): v for k, v in results.items()}  # 保底处理
 
-    # ✅ 写入日志到 ./data/<TGID>.json
-    for r in results.get(uid, []):
-        append_user_log(uid, {
-            **r,
-            "source": "auto",
-            "time": now_str(),
-            "by": "system"
-        })
-
-    # ✅ 推送结果给用户
-    text = f"📋 自动签到结果（{mode_text(user_modes[uid])}）：\n"
-    for r in results.get(uid, []):
+    # ✅ 写入用户签到日志
+    for uid, logs in results.items():
+        for r in logs:
+            append_user_log(uid, {
+                **r,
+                "source": "auto",
+                "time": now_str(),
+                "by": "system"
+            })
+    return results
+
+
+async def notify_user_results(app: Application, uid: str, logs: list):
+    """用户本时段所有账号签到完成后推送一次结果"""
+    if not logs:
+        return
+    u = store.user(uid) or {}
+    text = f"📋 自动签到结果（{mode_text(u.get('mode', False))}）：\n"
+    for r in logs:
         line = f"{mask_username(r['name'])} - {r['result']}"
         if r.get("cookie_refreshed"):
             line += " [♻️ Cookie]"
         text += line + "\n"
 
-    try:
-        await app.bot.send_message(chat_id=uid, text=text)
-    except Exception:
-        pass
+    outbox.send(uid, text)
+
+
+# 按 (小时, 分钟) 分桶的签到调度
+slot_scheduler = SlotScheduler(store, sign_slot_batch, notify_user_results)
+
+# 签到时段容量规划
+slot_planner = SlotPlanner(store)
+
+# /txt 群发（限速、可续发）
+broadcaster = Broadcaster()
+
+# 喊话“己知晓”记录（有上限、持久化）
+ack_store = AckStore()
+
+# 自动删除消息的统一调度
+deleter = DeleteScheduler()
+
+# 出站通知：管理员事件定时汇总，用户通知合并后限速发送
+outbox = Outbox(ADMIN_IDS)
 
 # ========== /txt ==========
 async def txt(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -789,9 +766,10 @@ async def txt(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 user_msg=update.message
             )
 
+        bid = ack_store.new_broadcast(content, 1)
         keyboard = [[
             InlineKeyboardButton("去回复", url="https://t.me/SerokBot_bot"),
-            InlineKeyboardButton("己知晓", callback_data=f"ack_{user_id}")
+            InlineKeyboardButton("己知晓", callback_data=f"ack_{user_id}_{bid}")
         ]]
 
         await context.application.bot.send_message(
@@ -807,38 +785,22 @@ async def txt(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user_msg=update.message
         )
 
-    # 群发
-    sent = 0
-    for uid in data["users"]:
-        if uid == user_id:  # 不给自己发
-            continue
-
-        keyboard = [[
-            InlineKeyboardButton("去回复", url="https://t.me/SerokBot_bot"),
-            InlineKeyboardButton("己知晓", callback_data=f"ack_{user_id}")
-        ]]
-
-        try:
-            await context.application.bot.send_message(
-                uid,
-                f"📢 管理员 {admin_name} 喊话:\n{args}",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-            sent += 1
-        except Exception as e:
-            logger.warning(f"发送失败: {uid}, 错误: {e}")
-
-    await send_and_auto_delete(
-        update.message.chat,
-        f"✅ 已发送 {sent} 个用户",
-        10,
-        user_msg=update.message
+    # 群发 → 交给后台限速发送，进度消息实时更新
+    targets = [uid for uid in data["users"] if uid != user_id]  # 不给自己发
+    bid = ack_store.new_broadcast(args, len(targets))
+    keyboard = [[
+        InlineKeyboardButton("去回复", url="https://t.me/SerokBot_bot"),
+        InlineKeyboardButton("己知晓", callback_data=f"ack_{user_id}_{bid}")
+    ]]
+    await broadcaster.start(
+        context.application,
+        f"📢 管理员 {admin_name} 喊话:\n{args}",
+        targets,
+        update.message.chat.id,
+        InlineKeyboardMarkup(keyboard)
     )
 
 
-# 存放 每条喊话消息 -> 已确认的用户集合
-acknowledged_users = {}
-
 # ========== ack_callback ==========
 async def ack_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -849,26 +811,17 @@ async def ack_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not data.startswith("ack_"):
         return
 
-    admin_id = int(data.split("_")[1])  # 转 int 确保 send_message 不报错
-    key = (query.message.chat.id, query.message.message_id)
+    # ack_<管理员ID>_<喊话ID>，旧消息没有喊话 ID
+    parts = data.split("_")
+    admin_id = int(parts[1])  # 转 int 确保 send_message 不报错
+    bid = int(parts[2]) if len(parts) > 2 else 0
 
-    if key not in acknowledged_users:
-        acknowledged_users[key] = set()
-
-    if user_id in acknowledged_users[key]:
+    if not ack_store.add(query.message.chat.id, query.message.message_id, bid):
         await query.answer("⚠️ 你已知晓", show_alert=True)
         return
 
-    acknowledged_users[key].add(user_id)
-
-    # 通知管理员
-    try:
-        await context.application.bot.send_message(
-            admin_id,
-            f"📣 用户 {username} 已知晓喊话内容"
-        )
-    except Exception as e:
-        logger.warning(f"通知管理员失败: {admin_id}, 错误: {e}")
+    # 通知管理员（合并进该管理员的摘要）
+    outbox.admin_event(f"📣 用户 {username} 已知晓喊话内容", [admin_id])
 
     await query.answer("✅ 已知晓")
 
@@ -902,97 +855,61 @@ async def hz(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await admin_daily_summary(context.application, target_admin_id=chat_id)
 
 
-# ================= 每日汇总 =================
+# ================= 管理员每日汇总 =================
 async def admin_daily_summary(app: Application, target_admin_id: str = None):
     data = load_data()
     today = now_str()[:10]  # e.g. "2025-08-30"
 
-    text = "📋 今日签到成功汇总:\n"
-    any_user_shown = False
-
-    for uid, u in data.get("users", {}).items():
-        # 从 ./data/<TGID>.json 读取日志
-        log_file = f"./data/{uid}.json"
-        if os.path.exists(log_file):
-            with open(log_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
-                logs = user_data.get("logs", [])
-        else:
-            logs = []
-
-        # 只取今天 + 含“收益”的记录
-        todays = [
-            l for l in logs
-            if l.get("time", "")[:10] == today
-            and "收益" in str(l.get("result", ""))
-        ]
-        if not todays:
-            continue
-
-        any_user_shown = True
-        text += f"\n👤 {u.get('tgUsername', uid)}【{mode_text(u.get('mode', False))}】\n🆔 {uid}\n"
+    # 直接读取内存中的当日汇总，无文件 I/O
+    text = render_summary(rollup.today(today), data.get("users", {}), mode_text, mask_username)
 
-        for r in todays:
-            tag = "[手动]" if r.get("source") == "manual" else "[自动]"
-            line = f"{tag} {r['result']} - {mask_username(r['name'])}"
-            if r.get("cookie_refreshed"):
-                line += "  ♻️"
-            text += line + "\n"
+    # ✅ 只推送给指定管理员，或者推送给所有管理员
+    for admin_id in ([target_admin_id] if target_admin_id else ADMIN_IDS):
+        outbox.send(admin_id, text)
 
-    if not any_user_shown:
-        text += "\n（今天暂无签到收益记录）"
 
-    # ✅ 发送方式：指定管理员或所有管理员
-    if target_admin_id:
-        await app.bot.send_message(chat_id=target_admin_id, text=text)
-    else:
-        await notify_admins(app, text)
+# ================= /solver =================
+async def solver_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = str(update.effective_user.id)
+    if not is_admin(user_id):
+        return
 
-    
-# ================= 管理员每日汇总 =================
-async def admin_daily_summary(app: Application, target_admin_id: str = None):
-    data = load_data()
-    today = now_str()[:10]  # e.g. "2025-08-30"
+    pool = token_pool.stats()
+    sessions = session_pool.stats()
+    text = (
+        f"{solver.report()}\n\n"
+        f"🎫 预求解 token 池: 可用 {pool['ready']} / 求解中 {pool['inflight']}\n"
+        f"命中 {pool['hits']}  未命中 {pool['misses']}  过期 {pool['expired']}\n\n"
+        f"🌐 FlareSolverr: 会话 {len(flaresolverr.sessions)}  clearance 命中 {flaresolverr.hits} / 渲染 {flaresolverr.misses}\n"
+        f"🔌 HTTP 会话池: 空闲 {sessions['idle']}  共享 {sessions['shared']}  新建 {sessions['created']}  复用 {sessions['reused']}\n"
+        f"🧩 {coordinator.status_text()}"
+    )
+    await send_and_auto_delete(update.message.chat, text, 30, user_msg=update.message)
 
-    text = "📋 今日签到成功汇总:\n"
-    any_user_shown = False
 
-    for uid, u in data.get("users", {}).items():
-        log_file = f"./data/{uid}.json"
-        if os.path.exists(log_file):
-            with open(log_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
-                logs = user_data.get("logs", [])
-        else:
-            logs = []
-
-        # 只取今天的签到收益
-        todays = [
-            l for l in logs
-            if l.get("time", "")[:10] == today
-            and "收益" in str(l.get("result", ""))
-        ]
-        if not todays:
-            continue
+# ================= /acks =================
+async def acks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = str(update.effective_user.id)
+    if not is_admin(user_id):
+        return
 
-        any_user_shown = True
-        text += f"\n👤 {u.get('tgUsername', uid)}【{mode_text(u.get('mode', False))}】\n🆔 {uid}\n"
+    rows = ack_store.counts()
+    if not rows:
+        return await send_and_auto_delete(update.message.chat, "📭 暂无喊话记录", 5, user_msg=update.message)
 
-        for r in todays:
-            tag = "[手动]" if r.get("source") == "manual" else "[自动]"
-            line = f"{tag} {r['result']} - {mask_username(r['name'])}"
-            if r.get("cookie_refreshed"):
-                line += "  ♻️"
-            text += line + "\n"
+    text = "📣 最近喊话知晓情况:\n"
+    for bid, meta, count in rows:
+        at = datetime.fromtimestamp(meta["at"], beijing).strftime("%m-%d %H:%M")
+        text += f"\n{at}  {meta['label']}\n   ✅ 已知晓 {count} / {meta['targets']}\n"
+    await send_and_auto_delete(update.message.chat, text, 30, user_msg=update.message)
 
-    if not any_user_shown:
-        text += "\n（今天暂无签到收益记录）"
 
-    # ✅ 只推送给指定管理员，或者推送给所有管理员
-    if target_admin_id:
-        await app.bot.send_message(chat_id=target_admin_id, text=text)
-    else:
-        await notify_admins(app, text)
+# ================= /slots =================
+async def slots(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = str(update.effective_user.id)
+    if not is_admin(user_id):
+        return
+    await send_and_auto_delete(update.message.chat, slot_planner.histogram(), 30, user_msg=update.message)
 
 
 # ========== 用户设置签到时间 ==========
@@ -1021,32 +938,26 @@ async def settime(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not (0 <= minute < 60):
         return await send_and_auto_delete(update.message.chat, "⚠️ 分钟必须是 0–59", 3, user_msg=update.message)
 
+    # 容量检查：目标时段已满时给出附近的空闲时段
+    accounts = len(data["users"][user_id].get("accounts", {}))
+    if not slot_planner.fits((hour, minute), accounts, slot_planner.load(exclude_uid=user_id)):
+        suggestions = slot_planner.nearby((hour, minute), accounts, exclude_uid=user_id)
+        text = f"⚠️ {hour:02d}:{minute:02d} 签到人数已满"
+        if suggestions:
+            text += "，附近可选: " + "、".join(slot_text(s) for s in suggestions)
+        return await send_and_auto_delete(update.message.chat, text, 10, user_msg=update.message)
+
     # 保存用户设置
     data["users"][user_id]["sign_hour"] = hour
     data["users"][user_id]["sign_minute"] = minute
-    save_data(data)
+    save_data(data, user_id)
 
     await send_and_auto_delete(update.message.chat, f"✅ 已设置每日签到时间为 {hour:02d}:{minute:02d} (北京时间)", 10, user_msg=update.message)
 
-    # ⚡️ 重新注册用户的定时任务
-    app: Application = context.application
-    job_name = f"user_{user_id}_daily_check"
-
-    # 移除旧任务
-    old_jobs = app.job_queue.get_jobs_by_name(job_name)
-    for j in old_jobs:
-        j.schedule_removal()
-
-    # 添加新任务（北京时间）
-    app.job_queue.run_daily(
-        lambda ctx, uid=user_id: asyncio.create_task(user_daily_check(app, uid)),
-        time=time(hour=hour, minute=minute, tzinfo=beijing),
-        name=job_name
-    )
+    # ⚡️ 只把该用户移到新的时段
+    slot_scheduler.update(user_id)
 
 def register_jobs(app: Application):
-    data = load_data()
-
     # 管理员汇总任务 → 每天 11:00 (北京时间)
     async def admin_job(context: CallbackContext):
         await admin_daily_summary(app)
@@ -1057,19 +968,32 @@ def register_jobs(app: Application):
         name="admin_summary"
     )
 
-    # 用户签到任务 (每个用户自己的时间)
-    for uid, u in data.get("users", {}).items():
-        hour = u.get("sign_hour")
-        minute = u.get("sign_minute")
+    # Cookie 巡检任务 → 每 COOKIE_CHECK_INTERVAL 秒检查即将签到的账号
+    async def cookie_job(context: CallbackContext):
+        await cookie_checker.run_once()
 
-        async def user_job(context: CallbackContext, user_id=uid):
-            await user_daily_check(app, user_id)
+    app.job_queue.run_repeating(
+        cookie_job,
+        interval=COOKIE_CHECK_INTERVAL,
+        first=60,
+        name="cookie_health"
+    )
 
-        app.job_queue.run_daily(
-            user_job,
-            time=time(hour=hour, minute=minute, tzinfo=beijing),  # ⚡ 加上 tzinfo
-            name=f"user_{uid}_daily_check"
-        )
+    # FlareSolverr 维护 → 销毁空闲浏览器会话、清理过期 clearance
+    async def flaresolverr_job(context: CallbackContext):
+        await flaresolverr.destroy_idle()
+
+    app.job_queue.run_repeating(flaresolverr_job, interval=300, first=300, name="flaresolverr_gc")
+
+    # HTTP 会话池维护 → 关闭空闲的 keep-alive 连接，清理过期的合并结果
+    async def session_job(context: CallbackContext):
+        await session_pool.evict_idle()
+        flights.purge()
+
+    app.job_queue.run_repeating(session_job, interval=120, first=120, name="session_gc")
+
+    # 用户签到任务 → 按签到时段分桶，每个时段一个任务
+    slot_scheduler.attach(app.job_queue)
 
 # ================= 签到收益统计 =================
 @require_account
@@ -1095,21 +1019,11 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not targets[user_id]:
         return await send_and_auto_delete(update.message.chat, "⚠️ 你所有账号都没有绑定 Cookie，无法查询", 3, user_msg=update.message)
 
-    payload = {"targets": targets, "days": days}
-
     # 发送等待提示（群里不会是回复）
     waiting_msg = await update.message.chat.send_message("⏳ 正在查询中，请稍候...")
 
     try:
-        res = subprocess.run(
-            ["node", "stats.js", json.dumps(payload)],
-            capture_output=True, text=True, timeout=60
-        )
-        if res.returncode != 0:
-            await waiting_msg.delete()
-            return await send_and_auto_delete(update.message.chat, f"⚠️ stats.js 执行失败: {res.stderr}", 3, user_msg=update.message)
-
-        results = json.loads(res.stdout)
+        results = await query_stats(targets, days)
     except Exception as e:
         await waiting_msg.delete()
         return await send_and_auto_delete(update.message.chat, f"⚠️ 查询异常: {e}", 3, user_msg=update.message)
@@ -1133,93 +1047,126 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await waiting_msg.delete()
     await send_and_auto_delete(update.message.chat, text, 20, user_msg=update.message)
 
-# ========== 设置命令菜单 ==========
-async def post_init(application: Application):
-    data = load_data()
-
-    # 普通用户菜单
-    user_no_acc = [
-        BotCommand("start", "显示帮助"),
-        BotCommand("add", "添加账号"),
-    ]
-    user_with_acc = [
-        BotCommand("start", "显示帮助"),
-        BotCommand("check", "手动签到"),
-        BotCommand("add", "添加账号"),
-        BotCommand("del", "删除账号"),
-        BotCommand("mode", "签到模式"),
-        BotCommand("list", "账号列表"),
-        BotCommand("log", "签到记录"),
-        BotCommand("stats", "签到统计"),
-        BotCommand("settime", "设置每日签到时间 (0–10点)"),
-    ]
-
-    # 管理员菜单
-    admin_no_acc = [
-        BotCommand("start", "显示帮助"),
-        BotCommand("check", "手动签到"),
-        BotCommand("add", "添加账号"),
-        BotCommand("del", "删除账号"),
-        BotCommand("list", "账号列表"),
-        BotCommand("hz", "每日汇总"),
-        BotCommand("txt", "管理员喊话"),
-    ]
-    admin_with_acc = [
-        BotCommand("start", "显示帮助"),
-        BotCommand("check", "手动签到"),
-        BotCommand("add", "添加账号"),
-        BotCommand("del", "删除账号"),
-        BotCommand("mode", "签到模式"),
-        BotCommand("list", "账号列表"),
-        BotCommand("log", "签到记录"),
-        BotCommand("settime", "设置每日签到时间 (0–10点)"),
-        BotCommand("stats", "签到统计"),
-        BotCommand("hz", "每日汇总"),
-        BotCommand("txt", "管理员喊话"),
-    ]
-
-    # 🚀 群聊统一菜单（不包含 /hz 和 /txt）
-    group_commands = [
-        BotCommand("start", "显示帮助"),
-        BotCommand("check", "手动签到"),
-        BotCommand("add", "添加账号"),
-        BotCommand("del", "删除账号"),
-        BotCommand("mode", "签到模式"),
-        BotCommand("list", "账号列表"),
-        BotCommand("log", "签到记录"),
-        BotCommand("stats", "签到统计"),
-        BotCommand("settime", "设置每日签到时间 (0–10点)"),
-    ]
-    await application.bot.set_my_commands(group_commands, scope=telegram.BotCommandScopeAllGroupChats())
-
-    # 默认：普通用户未绑定账号（私聊场景）
-    await application.bot.set_my_commands(user_no_acc)
-
-    # 为每个已知用户设置专属菜单（私聊）
-    for uid, u in data.get("users", {}).items():
-        has_account = u.get("accounts")
-        if int(uid) in ADMIN_IDS:
-            commands = admin_with_acc if has_account else admin_no_acc
-        else:
-            commands = user_with_acc if has_account else user_no_acc
-
-        await application.bot.set_my_commands(
-            commands,
-            scope=telegram.BotCommandScopeChat(int(uid))
-        )
-
-    # 处理未绑定账号的管理员（私聊）
+# ========== 命令菜单 ==========
+# 普通用户菜单
+USER_NO_ACC = [
+    BotCommand("start", "显示帮助"),
+    BotCommand("add", "添加账号"),
+]
+USER_WITH_ACC = [
+    BotCommand("start", "显示帮助"),
+    BotCommand("check", "手动签到"),
+    BotCommand("add", "添加账号"),
+    BotCommand("del", "删除账号"),
+    BotCommand("mode", "签到模式"),
+    BotCommand("list", "账号列表"),
+    BotCommand("log", "签到记录"),
+    BotCommand("stats", "签到统计"),
+    BotCommand("settime", "设置每日签到时间 (0–10点)"),
+]
+
+# 管理员菜单
+ADMIN_NO_ACC = [
+    BotCommand("start", "显示帮助"),
+    BotCommand("check", "手动签到"),
+    BotCommand("add", "添加账号"),
+    BotCommand("del", "删除账号"),
+    BotCommand("list", "账号列表"),
+    BotCommand("hz", "每日汇总"),
+    BotCommand("txt", "管理员喊话"),
+    BotCommand("solver", "验证码服务状态"),
+    BotCommand("slots", "签到时段负载"),
+    BotCommand("acks", "喊话知晓统计"),
+]
+ADMIN_WITH_ACC = [
+    BotCommand("start", "显示帮助"),
+    BotCommand("check", "手动签到"),
+    BotCommand("add", "添加账号"),
+    BotCommand("del", "删除账号"),
+    BotCommand("mode", "签到模式"),
+    BotCommand("list", "账号列表"),
+    BotCommand("log", "签到记录"),
+    BotCommand("settime", "设置每日签到时间 (0–10点)"),
+    BotCommand("stats", "签到统计"),
+    BotCommand("hz", "每日汇总"),
+    BotCommand("txt", "管理员喊话"),
+    BotCommand("solver", "验证码服务状态"),
+    BotCommand("slots", "签到时段负载"),
+    BotCommand("acks", "喊话知晓统计"),
+]
+
+# 🚀 群聊统一菜单（不包含 /hz 和 /txt）
+GROUP_COMMANDS = [
+    BotCommand("start", "显示帮助"),
+    BotCommand("check", "手动签到"),
+    BotCommand("add", "添加账号"),
+    BotCommand("del", "删除账号"),
+    BotCommand("mode", "签到模式"),
+    BotCommand("list", "账号列表"),
+    BotCommand("log", "签到记录"),
+    BotCommand("stats", "签到统计"),
+    BotCommand("settime", "设置每日签到时间 (0–10点)"),
+]
+
+
+def menu_for_chat(uid: str):
+    """私聊菜单：按是否管理员、是否已绑定账号选择"""
+    has_account = store.has_accounts(uid)
+    if int(uid) in ADMIN_IDS:
+        return ADMIN_WITH_ACC if has_account else ADMIN_NO_ACC
+    return USER_WITH_ACC if has_account else USER_NO_ACC
+
+
+def desired_menus():
+    """全部 scope 应有的菜单：群聊、默认（普通用户未绑定账号）、每个已知用户和管理员的私聊"""
+    menus = {GROUP_SCOPE: GROUP_COMMANDS, DEFAULT_SCOPE: USER_NO_ACC}
+    for uid in store.users():
+        menus[chat_scope(uid)] = menu_for_chat(uid)
     for admin_id in ADMIN_IDS:
-        if str(admin_id) not in data.get("users", {}):
-            await application.bot.set_my_commands(
-                admin_no_acc,
-                scope=telegram.BotCommandScopeChat(admin_id)
-            )
+        menus.setdefault(chat_scope(admin_id), menu_for_chat(str(admin_id)))
+    return menus
+
+
+# 只推送有变化的菜单，全量同步仅在启动时后台执行
+menu_sync = MenuSync(desired_menus, menu_for_chat)
+
+
+async def on_startup(application: Application):
+    await metrics.start()
+    menu_sync.start(application.bot)
+    deleter.start(application.bot)
+    outbox.start(application.bot)
+    store.start_background()
+    token_pool.start()
+    broadcaster.resume(application)
+    await coordinator.start()
+    if not rollup.loaded:
+        rollup.rebuild(now_str()[:10], store.logs_on)
+
+
+async def post_shutdown(application: Application):
+    await menu_sync.stop()
+    await deleter.stop()
+    await outbox.stop()
+    await broadcaster.stop()
+    await coordinator.stop()
+    await token_pool.stop()
+    await flaresolverr.close()
+    await session_pool.close()
+    await node_pool.stop()
+    await store.stop_background()
+    rollup.flush()
+    ack_store.flush()
+    await metrics.stop()
 
 
 # ========== 启动 ==========
 def main():
-    app = Application.builder().token(TOKEN).post_init(post_init).build()
+    builder = Application.builder().token(TOKEN).post_init(on_startup).post_shutdown(post_shutdown)
+    if BOT_MODE == "webhook":
+        import webhook   # 在 load_dotenv 之后导入，WEBHOOK_* 才能读到 .env
+        builder = builder.update_queue(webhook.update_queue())
+    app = builder.build()
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("check", check))
@@ -1232,12 +1179,18 @@ def main():
     app.add_handler(CommandHandler("settime", settime))
     app.add_handler(CommandHandler("stats", stats))
     app.add_handler(CommandHandler("txt", txt))
+    app.add_handler(CommandHandler("solver", solver_status))
+    app.add_handler(CommandHandler("slots", slots))
+    app.add_handler(CommandHandler("acks", acks))
     app.add_handler(CallbackQueryHandler(ack_callback))
 
 # ✅ 定时任务注册
     register_jobs(app)
 
-    app.run_polling()
+    if BOT_MODE == "webhook":
+        asyncio.run(webhook.run_webhook(app))
+    else:
+        app.run_polling()
 
 if __name__ == "__main__":
     import asyncio
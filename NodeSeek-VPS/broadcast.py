@@ -0,0 +1,231 @@
+# broadcast.py
+# /txt 群发：全局 + 单聊天限速、RetryAfter 退避、进度持久化（重启后续发）、实时编辑进度消息
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+from datastore import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_FILE = os.getenv("BROADCAST_FILE", "broadcast.json")
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))                   # 全局每秒消息数（Telegram 上限约 30）
+BROADCAST_CHAT_INTERVAL = float(os.getenv("BROADCAST_CHAT_INTERVAL", "1"))  # 同一聊天两条消息的最小间隔（秒）
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))                # 同时发送的协程数
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "3"))  # 进度消息刷新间隔（秒）
+BROADCAST_SAVE_INTERVAL = float(os.getenv("BROADCAST_SAVE_INTERVAL", "2"))  # 进度落盘间隔（秒）
+BROADCAST_MAX_ATTEMPTS = 3   # 网络错误的重试次数
+
+
+def retry_after_seconds(e: RetryAfter) -> float:
+    """RetryAfter.retry_after 在不同 PTB 版本里是 int 或 timedelta"""
+    value = e.retry_after
+    return value.total_seconds() if hasattr(value, "total_seconds") else float(value)
+
+
+class SendLimiter:
+    """全局按固定间隔放行（不超过 rate 条/秒），同一聊天至少间隔 chat_interval 秒；RetryAfter 时整体暂停"""
+
+    def __init__(self, rate: float = BROADCAST_RATE, chat_interval: float = BROADCAST_CHAT_INTERVAL):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.chat_interval = chat_interval
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+        self.chat_next: Dict[str, float] = {}
+
+    async def acquire(self, chat_id):
+        chat_id = str(chat_id)
+        loop = asyncio.get_running_loop()
+
+        # 先排单聊天的位置，再排全局的位置
+        now = loop.time()
+        at = max(now, self.chat_next.get(chat_id, 0.0))
+        self.chat_next[chat_id] = at + self.chat_interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+        while True:
+            now = loop.time()
+            if self.paused_until > now:
+                await asyncio.sleep(self.paused_until - now)   # 暂停期间可能被再次延长，醒来后重新检查
+                continue
+            at = max(now, self.next_slot)
+            self.next_slot = at + self.interval
+            break
+        if at > now:
+            await asyncio.sleep(at - now)
+
+        if len(self.chat_next) > 10000:
+            now = loop.time()
+            self.chat_next = {k: v for k, v in self.chat_next.items() if v > now}
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, asyncio.get_running_loop().time() + seconds)
+
+
+# 进程内共享，群发与其他批量推送共用同一额度
+limiter = SendLimiter()
+
+
+class Broadcaster:
+    """
+    任务结构（broadcast.json，仅保存未完成的任务）：
+    {id: {text, markup, admin_chat, progress_msg, targets, results: {uid: "sent" | "failed"}, created}}
+    重启时未记录结果的目标会重新发送，崩溃瞬间正在发送的少量消息可能重复
+    """
+
+    def __init__(self, path: str = BROADCAST_FILE, limiter: SendLimiter = limiter):
+        self.path = path
+        self.limiter = limiter
+        self.jobs: Dict[str, dict] = self._load()
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._last_progress: Dict[str, str] = {}   # 避免内容未变时重复编辑
+        self._saved_at = 0.0
+
+    def _load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("broadcast.json 读取失败: %s", e)
+            return {}
+
+    def _save(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._saved_at < BROADCAST_SAVE_INTERVAL:
+            return
+        self._saved_at = now
+        try:
+            atomic_write_json(self.path, self.jobs)
+        except OSError as e:
+            logger.error("保存群发进度失败: %s", e)
+
+    # ---------- 对外接口 ----------
+    async def start(self, app, text: str, targets: List[str], admin_chat,
+                    reply_markup: Optional[InlineKeyboardMarkup] = None) -> str:
+        job_id = uuid.uuid4().hex[:8]
+        job = {
+            "text": text,
+            "markup": reply_markup.to_dict() if reply_markup else None,
+            "admin_chat": admin_chat,
+            "progress_msg": None,
+            "targets": [str(t) for t in targets],
+            "results": {},
+            "created": time.time(),
+        }
+        msg = await app.bot.send_message(admin_chat, self._progress_text(job))
+        job["progress_msg"] = msg.message_id
+        self.jobs[job_id] = job
+        self._save(force=True)
+        self._spawn(app, job_id)
+        return job_id
+
+    def resume(self, app):
+        """启动时续发未完成的任务"""
+        for job_id in list(self.jobs):
+            logger.info("续发群发任务 %s: 剩余 %s 个", job_id, len(self._pending(self.jobs[job_id])))
+            self._spawn(app, job_id)
+
+    async def stop(self):
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks.clear()
+        self._save(force=True)
+
+    # ---------- 发送 ----------
+    def _spawn(self, app, job_id: str):
+        if job_id not in self.tasks:
+            task = asyncio.create_task(self._run(app, job_id))
+            task.add_done_callback(lambda _: self.tasks.pop(job_id, None))
+            self.tasks[job_id] = task
+
+    @staticmethod
+    def _pending(job: dict) -> List[str]:
+        return [uid for uid in job["targets"] if uid not in job["results"]]
+
+    async def _send_one(self, app, job: dict, uid: str, markup) -> str:
+        attempt = 0
+        while True:
+            await self.limiter.acquire(uid)
+            try:
+                await app.bot.send_message(uid, job["text"], reply_markup=markup)
+                return "sent"
+            except RetryAfter as e:
+                # 限流：整体暂停后重新排队，不计入重试次数
+                wait = retry_after_seconds(e)
+                logger.warning("触发限流，暂停 %.1f 秒", wait)
+                self.limiter.pause(wait)
+            except (Forbidden, BadRequest) as e:
+                logger.warning(f"发送失败: {uid}, 错误: {e}")
+                return "failed"
+            except (TimedOut, NetworkError) as e:
+                attempt += 1
+                logger.warning(f"发送超时: {uid} 第 {attempt} 次, 错误: {e}")
+                if attempt >= BROADCAST_MAX_ATTEMPTS:
+                    return "failed"
+                await asyncio.sleep(attempt)
+            except Exception as e:
+                logger.warning(f"发送失败: {uid}, 错误: {e}")
+                return "failed"
+
+    async def _run(self, app, job_id: str):
+        job = self.jobs[job_id]
+        markup = InlineKeyboardMarkup.de_json(job["markup"], app.bot) if job["markup"] else None
+        queue = asyncio.Queue()
+        for uid in self._pending(job):
+            queue.put_nowait(uid)
+
+        async def worker():
+            while not queue.empty():
+                uid = queue.get_nowait()
+                job["results"][uid] = await self._send_one(app, job, uid, markup)
+                self._save()
+
+        async def progress():
+            while True:
+                await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+                await self._edit_progress(app, job_id)
+
+        reporter = asyncio.create_task(progress())
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, BROADCAST_WORKERS))))
+        finally:
+            reporter.cancel()
+            await asyncio.gather(reporter, return_exceptions=True)
+
+        await self._edit_progress(app, job_id, done=True)
+        self._last_progress.pop(job_id, None)
+        del self.jobs[job_id]
+        self._save(force=True)
+
+    # ---------- 进度 ----------
+    @staticmethod
+    def _progress_text(job: dict, done: bool = False) -> str:
+        results = list(job["results"].values())
+        sent, failed = results.count("sent"), results.count("failed")
+        head = "✅ 群发完成" if done else "📤 群发中..."
+        return f"{head}\n已发送 {sent} / 失败 {failed} / 共 {len(job['targets'])}"
+
+    async def _edit_progress(self, app, job_id: str, done: bool = False):
+        job = self.jobs[job_id]
+        text = self._progress_text(job, done)
+        if self._last_progress.get(job_id) == text or not job.get("progress_msg"):
+            return
+        try:
+            await self.limiter.acquire(job["admin_chat"])
+            await app.bot.edit_message_text(text, chat_id=job["admin_chat"], message_id=job["progress_msg"])
+            self._last_progress[job_id] = text
+        except RetryAfter as e:
+            self.limiter.pause(retry_after_seconds(e))
+        except Exception as e:
+            logger.debug("更新群发进度失败: %s", e)
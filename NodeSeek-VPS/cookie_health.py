@@ -0,0 +1,116 @@
+# cookie_health.py
+# 签到前的 Cookie 巡检：在每个用户的 sign_hour/sign_minute 之前探测 cookie，失效则提前重新登录
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from nodeseek_login_async import cookie_valid
+
+logger = logging.getLogger(__name__)
+
+COOKIE_CHECK_INTERVAL = int(os.getenv("COOKIE_CHECK_INTERVAL", "600"))        # 巡检间隔（秒）
+COOKIE_CHECK_LEAD = int(os.getenv("COOKIE_CHECK_LEAD", "60"))                 # 提前多少分钟开始探测
+COOKIE_CHECK_CONCURRENCY = int(os.getenv("COOKIE_CHECK_CONCURRENCY", "5"))   # 同时探测的账号数
+
+beijing = ZoneInfo("Asia/Shanghai")
+
+
+def minutes_until_slot(u: dict, now: datetime) -> float:
+    """距离用户下一次签到时间的分钟数"""
+    slot = now.replace(hour=u.get("sign_hour") or 0, minute=u.get("sign_minute") or 0, second=0, microsecond=0)
+    if slot <= now:
+        slot += timedelta(days=1)
+    return (slot - now).total_seconds() / 60
+
+
+class CookieHealthChecker:
+    def __init__(self, store, login: Callable[[str, str], Awaitable[Optional[str]]],
+                 lead_minutes: int = COOKIE_CHECK_LEAD, concurrency: int = COOKIE_CHECK_CONCURRENCY):
+        """login 为 coordinator.login：与签到重试走同一条登录路径，能用上 Turnstile 预求解池"""
+        self.store = store
+        self.login = login
+        self.lead_minutes = lead_minutes
+        self.sem = asyncio.Semaphore(concurrency)
+        self.checked = {}   # (uid, 账号) -> 已检查的签到日期，每个签到周期只检查一次
+        # 最近一次探测失效且未能提前刷新的账号 -> 当时的 cookie；签到时还要重新登录，需要 Turnstile token。
+        # cookie 之后被更新（签到重试、重新 /add）即视为已恢复
+        self.stale: Dict[Tuple[str, str], str] = {}
+
+    def due_accounts(self, now: datetime):
+        """签到时间在 lead_minutes 之内、本周期尚未检查的账号"""
+        due = []
+        for uid, u in self.store.users().items():
+            until = minutes_until_slot(u, now)
+            if until > self.lead_minutes:
+                continue
+            cycle = (now + timedelta(minutes=until)).strftime("%Y-%m-%d")
+            for name, acc in u.get("accounts", {}).items():
+                if acc.get("cookie") and self.checked.get((uid, name)) != cycle:
+                    self.checked[(uid, name)] = cycle   # 先占位，避免巡检重叠时重复探测
+                    due.append((uid, name))
+        return due
+
+    async def _check_one(self, uid: str, name: str):
+        async with self.sem:
+            acc = self.store.account(uid, name)
+            if not acc:
+                return "gone"
+
+            cookie = acc.get("cookie", "")
+            if await cookie_valid(cookie):
+                self.stale.pop((uid, name), None)
+                return "ok"
+
+            logger.warning("[%s] %s cookie 巡检失效，提前刷新...", uid, name)
+            new_cookie = None
+            if acc.get("username") and acc.get("password"):
+                new_cookie = await self.login(acc["username"], acc["password"])
+            if not new_cookie:
+                logger.error("[%s] %s cookie 提前刷新失败", uid, name)
+                self.stale[(uid, name)] = cookie
+                return "failed"
+
+            self.stale.pop((uid, name), None)
+            # 登录期间账号可能已被删除
+            acc = self.store.account(uid, name)
+            if not acc:
+                return "gone"
+            acc["cookie"] = new_cookie
+            self.store.save(uid=uid)
+            return "refreshed"
+
+    def pending_stale(self, uids: Iterable[str]) -> int:
+        """这些用户中仍持有已知失效 cookie 的账号数（签到时会重新登录）"""
+        uids = set(uids)
+        pending = 0
+        for (uid, name), cookie in list(self.stale.items()):
+            acc = self.store.account(uid, name)
+            if not acc or acc.get("cookie") != cookie:
+                del self.stale[(uid, name)]   # 已删除或 cookie 已更新
+            elif uid in uids:
+                pending += 1
+        return pending
+
+    async def run_once(self, now: datetime = None):
+        now = now or datetime.now(beijing)
+        due = self.due_accounts(now)
+        if not due:
+            return {}
+
+        results = await asyncio.gather(
+            *(self._check_one(uid, name) for uid, name in due),
+            return_exceptions=True,
+        )
+        summary = {}
+        for r in results:
+            key = "error" if isinstance(r, Exception) else r
+            summary[key] = summary.get(key, 0) + 1
+        logger.info("Cookie 巡检: %s 个账号, %s", len(due), summary)
+
+        # 清理过期的检查记录
+        today = now.strftime("%Y-%m-%d")
+        self.checked = {k: v for k, v in self.checked.items() if v >= today}
+        return summary
@@ -0,0 +1,256 @@
+# coordinator.py
+# bot 端任务协调：签到 / 收益查询按 uid 哈希分到 WORKER_SHARDS 个 worker 进程（sign_worker.py），
+# 通过 jobs.db 下发任务、轮询结果；WORKER_SHARDS=0 时直接在 bot 进程内执行。
+# 登录始终在 bot 进程内执行：账号密码不写入 jobs.db，且能用上 bot 的 Turnstile 预求解池
+import os
+import sys
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from jobqueue import JobQueue, JOB_DB, WORKER_SHARDS, shard_of
+from sign_worker import run_job
+from nodeseek_login_async import login_and_get_cookie
+from metrics import NODE_SPAWN_SECONDS, NODE_EXITS, NODE_UPTIME_SECONDS, SIGN_SECONDS, SIGN_RETRIES
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_PY = os.path.join(BASE_DIR, "sign_worker.py")
+
+WORKER_SPAWN = os.getenv("WORKER_SPAWN", "1") == "1"     # 是否由 bot 启动 worker；为 0 时在同一台主机上手动启动
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", "600"))       # 等待单个任务结果的上限（秒）
+COORD_POLL = 0.2                                         # 有任务在等待时轮询结果的间隔（秒）
+COORD_MAINTAIN = 30                                      # 检查 worker 存活 / 超时任务的间隔（秒）
+COORD_BUSY_TIMEOUT = float(os.getenv("COORD_BUSY_TIMEOUT", "5"))   # bot 端等待 jobs.db 锁的上限（秒）
+
+
+class Coordinator:
+    def __init__(self, node_pool, shards: int = WORKER_SHARDS, path: str = JOB_DB, spawn: bool = WORKER_SPAWN):
+        self.node_pool = node_pool          # 仅本进程执行时使用
+        self.shards = max(0, shards)
+        self.path = path
+        self.spawn = spawn
+        self.queue: Optional[JobQueue] = JobQueue(path, COORD_BUSY_TIMEOUT) if self.shards else None
+        # jobs.db 的读写都是同步调用，放到专用线程执行：worker 持锁时不会卡住 bot 的事件循环
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobqueue") if self.shards else None
+        self._counts: Dict[str, int] = {}
+        self.waiting: Dict[int, asyncio.Future] = {}
+        self.procs: Dict[int, asyncio.subprocess.Process] = {}
+        self.started: Dict[int, float] = {}
+        self._task = None
+        self._wake = asyncio.Event()
+
+    async def _q(self, method, *args):
+        """在 jobs.db 专用线程里调用 JobQueue 的方法"""
+        return await asyncio.get_running_loop().run_in_executor(self._db, method, *args)
+
+    # ---------- 生命周期 ----------
+    async def start(self):
+        if not self.queue or self._task:
+            return
+        dropped = await self._q(self.queue.discard_queued)
+        if dropped:
+            logger.info("丢弃上次遗留的排队任务 %s 个", dropped)
+        purged = await self._q(self.queue.purge_kind, "login")
+        if purged:
+            logger.warning("清除旧版本遗留的登录任务 %s 个（含账号密码）", purged)
+        self._counts = await self._q(self.queue.counts)
+        if self.spawn:
+            for shard in range(self.shards):
+                await self._spawn(shard)
+        self._task = asyncio.create_task(self._loop())
+        print(f"🧩 任务分片: {self.shards} 个 worker" + ("（本机启动）" if self.spawn else "（外部启动）"))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for fut in self.waiting.values():
+            if not fut.done():
+                fut.set_exception(RuntimeError("协调器已停止"))
+        procs, self.procs = self.procs, {}
+        for proc in procs.values():
+            if proc.returncode is None:
+                proc.terminate()
+        for proc in procs.values():
+            try:
+                await asyncio.wait_for(proc.wait(), 15)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        if self._db:
+            self._db.shutdown(wait=False)
+
+    async def _spawn(self, shard: int):
+        with NODE_SPAWN_SECONDS.time(proc="sign_worker"):
+            self.procs[shard] = await asyncio.create_subprocess_exec(
+                sys.executable, WORKER_PY, str(shard), self.path, cwd=BASE_DIR,
+            )
+        self.started[shard] = time.monotonic()
+        logger.info("签到 worker 分片 %s 已启动 pid=%s", shard, self.procs[shard].pid)
+
+    # ---------- 结果轮询 ----------
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        next_maintain = loop.time() + COORD_MAINTAIN
+        while True:
+            if self.waiting:
+                try:
+                    finished = await self._q(self.queue.take_finished, list(self.waiting))
+                except Exception as e:
+                    logger.warning("读取任务结果失败: %s", e)
+                    finished = {}
+                for job_id, (status, result, error) in finished.items():
+                    fut = self.waiting.pop(job_id, None)
+                    if fut is None or fut.done():
+                        continue
+                    if status == "done":
+                        fut.set_result(result)
+                    else:
+                        fut.set_exception(RuntimeError(error or "任务失败"))
+
+            if loop.time() >= next_maintain:
+                next_maintain = loop.time() + COORD_MAINTAIN
+                await self._maintain()
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), COORD_POLL if self.waiting else COORD_MAINTAIN)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _maintain(self):
+        try:
+            await self._q(self.queue.requeue_stale)
+            self._counts = await self._q(self.queue.counts)
+        except Exception as e:
+            logger.warning("检查超时任务失败: %s", e)
+        for shard, proc in list(self.procs.items()):
+            if proc.returncode is not None:
+                NODE_EXITS.inc(proc="sign_worker", code=proc.returncode)
+                NODE_UPTIME_SECONDS.observe(time.monotonic() - self.started.get(shard, 0), proc="sign_worker")
+                logger.warning("♻️ 签到 worker 分片 %s 已退出 code=%s，重新启动", shard, proc.returncode)
+                try:
+                    await self._spawn(shard)
+                except Exception as e:
+                    logger.error("重启签到 worker 分片 %s 失败: %s", shard, e)
+
+    # ---------- 下发任务 ----------
+    async def _submit(self, kind: str, shard: int, payload: dict, timeout: float = JOB_TIMEOUT):
+        job_id = await self._q(self.queue.enqueue, kind, shard, payload)
+        fut = asyncio.get_running_loop().create_future()
+        self.waiting[job_id] = fut
+        self._wake.set()
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self.waiting.pop(job_id, None)
+
+    def _split(self, targets: dict) -> Dict[int, dict]:
+        by_shard: Dict[int, dict] = {}
+        for uid, accounts in targets.items():
+            by_shard.setdefault(shard_of(uid, self.shards), {})[uid] = accounts
+        return by_shard
+
+    async def _fan_out(self, kind: str, targets: dict, make_payload) -> dict:
+        """按分片拆分下发，合并各分片的 {uid: [结果]}；失败的分片记录日志后跳过"""
+        by_shard = self._split(targets)
+        parts = await asyncio.gather(
+            *(self._submit(kind, shard, make_payload(part)) for shard, part in by_shard.items()),
+            return_exceptions=True,
+        )
+        results = {}
+        for shard, part in zip(by_shard, parts):
+            if isinstance(part, Exception):
+                logger.error("分片 %s 的 %s 任务失败: %s", shard, kind, part)
+                continue
+            results.update(part or {})
+        return results
+
+    async def _sign_batch(self, targets: dict, user_modes: dict) -> dict:
+        """targets = {uid: {账号名: cookie}}"""
+        if not self.queue:
+            return await run_job(self.node_pool, "sign", {"targets": targets, "userModes": user_modes})
+        return await self._fan_out("sign", targets, lambda part: {
+            "targets": part,
+            "userModes": {uid: user_modes.get(uid) for uid in part},
+        })
+
+    async def sign(self, targets: dict, user_modes: dict, credentials: Callable[[str, str], Optional[dict]]) -> dict:
+        """
+        targets = {uid: {账号名: cookie}}；credentials(uid, 账号名) 返回账号信息，只在 cookie 失效需要重新登录时调用，
+        密码只随登录任务下发。结果中的 new_cookie 由调用方保存
+        """
+        with SIGN_SECONDS.time(stage="total"):
+            try:
+                results = await self._sign_batch(targets, user_modes)
+            except Exception as e:
+                logger.error("调用 sign.js 异常: %s", e)
+                return {}
+
+            # ✅ 遍历每个账号，失败则重试（登录为异步，多个账号并发刷新），最终结果全部保留
+            fixed = await asyncio.gather(*(
+                self.retry_sign_if_invalid(uid, res, credentials, user_modes.get(uid, False))
+                for uid, logs in results.items() for res in logs
+            ))
+            fixed_iter = iter(fixed)
+            for uid, logs in results.items():
+                results[uid] = [next(fixed_iter) for _ in logs]  # ✅ 不管是否重试成功，最终记录成功的
+            return results
+
+    async def retry_sign_if_invalid(self, uid: str, res: dict, credentials, mode) -> dict:
+        # 仅在第一次失败时才尝试刷新 cookie
+        if "🚫 响应解析失败" not in res["result"]:
+            return res  # 成功或其他错误，不重试
+
+        acc_name = res["name"]
+        logger.warning("[%s] %s cookie 失效，尝试自动刷新...", uid, acc_name)
+
+        # 调用自动登录获取新 cookie
+        account = credentials(uid, acc_name) or {}
+        new_cookie = None
+        if account.get("username") and account.get("password"):
+            with SIGN_SECONDS.time(stage="retry_login"):
+                new_cookie = await self.login(account["username"], account["password"])
+        if not new_cookie:
+            logger.error("[%s] %s cookie 刷新失败", uid, acc_name)
+            SIGN_RETRIES.inc(outcome="refresh_failed")
+            return {**res, "result": "🚫 Cookie 刷新失败", "no_log": True}
+
+        # ⚡ 再跑一次签到
+        try:
+            with SIGN_SECONDS.time(stage="retry_sign"):
+                retry_results = await self._sign_batch({uid: {acc_name: new_cookie}}, {uid: mode})
+            retry_res = retry_results[uid][0]
+            SIGN_RETRIES.inc(outcome="resigned")
+
+            # ✅ 在结果里直接加上刷新标记
+            retry_res["cookie_refreshed"] = True
+        except Exception as e:
+            logger.error("sign.js 重试调用异常: %r", e)
+            SIGN_RETRIES.inc(outcome="resign_error")
+            retry_res = {**res, "result": "🚫 Cookie 刷新后签到异常", "no_log": True}
+        retry_res["new_cookie"] = new_cookie
+        return retry_res
+
+    async def stats(self, targets: dict, days: int) -> dict:
+        """targets = {uid: {账号名: cookie}}"""
+        if not self.queue:
+            return await run_job(self.node_pool, "stats", {"targets": targets, "days": days})
+        return await self._fan_out("stats", targets, lambda part: {"targets": part, "days": days})
+
+    async def login(self, username: str, password: str) -> Optional[str]:
+        """在 bot 进程内登录（受 LOGIN_CONCURRENCY 限流），不经过 jobs.db"""
+        return await login_and_get_cookie(username, password)
+
+    def status_text(self) -> str:
+        if not self.queue:
+            return "任务分片: 未启用（bot 进程内执行）"
+        counts = self._counts   # 由 _maintain 定期刷新，不在事件循环里查询数据库
+        alive = sum(1 for p in self.procs.values() if p.returncode is None)
+        return (f"任务分片: {self.shards} 个, 本机 worker 存活 {alive}, 等待结果 {len(self.waiting)}, "
+                f"排队 {counts.get('queued', 0)}, 执行中 {counts.get('running', 0)}")
@@ -0,0 +1,256 @@
+# datastore.py
+# 进程内唯一的 data.json 缓存：只解析一次、按 mtime 失效、脏标记 + 合并写入
+import os
+import json
+import atexit
+import asyncio
+import logging
+import tempfile
+from typing import Dict, Optional, TypedDict
+
+from userlog import UserLog
+from metrics import STORE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 合并写入的延迟（秒）：窗口内的多次 save 只落盘一次
+FLUSH_DELAY = float(os.getenv("DATA_FLUSH_DELAY", "1.0"))
+
+# 存储后端：json（默认，data.json + data/<uid>.jsonl）或 sqlite
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data.db")
+
+LOG_DIR = "./data"
+LOG_KEEP = 30   # 每个用户保留的日志条数
+
+
+class Account(TypedDict, total=False):
+    username: str
+    password: str
+    cookie: str
+
+
+class User(TypedDict, total=False):
+    accounts: Dict[str, Account]
+    mode: bool
+    tgUsername: str
+    sign_hour: int
+    sign_minute: int
+
+
+# 用户字段默认值
+USER_DEFAULTS = {
+    "accounts": dict,
+    "mode": lambda: False,      # 默认模式
+    "tgUsername": str,
+    "sign_hour": lambda: 0,     # 默认签到时间
+    "sign_minute": lambda: 0,
+}
+
+
+def atomic_write_json(path: str, obj, indent=2):
+    """原子写入 JSON：同目录临时文件 + os.replace"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tempname = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as tf:
+            json.dump(obj, tf, indent=indent, ensure_ascii=False)
+        os.replace(tempname, path)
+    except Exception:
+        if os.path.exists(tempname):
+            os.remove(tempname)
+        raise
+
+
+def ensure_user_structure(data, uid):
+    """
+    确保用户数据结构完整，避免 KeyError
+    """
+    if uid not in data["users"]:
+        data["users"][uid] = {}
+
+    u = data["users"][uid]
+    for key, default in USER_DEFAULTS.items():
+        if key not in u:
+            u[key] = default()
+
+    return u
+
+
+def _user_incomplete(u: dict) -> bool:
+    return any(key not in u for key in USER_DEFAULTS)
+
+
+class DataStore:
+    def __init__(self, path: str, flush_delay: float = FLUSH_DELAY):
+        self.path = path
+        self.flush_delay = flush_delay
+        self._data: Optional[dict] = None
+        self._mtime: Optional[int] = None
+        self.dirty = set()          # 有改动的 uid：SQLite 后端只写这些用户；JSON 后端整文件重写，仅用于日志与合并
+        self._all_dirty = False     # 整体改动（删除用户、未指明 uid 的保存）
+        self._flush_handle = None
+        self.logs = UserLog(LOG_DIR, LOG_KEEP)
+        atexit.register(self.flush)
+
+    # ---------- 读取 ----------
+    def _stat_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @property
+    def is_dirty(self) -> bool:
+        return self._all_dirty or bool(self.dirty)
+
+    def load(self) -> dict:
+        """返回共享的数据对象；文件被外部修改（mtime 变化）且无未落盘改动时才重新解析"""
+        mtime = self._stat_mtime()
+        if self._data is not None and (self.is_dirty or mtime == self._mtime):
+            return self._data
+
+        if mtime is None:
+            self._data, self._mtime = {"users": {}}, None
+            return self._data
+
+        try:
+            with STORE_SECONDS.time(backend="json", op="load"), open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except json.JSONDecodeError:
+            print("⚠️ data.json 损坏，已重置为空")
+            self._data = {"users": {}}
+            self.save()
+            self.flush()
+            return self._data
+
+        data.setdefault("users", {})
+        self._data, self._mtime = data, mtime
+
+        # 补齐缺失字段，只标记确实变化的用户
+        for uid, u in data["users"].items():
+            if _user_incomplete(u):
+                ensure_user_structure(data, uid)
+                self.dirty.add(uid)
+        if self.dirty:
+            self._schedule_flush()  # 🔥 写回文件，保证 data.json 补齐
+
+        return data
+
+    # ---------- 类型化访问 ----------
+    def users(self) -> Dict[str, User]:
+        return self.load()["users"]
+
+    def user(self, uid: str) -> Optional[User]:
+        return self.users().get(str(uid))
+
+    def accounts(self, uid: str) -> Dict[str, Account]:
+        u = self.user(uid)
+        return u.get("accounts", {}) if u else {}
+
+    def account(self, uid: str, name: str) -> Optional[Account]:
+        return self.accounts(uid).get(name)
+
+    def has_accounts(self, uid: str) -> bool:
+        return bool(self.accounts(uid))
+
+    # ---------- 写入 ----------
+    def mark_dirty(self, uid: Optional[str] = None):
+        if uid is None:
+            self._all_dirty = True
+        else:
+            self.dirty.add(str(uid))
+
+    def save(self, data: Optional[dict] = None, uid: Optional[str] = None):
+        """
+        标记改动并安排合并落盘；不在事件循环中时立即写入。
+        data 不是当前共享对象（期间文件被外部修改并重新加载）时，只合并 uid 这一个用户，
+        没有指明 uid 的过期副本直接拒绝，避免用旧数据覆盖重新加载的内容
+        """
+        if data is not None and self._data is not None and data is not self._data:
+            if uid is None:
+                logger.error("⚠️ 拒绝保存过期的数据副本：data.json 已被外部修改并重新加载")
+                return
+            self._merge_user(data, str(uid))
+        elif data is not None:
+            self._data = data
+        self.mark_dirty(uid)
+        self._schedule_flush()
+
+    def _merge_user(self, stale: dict, uid: str):
+        users = self._data["users"]
+        u = stale.get("users", {}).get(uid)
+        if u is None:
+            users.pop(uid, None)   # 该用户已在旧副本中被删除
+        else:
+            users[uid] = u
+        logger.warning("data.json 已重新加载，仅合并用户 %s 的改动", uid)
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_delay, self.flush)
+
+    def flush(self):
+        """原子落盘所有改动"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._data is None or not self.is_dirty:
+            return
+
+        with STORE_SECONDS.time(backend="json", op="flush"):
+            atomic_write_json(self.path, self._data)
+
+        logger.debug("data.json 已落盘（%s 个用户有改动）", "全部" if self._all_dirty else len(self.dirty))
+        self._mtime = self._stat_mtime()
+        self.dirty.clear()
+        self._all_dirty = False
+
+    # ---------- 签到日志（data/<uid>.jsonl，只追加） ----------
+    def init_logs(self, uid: str):
+        self.logs.init(uid)
+
+    def read_logs(self, uid: str) -> list:
+        return self.logs.tail(uid)
+
+    def append_log(self, uid: str, entry: dict):
+        with STORE_SECONDS.time(backend="json", op="append_log"):
+            self.logs.append(uid, entry)
+
+    def delete_logs(self, uid: str):
+        self.logs.delete(uid)
+
+    def logs_on(self, date: str) -> Dict[str, list]:
+        """返回指定日期（YYYY-MM-DD）的日志 {uid: [entry, ...]}，只含有记录的用户"""
+        result = {}
+        for uid in self.users():
+            todays = [l for l in self.logs.tail(uid) if l.get("time", "")[:10] == date]
+            if todays:
+                result[uid] = todays
+        return result
+
+    # ---------- 后台任务 ----------
+    def start_background(self):
+        self.logs.start_compactor()
+
+    async def stop_background(self):
+        await self.logs.stop_compactor()
+        self.flush()
+
+    # ---------- 查询 ----------
+    def find_account_owners(self, name: str) -> list:
+        """返回绑定了该账号名的 uid 列表"""
+        return [uid for uid, u in self.users().items() if name in u.get("accounts", {})]
+
+
+def open_store(path: str) -> DataStore:
+    """按 STORAGE_BACKEND 打开存储后端"""
+    if STORAGE_BACKEND == "sqlite":
+        from sqlite_store import SqliteStore
+        return SqliteStore(SQLITE_PATH)
+    return DataStore(path)
@@ -0,0 +1,140 @@
+# delete_scheduler.py
+# 自动删除消息：一个按到期时间排序的堆 + 一个后台协程，同一聊天的到期消息合并为一次 deleteMessages，堆持久化，重启后补删
+import os
+import json
+import time
+import heapq
+import atexit
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+from telegram.error import RetryAfter
+
+from datastore import atomic_write_json
+from broadcast import limiter, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+DELETE_QUEUE_FILE = os.getenv("DELETE_QUEUE_FILE", "delete_queue.json")
+DELETE_BATCH = 100             # deleteMessages 单次最多 100 条
+DELETE_MAX_AGE = 48 * 3600     # 机器人只能删除 48 小时内的消息，更早的直接丢弃
+DELETE_FLUSH_DELAY = 1.0
+
+
+class DeleteScheduler:
+    def __init__(self, path: str = DELETE_QUEUE_FILE):
+        self.path = path
+        self.heap: List[Tuple[float, int, int]] = []   # (到期时间, chat_id, message_id)
+        self._wake = asyncio.Event()
+        self._task = None
+        self._dirty = False
+        self._flush_handle = None
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("delete_queue.json 读取失败: %s", e)
+            return
+        oldest = time.time() - DELETE_MAX_AGE
+        self.heap = [tuple(e) for e in entries if e[0] >= oldest]
+        heapq.heapify(self.heap)
+        if self.heap:
+            logger.info("待删除消息 %s 条（含重启前遗留）", len(self.heap))
+
+    # ---------- 对外接口 ----------
+    def schedule(self, chat_id, message_ids: Iterable[int], delay: float):
+        due = time.time() + delay
+        for mid in message_ids:
+            heapq.heappush(self.heap, (due, int(chat_id), int(mid)))
+        self._mark_dirty()
+        self._wake.set()
+
+    def start(self, bot):
+        """启动后台删除协程，已过期的条目立即补删"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(bot))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.flush()
+
+    # ---------- 删除 ----------
+    async def _loop(self, bot):
+        while True:
+            self._wake.clear()
+            now = time.time()
+            due = []
+            while self.heap and self.heap[0][0] <= now:
+                due.append(heapq.heappop(self.heap))
+            if due:
+                try:
+                    await self._delete(bot, due)
+                except Exception as e:
+                    logger.warning("删除消息异常: %s", e)
+                self._mark_dirty()
+                continue
+
+            timeout = self.heap[0][0] - now if self.heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _delete(self, bot, entries):
+        by_chat: Dict[int, List[int]] = {}
+        for _, chat_id, mid in entries:
+            by_chat.setdefault(chat_id, []).append(mid)
+        for chat_id, ids in by_chat.items():
+            for i in range(0, len(ids), DELETE_BATCH):
+                await self._delete_batch(bot, chat_id, ids[i:i + DELETE_BATCH])
+
+    async def _delete_batch(self, bot, chat_id: int, ids: List[int]):
+        await limiter.acquire(f"del:{chat_id}")
+        for _ in range(2):
+            try:
+                await bot.delete_messages(chat_id, ids)
+                logger.debug("已删除 %s 的 %s 条消息", chat_id, len(ids))
+                return
+            except RetryAfter as e:
+                limiter.pause(retry_after_seconds(e))
+                await limiter.acquire(f"del:{chat_id}")
+            except Exception as e:
+                # 旧版 PTB 没有 delete_messages，或批量删除被拒绝 → 逐条删除
+                logger.debug("批量删除 %s 失败，逐条删除: %s", chat_id, e)
+                break
+
+        for mid in ids:
+            try:
+                await bot.delete_message(chat_id, mid)
+            except Exception as e:
+                logger.debug("删除消息 %s/%s 失败: %s", chat_id, mid, e)
+
+    # ---------- 落盘 ----------
+    def _mark_dirty(self):
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(DELETE_FLUSH_DELAY, self.flush)
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+        atomic_write_json(self.path, sorted(self.heap), indent=None)
+        self._dirty = False
@@ -0,0 +1,170 @@
+# flaresolverr.py
+# FlareSolverr 客户端：复用 sessions.create 创建的浏览器会话，按出口 IP + User-Agent 缓存 cf_clearance
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from session_pool import pool
+
+logger = logging.getLogger(__name__)
+
+FLARESOLVERR_URL = os.getenv("FLARESOLVERR_URL")
+FLARESOLVERR_SESSION_IDLE = int(os.getenv("FLARESOLVERR_SESSION_IDLE", "1800"))   # 会话空闲多久后销毁（秒）
+CLEARANCE_MAX_TTL = int(os.getenv("CLEARANCE_MAX_TTL", "1800"))                    # clearance 最长缓存（秒）
+CLEARANCE_MARGIN = int(os.getenv("CLEARANCE_MARGIN", "60"))                        # 提前多少秒视为过期
+EGRESS_IP = os.getenv("EGRESS_IP")                                                 # 固定出口 IP，不设置则自动探测
+EGRESS_IP_TTL = 600
+EGRESS_IP_URL = "https://api.ipify.org"
+
+
+@dataclass
+class Clearance:
+    cookies: Dict[str, str]
+    user_agent: str
+    expires_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at - CLEARANCE_MARGIN
+
+
+@dataclass
+class FlareSession:
+    session_id: str
+    last_used: float
+
+
+class FlareSolverrClient:
+    def __init__(self, url: Optional[str] = FLARESOLVERR_URL):
+        self.url = url
+        self.sessions: Dict[str, FlareSession] = {}             # 出口 IP -> 浏览器会话
+        self.cache: Dict[Tuple[str, str], Clearance] = {}       # (出口 IP, User-Agent) -> clearance
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._egress: Tuple[Optional[str], float] = (None, 0.0)
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- 出口 IP ----------
+    async def egress_ip(self) -> str:
+        if EGRESS_IP:
+            return EGRESS_IP
+        ip, checked_at = self._egress
+        if ip and time.time() - checked_at < EGRESS_IP_TTL:
+            return ip
+        try:
+            r = await pool.shared().get(EGRESS_IP_URL, timeout=5)
+            ip = r.text.strip() or "unknown"
+        except Exception as e:
+            logger.warning("探测出口 IP 失败: %s", e)
+            ip = ip or "unknown"
+        self._egress = (ip, time.time())
+        return ip
+
+    # ---------- FlareSolverr API ----------
+    async def _post(self, payload: dict, timeout: float = 60) -> dict:
+        r = await pool.shared().post(self.url, json=payload, timeout=timeout)
+        j = r.json()
+        if j.get("status") not in (None, "ok"):
+            raise RuntimeError(j.get("message") or j)
+        return j
+
+    async def _session_for(self, ip: str) -> str:
+        sess = self.sessions.get(ip)
+        if sess is None:
+            j = await self._post({"cmd": "sessions.create"})
+            sess = FlareSession(j["session"], time.time())
+            self.sessions[ip] = sess
+            logger.info("FlareSolverr 会话已创建: %s (出口 %s)", sess.session_id, ip)
+        sess.last_used = time.time()
+        return sess.session_id
+
+    async def _destroy(self, ip: str):
+        sess = self.sessions.pop(ip, None)
+        if sess is None:
+            return
+        try:
+            await self._post({"cmd": "sessions.destroy", "session": sess.session_id}, timeout=15)
+        except Exception as e:
+            logger.warning("销毁 FlareSolverr 会话 %s 失败: %s", sess.session_id, e)
+
+    async def destroy_idle(self):
+        """销毁空闲会话并清理过期的 clearance"""
+        self.cache = {k: c for k, c in self.cache.items() if c.fresh}
+        now = time.time()
+        for ip, sess in list(self.sessions.items()):
+            if now - sess.last_used > FLARESOLVERR_SESSION_IDLE:
+                await self._destroy(ip)
+
+    async def close(self):
+        for ip in list(self.sessions):
+            await self._destroy(ip)
+
+    # ---------- clearance ----------
+    def _cached(self, ip: str, user_agent: Optional[str]) -> Optional[Clearance]:
+        if user_agent:
+            c = self.cache.get((ip, user_agent))
+            return c if c and c.fresh else None
+        # 未指定 UA：取该出口下最新的有效 clearance
+        candidates = [c for (cip, _), c in self.cache.items() if cip == ip and c.fresh]
+        return max(candidates, key=lambda c: c.expires_at, default=None)
+
+    async def _render(self, url: str, ip: str) -> Clearance:
+        print(f"🌐 FlareSolverr 渲染页面: {url}")
+        payload = {"cmd": "request.get", "url": url, "maxTimeout": 120000}
+        try:
+            payload["session"] = await self._session_for(ip)
+            j = await self._post(payload)
+        except Exception as e:
+            # 会话可能因 FlareSolverr 重启失效，重建一次
+            logger.warning("FlareSolverr 会话请求失败，重建会话: %s", e)
+            await self._destroy(ip)
+            payload["session"] = await self._session_for(ip)
+            j = await self._post(payload)
+
+        solution = j.get("solution", {})
+        raw_cookies = solution.get("cookies", [])
+        cookies = {c["name"]: c["value"] for c in raw_cookies}
+
+        expires_at = time.time() + CLEARANCE_MAX_TTL
+        for c in raw_cookies:
+            if c.get("name") == "cf_clearance" and (c.get("expires") or 0) > 0:
+                expires_at = min(expires_at, float(c["expires"]))
+        return Clearance(cookies, solution.get("userAgent") or "", expires_at)
+
+    async def get_clearance(self, url: str, user_agent: Optional[str] = None) -> Tuple[Dict[str, str], str]:
+        """返回 (cookies, userAgent)；缓存的 clearance 未过期时不访问浏览器"""
+        if not self.url:
+            return {}, ""
+
+        ip = await self.egress_ip()
+        cached = self._cached(ip, user_agent)
+        if cached:
+            self.hits += 1
+            print("✅ 复用缓存的 cf_clearance")
+            return cached.cookies, cached.user_agent
+
+        lock = self._locks.setdefault(ip, asyncio.Lock())
+        async with lock:
+            # 等锁期间可能已被其他登录刷新
+            cached = self._cached(ip, user_agent)
+            if cached:
+                self.hits += 1
+                return cached.cookies, cached.user_agent
+
+            self.misses += 1
+            try:
+                clearance = await self._render(url, ip)
+            except Exception as e:
+                print(f"❌ FlareSolverr 获取 cookies 失败: {e}")
+                return {}, ""
+
+            if not clearance.cookies:
+                print("❌ FlareSolverr 没有返回 cookies")
+                return {}, ""
+            print("✅ FlareSolverr 获取到 cookies:", clearance.cookies)
+            if "cf_clearance" in clearance.cookies:
+                self.cache[(ip, clearance.user_agent)] = clearance
+            return clearance.cookies, clearance.user_agent
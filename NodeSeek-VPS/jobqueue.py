@@ -0,0 +1,176 @@
+# jobqueue.py
+# bot 与签到 worker 之间的任务队列：一个 SQLite 文件（WAL），按分片领取，结果写回同一行由 bot 取走
+# 仅限单机：WAL 依赖共享内存，jobs.db 不能放在网络文件系统上供多台主机共用
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOB_DB = os.getenv("JOB_DB", "jobs.db")
+WORKER_SHARDS = int(os.getenv("WORKER_SHARDS", "0"))     # worker 分片数；0 = 不拆分，全部在 bot 进程内执行
+JOB_HEARTBEAT = int(os.getenv("JOB_HEARTBEAT", "30"))    # worker 执行任务期间刷新心跳的间隔（秒）
+JOB_STALE = int(os.getenv("JOB_STALE", "150"))           # 心跳停止超过该时间视为 worker 已崩溃（秒）
+JOB_MAX_ATTEMPTS = 2                                     # 崩溃后最多重新排队一次
+JOB_KEEP = 3600                                          # 无人取走的结果保留时间（秒）
+JOB_BUSY_TIMEOUT = 30                                    # 等待数据库锁的上限（秒），bot 端用更短的值
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    shard    INTEGER NOT NULL,
+    kind     TEXT NOT NULL,
+    payload  TEXT NOT NULL,
+    status   TEXT NOT NULL DEFAULT 'queued',
+    result   TEXT,
+    error    TEXT,
+    worker   TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created  REAL NOT NULL,
+    started  REAL,
+    heartbeat REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(shard, status, id);
+"""
+
+
+def shard_of(uid: str, shards: int) -> int:
+    """uid 稳定哈希到分片（不用 hash()，它在每个进程里都不一样）"""
+    return int(hashlib.sha1(str(uid).encode("utf-8")).hexdigest()[:8], 16) % max(1, shards)
+
+
+class JobQueue:
+    """状态流转：queued → running → done / failed；bot 取走结果后删除该行"""
+
+    def __init__(self, path: str = JOB_DB, timeout: float = JOB_BUSY_TIMEOUT):
+        self.path = path
+        # isolation_level=None：手动 BEGIN IMMEDIATE，保证多个进程领取任务时互斥
+        # check_same_thread=False：bot 端在专用线程里调用，同一时刻只有一个线程使用连接
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "heartbeat" not in columns:   # 旧版 jobs.db
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat REAL")
+
+    # ---------- bot 端 ----------
+    def enqueue(self, kind: str, shard: int, payload: dict) -> int:
+        cur = self.conn.execute(
+            "INSERT INTO jobs (shard, kind, payload, created) VALUES (?, ?, ?, ?)",
+            (shard, kind, json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+        return cur.lastrowid
+
+    def take_finished(self, ids: List[int]) -> Dict[int, Tuple[str, object, Optional[str]]]:
+        """取走已完成的任务：{id: (status, result, error)}，取走后删除"""
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        rows = self.conn.execute(
+            f"SELECT id, status, result, error FROM jobs "
+            f"WHERE id IN ({placeholders}) AND status IN ('done', 'failed')",
+            ids,
+        ).fetchall()
+        if not rows:
+            return {}
+        done = [row[0] for row in rows]
+        self.conn.execute(f"DELETE FROM jobs WHERE id IN ({','.join('?' * len(done))})", done)
+        return {
+            job_id: (status, json.loads(result) if result else None, error)
+            for job_id, status, result, error in rows
+        }
+
+    def discard_queued(self) -> int:
+        """bot 重启后丢弃上次留下的排队任务（已没有人等它们的结果）"""
+        return self.conn.execute("DELETE FROM jobs WHERE status = 'queued'").rowcount
+
+    def purge_kind(self, kind: str) -> int:
+        """
+        删除某类任务的全部行（升级后清理旧版本写入的登录任务）；
+        secure_delete 覆盖被删内容，再把 WAL 检查点写回并截断，旧内容不留在 -wal 文件里
+        """
+        self.conn.execute("PRAGMA secure_delete = ON")
+        deleted = self.conn.execute("DELETE FROM jobs WHERE kind = ?", (kind,)).rowcount
+        if deleted:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def requeue_stale(self, stale: float = JOB_STALE) -> Tuple[int, int]:
+        """心跳停止的任务重新排队，超过重试次数的标记失败；顺带清理无人取走的旧结果"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            failed = self.conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'worker 无响应', finished = ? "
+                "WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+                (now, now - stale, JOB_MAX_ATTEMPTS),
+            ).rowcount
+            requeued = self.conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL "
+                "WHERE status = 'running' AND heartbeat < ?",
+                (now - stale,),
+            ).rowcount
+            self.conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                (now - JOB_KEEP,),
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        if requeued or failed:
+            logger.warning("超时任务：重新排队 %s 个，放弃 %s 个", requeued, failed)
+        return requeued, failed
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    # ---------- worker 端 ----------
+    def claim(self, shard: int, worker: str) -> Optional[Tuple[int, str, dict]]:
+        """领取本分片最早的排队任务：(id, kind, payload)，没有则返回 None"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT id, kind, payload FROM jobs WHERE shard = ? AND status = 'queued' ORDER BY id LIMIT 1",
+                (shard,),
+            ).fetchone()
+            if row:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started = ?, heartbeat = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (worker, time.time(), time.time(), row[0]),
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        if not row:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def heartbeat(self, job_id: int, worker: str) -> bool:
+        """刷新心跳；返回 False 表示任务已不归本 worker（被判定超时后重新分配或放弃）"""
+        return self.conn.execute(
+            "UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time(), job_id, worker),
+        ).rowcount > 0
+
+    # complete / fail 只对仍归本 worker 的任务生效，被接管的任务以接管方的结果为准
+    def complete(self, job_id: int, worker: str, result) -> bool:
+        return self.conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, finished = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (json.dumps(result, ensure_ascii=False), time.time(), job_id, worker),
+        ).rowcount > 0
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        return self.conn.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (error[:500], time.time(), job_id, worker),
+        ).rowcount > 0
@@ -0,0 +1,128 @@
+# menu_sync.py
+# 命令菜单增量同步：记录每个 scope 上次设置的菜单哈希，只推送有变化的 scope；全量同步只在启动时后台执行
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from typing import Callable, Dict, List
+
+import telegram
+from telegram import BotCommand
+from telegram.error import RetryAfter
+
+from datastore import atomic_write_json
+from broadcast import limiter, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+MENU_STATE_FILE = os.getenv("MENU_STATE_FILE", "menu_state.json")
+
+# scope 键："default" | "groups" | "chat:<TGID>"
+DEFAULT_SCOPE = "default"
+GROUP_SCOPE = "groups"
+
+
+def chat_scope(chat_id) -> str:
+    return f"chat:{chat_id}"
+
+
+def scope_object(key: str):
+    if key == DEFAULT_SCOPE:
+        return telegram.BotCommandScopeDefault()
+    if key == GROUP_SCOPE:
+        return telegram.BotCommandScopeAllGroupChats()
+    return telegram.BotCommandScopeChat(int(key.split(":", 1)[1]))
+
+
+def menu_hash(commands: List[BotCommand]) -> str:
+    raw = json.dumps([(c.command, c.description) for c in commands], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class MenuSync:
+    def __init__(self, desired: Callable[[], Dict[str, List[BotCommand]]],
+                 menu_for_chat: Callable[[str], List[BotCommand]],
+                 path: str = MENU_STATE_FILE):
+        self.desired = desired               # 全部 scope 应有的菜单
+        self.menu_for_chat = menu_for_chat   # 单个私聊应有的菜单
+        self.path = path
+        self.hashes: Dict[str, str] = self._load()
+        self._task = None
+
+    def _load(self) -> Dict[str, str]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("menu_state.json 读取失败，将全量同步: %s", e)
+            return {}
+
+    def _save(self):
+        try:
+            atomic_write_json(self.path, self.hashes)
+        except OSError as e:
+            logger.error("保存菜单状态失败: %s", e)
+
+    async def _call(self, key: str, fn):
+        """按发送额度调用 Bot API，RetryAfter 时等待后重试一次"""
+        await limiter.acquire(f"menu:{key}")
+        try:
+            await fn()
+        except RetryAfter as e:
+            limiter.pause(retry_after_seconds(e))
+            await limiter.acquire(f"menu:{key}")
+            await fn()
+
+    async def push(self, bot, key: str, commands: List[BotCommand]) -> bool:
+        """菜单与上次设置的相同则跳过；返回是否调用了 API。只更新内存中的哈希，由调用方落盘"""
+        h = menu_hash(commands)
+        if self.hashes.get(key) == h:
+            return False
+        await self._call(key, lambda: bot.set_my_commands(commands, scope=scope_object(key)))
+        self.hashes[key] = h
+        return True
+
+    async def sync_chat(self, bot, chat_id):
+        """用户增删账号后只同步该用户的私聊菜单"""
+        try:
+            if await self.push(bot, chat_scope(chat_id), self.menu_for_chat(str(chat_id))):
+                self._save()
+        except Exception as e:
+            logger.warning("同步 %s 的菜单失败: %s", chat_id, e)
+
+    async def full_sync(self, bot):
+        desired = self.desired()
+        pushed = 0
+        try:
+            for key, commands in desired.items():
+                try:
+                    pushed += await self.push(bot, key, commands)
+                except Exception as e:
+                    logger.warning("同步菜单 %s 失败: %s", key, e)
+
+            # 已不存在的用户：删除专属菜单，回落到默认菜单
+            for key in [k for k in self.hashes if k not in desired]:
+                try:
+                    await self._call(key, lambda: bot.delete_my_commands(scope=scope_object(key)))
+                    del self.hashes[key]
+                    pushed += 1
+                except Exception as e:
+                    logger.warning("删除菜单 %s 失败: %s", key, e)
+        finally:
+            if pushed:
+                self._save()   # 整个同步只落盘一次；中途被取消也保留已推送的部分
+        logger.info("菜单同步完成: %s 个 scope, 更新 %s 个", len(desired), pushed)
+
+    def start(self, bot):
+        """启动时在后台全量同步，不阻塞启动"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.full_sync(bot))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
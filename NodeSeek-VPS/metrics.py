@@ -0,0 +1,227 @@
+# metrics.py
+# 轻量 Prometheus 指标：带标签的 Counter / Histogram + 本地 asyncio HTTP 服务暴露 /metrics（不依赖 prometheus_client）
+import os
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))     # 0 = 不开启；分片 worker 使用 METRICS_PORT+1+分片号
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+UPTIME_BUCKETS = (10, 60, 300, 1800, 3600, 6 * 3600, 24 * 3600, 7 * 86400)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(v: float) -> str:
+    return "+Inf" if v == float("inf") else repr(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def _key(self, labels: dict) -> LabelKey:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} 需要标签 {self.labels}，收到 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_labels_text(self.labels, k)} {_fmt(v)}" for k, v in sorted(self.values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.values: Dict[LabelKey, list] = {}     # key -> [各桶计数..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        row = self.values.get(key)
+        if row is None:
+            row = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """with HIST.time(stage="x"): ... —— 异常退出也记录耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, row in sorted(self.values.items()):
+            for bound, n in zip(self.buckets, row):
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels_text(self.labels, key, le)} {n}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labels, key)} {_fmt(row[-2])}")
+            lines.append(f"{self.name}_count{_labels_text(self.labels, key)} {row[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"指标重复注册: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def histogram(name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+# ========== 指标定义 ==========
+SIGN_SECONDS = histogram("nodeseek_sign_seconds", "签到耗时（batch=整批 sign.js, retry_login / retry_sign=失效重试, total=含重试）", ["stage"])
+SIGN_RESULTS = counter("nodeseek_sign_results_total", "sign.js 返回结果分类（含重试那次）", ["category"])
+SIGN_RETRIES = counter("nodeseek_sign_retries_total", "cookie 失效触发的重试签到", ["outcome"])
+LOGIN_SECONDS = histogram("nodeseek_login_seconds", "登录各步骤耗时", ["stage"])
+LOGIN_RESULTS = counter("nodeseek_login_total", "登录结果", ["outcome"])
+TURNSTILE_SECONDS = histogram("nodeseek_turnstile_solve_seconds", "Turnstile 求解耗时（含预求解池）", ["outcome"])
+STATS_SECONDS = histogram("nodeseek_stats_seconds", "收益查询耗时（node=stats.js, total=含合并等待）", ["stage"])
+NODE_CALL_SECONDS = histogram("nodeseek_node_call_seconds", "Node worker 单次请求耗时", ["op", "outcome"])
+NODE_SPAWN_SECONDS = histogram("nodeseek_node_spawn_seconds", "子进程启动耗时", ["proc"])
+NODE_EXITS = counter("nodeseek_node_exits_total", "子进程退出次数", ["proc", "code"])
+NODE_UPTIME_SECONDS = histogram("nodeseek_node_uptime_seconds", "子进程退出时的运行时长", ["proc"], UPTIME_BUCKETS)
+STORE_SECONDS = histogram("nodeseek_store_seconds", "数据存储读写耗时", ["backend", "op"])
+SCHEDULER_LAG_SECONDS = histogram("nodeseek_scheduler_lag_seconds", "定时签到实际开始时间 - 计划时间", ["stage"],
+                                  (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 300))
+
+# sign.js 结果文本 → 分类（按顺序匹配）
+RESULT_CATEGORIES = [
+    ("收益", "reward"),
+    ("已签到", "already"),
+    ("风控", "blocked"),
+    ("响应解析失败", "invalid_cookie"),
+    ("签到失败", "failed"),
+    ("请求异常", "request_error"),
+    ("签到异常", "exception"),
+]
+
+
+def result_category(result) -> str:
+    text = str(result or "")
+    for needle, category in RESULT_CATEGORIES:
+        if needle in text:
+            return category
+    return "other"
+
+
+def count_results(results: Dict[str, list]):
+    for logs in (results or {}).values():
+        for r in logs:
+            SIGN_RESULTS.inc(category=result_category(r.get("result")))
+
+
+# ========== /metrics 服务 ==========
+_server: Optional[asyncio.AbstractServer] = None
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await asyncio.wait_for(reader.readline(), 5)
+        while True:   # 跳过请求头
+            line = await asyncio.wait_for(reader.readline(), 5)
+            if line in (b"\r\n", b"\n", b""):
+                break
+        parts = request.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", REGISTRY.render().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """启动 /metrics 服务；port=0 不启动，端口被占用只记录警告"""
+    global _server
+    if _server is not None or not port:
+        return
+    try:
+        _server = await asyncio.start_server(_handle, host, port)
+    except OSError as e:
+        logger.warning("指标服务启动失败 %s:%s: %s", host, port, e)
+        return
+    print(f"📈 指标服务已启动 http://{host}:{port}/metrics")
+
+
+async def stop():
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
@@ -0,0 +1,215 @@
+# node_pool.py
+# 常驻 Node 进程池：替代每次 subprocess.run(["node", "sign.js", ...])
+import os
+import json
+import time
+import asyncio
+import logging
+import itertools
+from typing import Optional
+
+from metrics import NODE_CALL_SECONDS, NODE_SPAWN_SECONDS, NODE_EXITS, NODE_UPTIME_SECONDS
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_JS = os.path.join(BASE_DIR, "worker.js")
+
+NODE_POOL_SIZE = int(os.getenv("NODE_POOL_SIZE", "2"))
+NODE_HEALTH_INTERVAL = int(os.getenv("NODE_HEALTH_INTERVAL", "60"))   # 健康检查间隔（秒）
+NODE_PING_TIMEOUT = int(os.getenv("NODE_PING_TIMEOUT", "10"))
+
+# sign.js 的 SIGN_CONCURRENCY / SIGN_RATE / SIGN_BURST 是全局额度，由所有 Node 进程均分：
+# 份额 = 每个进程池的大小 × 进程池个数（bot 本身或 WORKER_SHARDS 个分片 worker）
+WORKER_SHARDS = int(os.getenv("WORKER_SHARDS", "0"))
+SIGN_RATE = float(os.getenv("SIGN_RATE", "2"))   # 只在这里校验（> 0），sign.js 直接使用同一个环境变量
+
+# 单行响应可能很大（整批签到结果），放宽 StreamReader 行长度限制
+STREAM_LIMIT = 16 * 1024 * 1024
+
+
+class NodeWorkerError(RuntimeError):
+    """Node 进程返回错误或进程异常退出"""
+
+
+class NodeWorker:
+    """单个常驻 node worker.js 进程，按 id 复用同一条 stdin/stdout 管道"""
+
+    def __init__(self, index: int, share: int = 1):
+        self.index = index
+        self.share = share
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.pending = {}
+        self._ids = itertools.count(1)
+        self._reader = None
+        self._write_lock = asyncio.Lock()
+        self.restart_lock = asyncio.Lock()
+        self.started_at = 0.0
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    async def start(self):
+        with NODE_SPAWN_SECONDS.time(proc="node"):
+            self.proc = await asyncio.create_subprocess_exec(
+                "node", WORKER_JS,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                cwd=BASE_DIR,
+                limit=STREAM_LIMIT,
+                env={**os.environ, "SIGN_SHARE": str(self.share)},
+            )
+        self.started_at = time.monotonic()
+        self.pending = {}   # 每个进程一份：旧进程的读取任务只会让发给旧进程的请求失败
+        self._reader = asyncio.create_task(self._read_loop())
+        logger.info("Node worker #%s 已启动 pid=%s", self.index, self.proc.pid)
+
+    async def _read_loop(self):
+        proc, pending = self.proc, self.pending
+        try:
+            while True:
+                line = await proc.stdout.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Node worker #%s 输出无法解析: %s", self.index, line[:200])
+                    continue
+                fut = pending.pop(msg.get("id"), None)
+                if fut is None or fut.done():
+                    continue
+                if msg.get("ok"):
+                    fut.set_result(msg)
+                else:
+                    fut.set_exception(NodeWorkerError(msg.get("error") or "未知错误"))
+        finally:
+            await proc.wait()
+            NODE_EXITS.inc(proc="node", code=proc.returncode)
+            NODE_UPTIME_SECONDS.observe(time.monotonic() - self.started_at, proc="node")
+            logger.warning("Node worker #%s 已退出 code=%s", self.index, proc.returncode)
+            self._fail_pending(pending, NodeWorkerError(f"Node worker 进程退出 (code={proc.returncode})"))
+
+    @staticmethod
+    def _fail_pending(pending: dict, exc: Exception):
+        futs = list(pending.values())
+        pending.clear()
+        for fut in futs:
+            if not fut.done():
+                fut.set_exception(exc)
+
+    async def call(self, op: str, payload: dict, timeout: float):
+        if not self.alive:
+            raise NodeWorkerError(f"Node worker #{self.index} 未运行")
+
+        req_id = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        pending = self.pending
+        pending[req_id] = fut
+
+        line = json.dumps({"id": req_id, "op": op, "payload": payload}, ensure_ascii=False) + "\n"
+        start, outcome = time.perf_counter(), "error"
+        try:
+            async with self._write_lock:
+                self.proc.stdin.write(line.encode("utf-8"))
+                await self.proc.stdin.drain()
+            msg = await asyncio.wait_for(fut, timeout)
+            outcome = "ok"
+            return msg
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        finally:
+            pending.pop(req_id, None)
+            NODE_CALL_SECONDS.observe(time.perf_counter() - start, op=op, outcome=outcome)
+
+    async def stop(self, timeout: float = 10):
+        if self.alive:
+            try:
+                self.proc.stdin.close()
+                await asyncio.wait_for(self.proc.wait(), timeout)
+            except (asyncio.TimeoutError, ConnectionError):
+                self.proc.kill()
+                await self.proc.wait()
+        # 进程已退出也要等旧的读取任务收尾，再启动新进程
+        if self._reader:
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+
+    def kill(self):
+        if self.alive:
+            self.proc.kill()
+
+
+class NodePool:
+    """固定大小的 Node 进程池：最少待处理优先分配，健康检查 + 崩溃自动重启"""
+
+    def __init__(self, size: int = NODE_POOL_SIZE, pools: int = max(1, WORKER_SHARDS)):
+        if SIGN_RATE <= 0:
+            raise ValueError(f"SIGN_RATE 必须大于 0，当前为 {SIGN_RATE}")
+        self.size = max(1, size)
+        share = self.size * max(1, pools)
+        self.workers = [NodeWorker(i, share) for i in range(self.size)]
+        self._health_task = None
+        self._start_lock = asyncio.Lock()
+        self._started = False
+
+    async def start(self):
+        async with self._start_lock:
+            if self._started:
+                return
+            for w in self.workers:
+                await w.start()
+            self._health_task = asyncio.create_task(self._health_loop())
+            self._started = True
+
+    async def stop(self):
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        await asyncio.gather(*(w.stop() for w in self.workers), return_exceptions=True)
+        self._started = False
+
+    async def _restart(self, worker: NodeWorker, force: bool = False):
+        async with worker.restart_lock:
+            if worker.alive and not force:
+                return  # 已被其他调用方重启
+            logger.warning("♻️ 重启 Node worker #%s", worker.index)
+            worker.kill()
+            await worker.stop()
+            await worker.start()
+
+    async def _pick(self) -> NodeWorker:
+        if not self._started:
+            await self.start()
+        for w in self.workers:
+            if not w.alive:
+                await self._restart(w)
+        return min(self.workers, key=lambda w: len(w.pending))
+
+    async def call(self, op: str, payload: dict, timeout: float = 120):
+        """向空闲 worker 发送请求，返回 worker.js 的 result"""
+        result, _ = await self.call_with_meta(op, payload, timeout)
+        return result
+
+    async def call_with_meta(self, op: str, payload: dict, timeout: float = 120):
+        """同 call，额外返回 worker.js 附带的 meta（如签到吞吐统计）"""
+        worker = await self._pick()
+        msg = await worker.call(op, payload, timeout)
+        return msg.get("result"), msg.get("meta") or {}
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(NODE_HEALTH_INTERVAL)
+            for w in self.workers:
+                try:
+                    if not w.alive or (await w.call("ping", {}, NODE_PING_TIMEOUT)).get("result") != "pong":
+                        raise NodeWorkerError("ping 无响应")
+                except Exception as e:
+                    logger.error("Node worker #%s 健康检查失败: %s", w.index, e)
+                    try:
+                        await self._restart(w, force=True)
+                    except Exception as e2:
+                        logger.error("Node worker #%s 重启失败: %s", w.index, e2)
@@ -0,0 +1,160 @@
+# nodeseek_login_async.py
+# nodeseek_login.py 的 asyncio 版本：不阻塞 Telegram 事件循环，可并发登录
+import os
+import time
+import hashlib
+import asyncio
+from typing import Optional
+from curl_cffi.requests import AsyncSession
+
+from nodeseek_login import (
+    LOGIN_URL, API_SIGNIN, ATTENDANCE_URL, NODESEEK_SITEKEY,
+    IMPORTANT_COOKIES, API_BASE_URL, CLIENT_KEY,
+)
+from solver_client import client_from_env
+from flaresolverr import FlareSolverrClient
+from session_pool import pool, DEFAULT_PROFILE
+from singleflight import flights
+from metrics import LOGIN_SECONDS, LOGIN_RESULTS, TURNSTILE_SECONDS
+
+# 每一步的超时（秒），超时即取消该步骤
+FLARESOLVERR_TIMEOUT = float(os.getenv("LOGIN_FLARESOLVERR_TIMEOUT", "70"))
+TURNSTILE_TIMEOUT = float(os.getenv("LOGIN_TURNSTILE_TIMEOUT", "150"))
+SIGNIN_TIMEOUT = float(os.getenv("LOGIN_SIGNIN_TIMEOUT", "45"))
+PROFILE_TIMEOUT = float(os.getenv("LOGIN_PROFILE_TIMEOUT", "30"))
+
+# 同时进行的登录数上限
+LOGIN_CONCURRENCY = int(os.getenv("LOGIN_CONCURRENCY", "5"))
+_login_sem = asyncio.Semaphore(LOGIN_CONCURRENCY)
+
+# Turnstile 求解客户端（SOLVER_ENDPOINTS 多后端，默认 API_BASE_URL）
+solver = client_from_env(API_BASE_URL, CLIENT_KEY)
+
+# FlareSolverr 客户端：复用浏览器会话，cf_clearance 按出口 IP + UA 缓存
+flaresolverr = FlareSolverrClient()
+
+# 可选的预求解 Turnstile token 池（turnstile_pool.TurnstilePool），由 bot 启动时设置
+_token_pool = None
+
+
+def use_token_pool(pool):
+    global _token_pool
+    _token_pool = pool
+
+
+def cookie_string_from_session(s: AsyncSession, important_only: bool = True) -> str:
+    cookies = s.cookies.get_dict()
+    if important_only:
+        cookies = {k: v for k, v in cookies.items() if k in IMPORTANT_COOKIES}
+    return "; ".join([f"{k}={v}" for k, v in cookies.items()])
+
+
+async def solve_login_token(budget: float = TURNSTILE_TIMEOUT) -> Optional[str]:
+    """为登录页求解一个 Turnstile token；budget 按后端个数分给各求解服务，不让第一个后端占满整个登录步骤"""
+    start = time.perf_counter()
+    token = None
+    try:
+        token = await solver.solve(LOGIN_URL, NODESEEK_SITEKEY, budget)
+        return token
+    finally:
+        TURNSTILE_SECONDS.observe(time.perf_counter() - start, outcome="ok" if token else "failed")
+
+
+async def _get_login_token() -> Optional[str]:
+    # 优先使用池中预求解的 token，池空再现场求解
+    token = _token_pool.checkout() if _token_pool else None
+    if token:
+        print("✅ 使用预求解的 Turnstile token")
+        return token
+    return await solve_login_token()
+
+
+async def _step(name: str, coro, timeout: float, default=None):
+    """带超时执行单个登录步骤，超时返回 default（协程会被取消）"""
+    try:
+        with LOGIN_SECONDS.time(stage=name.lower()):
+            return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        print(f"❌ 登录步骤超时: {name} ({timeout:.0f}s)")
+        return default
+
+
+async def _fetch_profile(s: AsyncSession, headers: dict):
+    await s.get("https://www.nodeseek.com/", headers=headers, timeout=30)
+    await s.get("https://www.nodeseek.com/user/profile", headers=headers, timeout=30)
+
+
+async def _login(user: str, password: str) -> Optional[str]:
+    # 1 + 2. FlareSolverr 与 Turnstile 互不依赖，并发执行
+    (flare_cookies, user_agent), token = await asyncio.gather(
+        _step("FlareSolverr", flaresolverr.get_clearance(LOGIN_URL), FLARESOLVERR_TIMEOUT, ({}, "")),
+        _step("Turnstile", _get_login_token(), TURNSTILE_TIMEOUT),
+    )
+    if not token:
+        return None
+
+    # 3. 从连接池借出 session（登录页预热有缓存）并注入 cookies
+    async with pool.checkout("chrome100", warm_url=LOGIN_URL) as s:
+        for k, v in flare_cookies.items():
+            s.cookies.set(k, v)
+
+        headers = {
+            # cf_clearance 与获取它的 User-Agent 绑定
+            "User-Agent": user_agent or "Mozilla/5.0",
+            "Origin": "https://www.nodeseek.com",
+            "Referer": LOGIN_URL,
+            "Content-Type": "application/json",
+        }
+        payload = {
+            "password": password,
+            "token": token,
+            "source": "turnstile",
+        }
+        if "@" in user:
+            payload["email"] = user
+        else:
+            payload["username"] = user
+
+        # 4. 登录请求
+        try:
+            with LOGIN_SECONDS.time(stage="signin"):
+                resp = await asyncio.wait_for(s.post(API_SIGNIN, json=payload, headers=headers, timeout=30), SIGNIN_TIMEOUT)
+            j = resp.json()
+        except Exception as e:
+            print("❌ 登录异常:", repr(e))
+            return None
+
+        if j.get("success"):
+            print("✅ 登录成功，获取完整 cookies...")
+            try:
+                with LOGIN_SECONDS.time(stage="profile"):
+                    await asyncio.wait_for(_fetch_profile(s, headers), PROFILE_TIMEOUT)
+            except Exception as e:
+                print(f"[WARN] 拉取用户信息时失败: {e!r}")
+            return cookie_string_from_session(s, important_only=False)
+        else:
+            print("❌ 登录失败：", j)
+            return None
+
+
+async def login_and_get_cookie(user: str, password: str) -> Optional[str]:
+    """异步登录并返回 cookie 字符串；受 LOGIN_CONCURRENCY 限流，可被取消；同一账号同时只登录一次"""
+    async def run():
+        async with _login_sem:
+            with LOGIN_SECONDS.time(stage="total"):
+                cookie = await _login(user, password)
+        LOGIN_RESULTS.inc(outcome="success" if cookie else "failed")
+        return cookie
+
+    # 键里只放密码摘要，明文密码不长期留在合并表中；不同密码仍各自登录
+    digest = hashlib.sha256(password.encode("utf-8")).hexdigest()
+    return await flights.do(("login", user, digest), run)
+
+
+async def cookie_valid(ns_cookie: str) -> bool:
+    try:
+        async with pool.checkout(DEFAULT_PROFILE) as s:
+            r = await s.get(ATTENDANCE_URL, headers={"Cookie": ns_cookie}, timeout=20)
+        return r.status_code not in (401, 403)
+    except Exception:
+        return False
@@ -0,0 +1,147 @@
+# outbox.py
+# 出站通知队列：管理员事件合并为定时摘要，同一聊天排队中的消息合并发送，统一限速并遵守 RetryAfter
+import os
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from broadcast import limiter, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))                 # 同时发送的协程数
+OUTBOX_DIGEST_INTERVAL = float(os.getenv("OUTBOX_DIGEST_INTERVAL", "60"))  # 管理员摘要间隔（秒）
+OUTBOX_DRAIN_TIMEOUT = 5.0     # 退出时最多等待多久把队列发完
+OUTBOX_NETWORK_RETRIES = 3     # 网络错误 / 超时的重试次数（退避 2、4、8 秒）
+MESSAGE_LIMIT = 4000           # Telegram 单条上限 4096，留出余量
+
+
+def split_text(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """超长文本按行切分，单行超长时硬切"""
+    chunks, cur = [], ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if cur:
+                chunks.append(cur)
+                cur = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if cur and len(cur) + 1 + len(line) > limit:
+            chunks.append(cur)
+            cur = line
+        else:
+            cur = f"{cur}\n{line}" if cur else line
+    if cur or not chunks:
+        chunks.append(cur)
+    return chunks
+
+
+class Outbox:
+    def __init__(self, admin_ids: Iterable[int], limiter=limiter):
+        self.admin_ids = [int(a) for a in admin_ids]
+        self.limiter = limiter
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.pending: Dict[str, List[str]] = {}        # chat_id -> 排队中待合并的文本
+        self.digests: Dict[int, List[str]] = {}        # 管理员 -> 待汇总的事件
+        self._tasks: List[asyncio.Task] = []
+        self.sent = 0
+        self.merged = 0
+
+    # ---------- 对外接口 ----------
+    def send(self, chat_id, text: str):
+        """排队发送；同一聊天还没发出的消息会合并成一条"""
+        chat_id = str(chat_id)
+        texts = self.pending.setdefault(chat_id, [])
+        if texts:
+            self.merged += 1
+        else:
+            self.queue.put_nowait(chat_id)
+        texts.extend(split_text(text))
+
+    def admin_event(self, text: str, admin_ids: Optional[Iterable[int]] = None):
+        """管理员通知：先攒着，每 OUTBOX_DIGEST_INTERVAL 秒合并为一条摘要"""
+        for admin_id in (admin_ids if admin_ids is not None else self.admin_ids):
+            self.digests.setdefault(int(admin_id), []).append(text)
+
+    def start(self, bot):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(bot)) for _ in range(max(1, OUTBOX_WORKERS))]
+            self._tasks.append(asyncio.create_task(self._digest_loop()))
+
+    async def stop(self):
+        """退出前把摘要放进队列，并在 OUTBOX_DRAIN_TIMEOUT 内尽量发完"""
+        self.flush_digests()
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self.queue.join(), OUTBOX_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("退出时仍有 %s 个聊天的消息未发送", len(self.pending))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ---------- 摘要 ----------
+    def flush_digests(self):
+        digests, self.digests = self.digests, {}
+        for admin_id, events in digests.items():
+            if len(events) == 1:
+                self.send(admin_id, events[0])
+            else:
+                self.send(admin_id, f"🧾 管理员通知汇总（{len(events)} 条）:\n" + "\n".join(f"• {e}" for e in events))
+
+    async def _digest_loop(self):
+        while True:
+            await asyncio.sleep(OUTBOX_DIGEST_INTERVAL)
+            self.flush_digests()
+
+    # ---------- 发送 ----------
+    def _take(self, chat_id: str) -> str:
+        """取出不超过 MESSAGE_LIMIT 的合并文本，剩余部分重新排队"""
+        texts = self.pending.get(chat_id, [])
+        parts, size = [], 0
+        while texts and (not parts or size + len(texts[0]) + 2 <= MESSAGE_LIMIT):
+            t = texts.pop(0)
+            parts.append(t)
+            size += len(t) + 2
+        if texts:
+            self.queue.put_nowait(chat_id)
+        else:
+            self.pending.pop(chat_id, None)
+        return "\n\n".join(parts)
+
+    async def _worker(self, bot):
+        while True:
+            chat_id = await self.queue.get()
+            try:
+                text = self._take(chat_id)
+                if text:
+                    await self._send(bot, chat_id, text)
+            except Exception as e:
+                logger.warning("发送消息给 %s 失败: %s", chat_id, e)
+            finally:
+                self.queue.task_done()
+
+    async def _send(self, bot, chat_id: str, text: str):
+        network_failures = 0
+        while True:
+            await self.limiter.acquire(chat_id)
+            try:
+                await bot.send_message(chat_id=chat_id, text=text)
+                self.sent += 1
+                return
+            except RetryAfter as e:
+                wait = retry_after_seconds(e)
+                logger.warning("触发限流，暂停 %.1f 秒", wait)
+                self.limiter.pause(wait)
+            except (Forbidden, BadRequest) as e:
+                logger.info("消息未送达 %s: %s", chat_id, e)
+                return
+            except NetworkError as e:   # 含 TimedOut
+                network_failures += 1
+                if network_failures > OUTBOX_NETWORK_RETRIES:
+                    logger.error("发送给 %s 连续 %s 次网络错误，放弃: %s", chat_id, network_failures, e)
+                    return
+                await asyncio.sleep(2 ** network_failures)
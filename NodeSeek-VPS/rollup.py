@@ -0,0 +1,138 @@
+# rollup.py
+# 当日签到汇总：append_user_log 写日志时增量更新，/hz 与 10:05 汇总直接读取内存
+import os
+import re
+import json
+import atexit
+import asyncio
+import logging
+from typing import Callable, Dict
+
+from datastore import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FILE = os.getenv("ROLLUP_FILE", "rollup.json")
+ROLLUP_FLUSH_DELAY = float(os.getenv("ROLLUP_FLUSH_DELAY", "2.0"))
+
+AMOUNT_RE = re.compile(r"(\d+)")
+
+
+def _empty_user() -> dict:
+    return {"count": 0, "yield": 0, "manual": 0, "auto": 0, "entries": []}
+
+
+class DailyRollup:
+    """
+    结构：{"date": "YYYY-MM-DD", "users": {uid: {count, yield, manual, auto, entries}}}
+    只保留当天，跨天后第一次写入自动清空
+    """
+
+    def __init__(self, path: str = ROLLUP_FILE, flush_delay: float = ROLLUP_FLUSH_DELAY):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.date = ""
+        self.users: Dict[str, dict] = {}
+        self._flush_handle = None
+        self._dirty = False
+        self.loaded = self._load()
+        atexit.register(self.flush)
+
+    def _load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("rollup.json 读取失败，将重建: %s", e)
+            return False
+        self.date = data.get("date", "")
+        self.users = data.get("users", {})
+        return True
+
+    def rebuild(self, date: str, logs_on: Callable[[str], Dict[str, list]]):
+        """rollup 文件缺失或损坏时，从当天日志重建一次"""
+        self.date, self.users = date, {}
+        for uid, entries in logs_on(date).items():
+            for entry in entries:
+                self._add(uid, entry)
+        self._mark_dirty()
+
+    def _add(self, uid: str, entry: dict):
+        u = self.users.setdefault(uid, _empty_user())
+        source = "manual" if entry.get("source") == "manual" else "auto"
+        m = AMOUNT_RE.search(str(entry.get("result", "")))
+        u["count"] += 1
+        u["yield"] += int(m.group(1)) if m else 0
+        u[source] += 1
+        u["entries"].append({
+            "name": entry.get("name", ""),
+            "result": entry.get("result", ""),
+            "source": source,
+            "cookie_refreshed": bool(entry.get("cookie_refreshed")),
+        })
+
+    def record(self, uid: str, entry: dict):
+        """记录一条签到收益日志（调用方已过滤只含“收益”的记录）"""
+        date = str(entry.get("time", ""))[:10]
+        if date != self.date:
+            if date < self.date:
+                return  # 过期日志不计入
+            self.date, self.users = date, {}
+        self._add(str(uid), entry)
+        self._mark_dirty()
+
+    def today(self, date: str) -> Dict[str, dict]:
+        """返回指定日期的汇总，日期不符（尚无当天记录）时为空"""
+        return self.users if date == self.date else {}
+
+    # ---------- 落盘 ----------
+    def _mark_dirty(self):
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_delay, self.flush)
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+        atomic_write_json(self.path, {"date": self.date, "users": self.users}, indent=None)
+        self._dirty = False
+
+
+def render_summary(rollup_users: Dict[str, dict], users: dict,
+                   mode_text: Callable[[bool], str], mask_username: Callable[[str], str],
+                   title: str = "📋 今日签到成功汇总:\n") -> str:
+    """按 rollup 生成汇总文本，只遍历当天有记录的用户（已删除的用户不显示）"""
+    text = title
+    total_count = total_yield = 0
+
+    for uid, r in rollup_users.items():
+        u = users.get(uid)
+        if u is None or not r["entries"]:
+            continue
+        text += f"\n👤 {u.get('tgUsername', uid)}【{mode_text(u.get('mode', False))}】\n🆔 {uid}\n"
+
+        for e in r["entries"]:
+            tag = "[手动]" if e["source"] == "manual" else "[自动]"
+            line = f"{tag} {e['result']} - {mask_username(e['name'])}"
+            if e.get("cookie_refreshed"):
+                line += "  ♻️"
+            text += line + "\n"
+
+        total_count += r["count"]
+        total_yield += r["yield"]
+
+    if not total_count:
+        text += "\n（今天暂无签到收益记录）"
+    else:
+        text += f"\n📊 合计 {total_count} 次，🍗 {total_yield} 个"
+    return text
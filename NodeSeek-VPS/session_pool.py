@@ -0,0 +1,150 @@
+# session_pool.py
+# curl_cffi AsyncSession 连接池：按浏览器指纹复用 TLS/HTTP2 连接，登录、巡检、求解共用
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from curl_cffi import requests
+from curl_cffi.requests import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+SESSION_POOL_MAX = int(os.getenv("SESSION_POOL_MAX", "8"))        # 每个指纹最多同时借出的会话
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "300"))      # 空闲多久后关闭（秒）
+SESSION_WARMUP_TTL = int(os.getenv("SESSION_WARMUP_TTL", "600"))  # 预热结果缓存多久（秒）
+
+# 指纹不受支持时的回退
+PROFILE_FALLBACKS = {"chrome100": "chrome99"}
+DEFAULT_PROFILE = "default"   # 不指定 impersonate 的普通会话
+
+
+class PooledSession:
+    def __init__(self, session: AsyncSession, profile: str):
+        self.session = session
+        self.profile = profile
+        self.last_used = time.monotonic()
+        self.warm = {}   # 预热 URL -> (预热时间, 预热得到的 cookies)
+
+
+class SessionPool:
+    def __init__(self, max_size: int = SESSION_POOL_MAX):
+        self.max_size = max_size
+        self.idle: Dict[str, List[PooledSession]] = {}
+        self.shared_sessions: Dict[str, PooledSession] = {}
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+        self._resolved: Dict[str, Optional[str]] = {}   # 请求的指纹 -> 实际可用的指纹
+        self.created = 0
+        self.reused = 0
+
+    def _new_session(self, profile: str) -> AsyncSession:
+        self.created += 1
+        if profile == DEFAULT_PROFILE:
+            return AsyncSession()
+        actual = self._resolved.get(profile, profile)
+        try:
+            s = AsyncSession(impersonate=actual)
+        except requests.exceptions.ImpersonateError:
+            actual = PROFILE_FALLBACKS.get(profile)
+            if not actual:
+                raise
+            print(f"[WARN] {profile} 不支持，回退到 {actual}")
+            s = AsyncSession(impersonate=actual)
+        self._resolved[profile] = actual   # 记住结果，之后不再先尝试不支持的指纹
+        return s
+
+    # ---------- 共享会话：无状态 API 调用（求解服务、FlareSolverr 等） ----------
+    def shared(self, profile: str = DEFAULT_PROFILE) -> AsyncSession:
+        ps = self.shared_sessions.get(profile)
+        if ps is None:
+            ps = PooledSession(self._new_session(profile), profile)
+            self.shared_sessions[profile] = ps
+        else:
+            self.reused += 1
+        ps.last_used = time.monotonic()
+        return ps.session
+
+    # ---------- 独占会话：带 cookie 状态的请求（登录、cookie 检查） ----------
+    @asynccontextmanager
+    async def checkout(self, profile: str = "chrome100", warm_url: Optional[str] = None):
+        """借出一个 cookie 已清空的会话；warm_url 的预热在 SESSION_WARMUP_TTL 内只做一次"""
+        sem = self._sems.setdefault(profile, asyncio.Semaphore(self.max_size))
+        async with sem:
+            idle = self.idle.setdefault(profile, [])
+            if idle:
+                ps = idle.pop()
+                self.reused += 1
+            else:
+                ps = PooledSession(self._new_session(profile), profile)
+
+            ps.session.cookies.clear()
+            if warm_url:
+                await self._warm_up(ps, warm_url)
+
+            ok = False
+            try:
+                yield ps.session
+                ok = True
+            finally:
+                ps.session.cookies.clear()   # 归还前清空，避免账号之间串 cookie
+                ps.last_used = time.monotonic()
+                if ok:
+                    idle.append(ps)
+                else:
+                    await self._close(ps)    # 出错或被取消的会话不再复用
+
+    async def _warm_up(self, ps: PooledSession, url: str):
+        warmed_at, cookies = ps.warm.get(url, (0.0, {}))
+        if time.monotonic() - warmed_at < SESSION_WARMUP_TTL:
+            for k, v in cookies.items():
+                ps.session.cookies.set(k, v)
+            return
+        try:
+            await ps.session.get(url, timeout=15)
+            ps.warm[url] = (time.monotonic(), ps.session.cookies.get_dict())
+        except Exception as e:
+            print(f"[WARN] 初始访问 {url} 失败: {e}")
+
+    # ---------- 回收 ----------
+    async def _close(self, ps: PooledSession):
+        try:
+            await ps.session.close()
+        except Exception as e:
+            logger.debug("关闭会话失败: %s", e)
+
+    async def evict_idle(self):
+        """关闭空闲超过 SESSION_IDLE_TTL 的会话"""
+        now = time.monotonic()
+        expired = []
+        for idle in self.idle.values():
+            expired += [ps for ps in idle if now - ps.last_used > SESSION_IDLE_TTL]
+            idle[:] = [ps for ps in idle if now - ps.last_used <= SESSION_IDLE_TTL]
+        for profile, ps in list(self.shared_sessions.items()):
+            if now - ps.last_used > SESSION_IDLE_TTL:
+                del self.shared_sessions[profile]
+                expired.append(ps)
+        for ps in expired:
+            await self._close(ps)
+
+    async def close(self):
+        for idle in self.idle.values():
+            for ps in idle:
+                await self._close(ps)
+        self.idle.clear()
+        for ps in self.shared_sessions.values():
+            await self._close(ps)
+        self.shared_sessions.clear()
+
+    def stats(self) -> dict:
+        return {
+            "idle": sum(len(v) for v in self.idle.values()),
+            "shared": len(self.shared_sessions),
+            "created": self.created,
+            "reused": self.reused,
+        }
+
+
+# 进程内共享的连接池
+pool = SessionPool()
@@ -11,6 +11,56 @@ function writeLog(message) {
   fs.appendFileSync(filePath, `[${time}] ${message}\n`);
 }
 
+// ========== 并发与限速配置 ==========
+// SIGN_CONCURRENCY / SIGN_RATE / SIGN_BURST 是所有 Node 进程合计的额度；
+// NodePool 通过 SIGN_SHARE 告知本进程占几分之一（进程池大小 × worker 分片数），这里按份额均分
+const SIGN_SHARE = Math.max(1, parseInt(process.env.SIGN_SHARE || '1', 10));
+const SIGN_CONCURRENCY_TOTAL = parseInt(process.env.SIGN_CONCURRENCY || '5', 10);   // 全局并发上限
+const SIGN_RATE_TOTAL = parseFloat(process.env.SIGN_RATE || '2');                 // 每个域名每秒请求数（全局），由 NodePool 启动时校验 > 0
+const SIGN_BURST_TOTAL = parseInt(process.env.SIGN_BURST || '4', 10);             // 每个域名突发上限（全局）
+
+const SIGN_CONCURRENCY = Math.max(1, Math.floor(SIGN_CONCURRENCY_TOTAL / SIGN_SHARE));
+const SIGN_RATE = SIGN_RATE_TOTAL / SIGN_SHARE;
+const SIGN_BURST = Math.max(1, Math.floor(SIGN_BURST_TOTAL / SIGN_SHARE));
+
+// 令牌桶：按域名限速，所有并发任务共享
+class TokenBucket {
+  constructor(rate, burst) {
+    this.rate = rate;
+    this.burst = burst;
+    this.tokens = burst;
+    this.last = Date.now();
+    this.queue = Promise.resolve();
+  }
+
+  refill() {
+    const now = Date.now();
+    this.tokens = Math.min(this.burst, this.tokens + ((now - this.last) / 1000) * this.rate);
+    this.last = now;
+  }
+
+  // 排队取令牌，保证先到先得
+  take() {
+    this.queue = this.queue.then(async () => {
+      this.refill();
+      if (this.tokens < 1) {
+        const waitMs = Math.ceil(((1 - this.tokens) / this.rate) * 1000);
+        await new Promise(res => setTimeout(res, waitMs));
+        this.refill();
+      }
+      this.tokens -= 1;
+    });
+    return this.queue;
+  }
+}
+
+const buckets = new Map();
+function bucketFor(url) {
+  const host = new URL(url).host;
+  if (!buckets.has(host)) buckets.set(host, new TokenBucket(SIGN_RATE, SIGN_BURST));
+  return buckets.get(host);
+}
+
 function chunkString(str, length = 1000) {
   const chunks = [];
   for (let i = 0; i < str.length; i += length) {
@@ -44,6 +94,8 @@ async function signSingle(name, cookie, randomMode = false) {
       'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36',
     };
 
+    await bucketFor(url).take();
+
     try {
       const res = await cloudscraper.post({
         uri: url,
@@ -106,40 +158,64 @@ async function signSingle(name, cookie, randomMode = false) {
   return lastErrorResult || { name, result: '🚫 未知错误', time: new Date().toLocaleString() };
 }
 
-// 安全版 signAccounts
-async function signAccounts(targets, userModes) {
+// 并发版 signAccounts：全局并发上限 + 按域名令牌桶，结果按用户、账号原顺序返回
+async function signAccountsWithStats(targets, userModes, concurrency = SIGN_CONCURRENCY) {
   const results = {};
+  const tasks = [];
   for (const userId in targets) {
-    results[userId] = [];
-    const accounts = targets[userId];
+    const accounts = Object.entries(targets[userId]);
+    results[userId] = new Array(accounts.length);
     const mode = userModes[userId] || false;
+    accounts.forEach(([name, cookie], index) => tasks.push({ userId, index, name, cookie, mode }));
+  }
 
-    for (const [name, cookie] of Object.entries(accounts)) {
+  const startedAt = Date.now();
+  let next = 0;
+
+  async function runner() {
+    while (next < tasks.length) {
+      const { userId, index, name, cookie, mode } = tasks[next++];
       try {
-        const res = await signSingle(name, cookie, mode);
-        results[userId].push(res);
+        results[userId][index] = await signSingle(name, cookie, mode);
       } catch (e) {
-        results[userId].push({
+        results[userId][index] = {
           name,
           result: `🚫 签到异常: ${e.message}`,
           time: new Date().toLocaleString()
-        });
+        };
         writeLog(`⚠️ 用户 ${userId} 账号 ${name} 签到异常: ${e.stack || e.message}`);
       }
     }
   }
+
+  const workers = Math.max(1, Math.min(concurrency, tasks.length));
+  await Promise.all(Array.from({ length: workers }, runner));
+
+  const elapsed = (Date.now() - startedAt) / 1000;
+  const stats = {
+    accounts: tasks.length,
+    concurrency: workers,
+    elapsed: Number(elapsed.toFixed(3)),
+    throughput: elapsed > 0 ? Number((tasks.length / elapsed).toFixed(2)) : tasks.length,
+  };
+  writeLog(`📈 批量签到完成: ${stats.accounts} 个账号, 并发 ${stats.concurrency}, 耗时 ${stats.elapsed}s, 吞吐 ${stats.throughput} 个/秒`);
+  return { results, stats };
+}
+
+async function signAccounts(targets, userModes, concurrency = SIGN_CONCURRENCY) {
+  const { results } = await signAccountsWithStats(targets, userModes, concurrency);
   return results;
 }
 
-module.exports = { signSingle, signAccounts };
+module.exports = { signSingle, signAccounts, signAccountsWithStats };
 
 // ✅ CLI 入口：供 Python 调用
 if (require.main === module) {
   (async () => {
     try {
       const payload = JSON.parse(process.argv[2]);
-      const { targets, userModes } = payload;
-      const results = await signAccounts(targets, userModes);
+      const { targets, userModes, concurrency } = payload;
+      const results = await signAccounts(targets, userModes || {}, concurrency || SIGN_CONCURRENCY);
       console.log(JSON.stringify(results));
     } catch (err) {
       console.error("sign.js 运行出错:", err.message);
@@ -0,0 +1,129 @@
+# sign_worker.py
+# 签到 / 收益查询的执行逻辑。WORKER_SHARDS=0 时 bot 进程内直接调用；
+# 否则作为分片 worker 进程运行，从 jobs.db 领取本分片的任务：python sign_worker.py <分片号>
+import os
+import sys
+import signal
+import socket
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+load_dotenv()   # 手动单独运行时读取 .env，须在导入下列模块之前
+
+from node_pool import NodePool
+from session_pool import pool as session_pool
+from jobqueue import JobQueue, JOB_DB, JOB_HEARTBEAT
+import metrics
+from metrics import SIGN_SECONDS, STATS_SECONDS, count_results
+
+logger = logging.getLogger(__name__)
+
+# 一次批量签到的超时（秒）；账号并发数由 sign.js 的 SIGN_CONCURRENCY 控制
+SIGN_TIMEOUT = int(os.getenv("SIGN_TIMEOUT", "120"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))   # 单个 worker 同时执行的任务数
+WORKER_POLL = float(os.getenv("WORKER_POLL", "0.5"))             # 空闲时轮询队列的间隔（秒）
+
+
+# ========== 任务实现 ==========
+# 任务里只有 cookie，不含账号密码，也不读写 data.json；cookie 失效时由 coordinator 在 bot 进程内登录后再下发签到
+
+async def sign_accounts(node_pool, targets, user_modes):
+    """targets = {uid: {账号名: cookie}}，返回 {uid: [结果]}；sign.js 调用失败时抛出异常"""
+    payload = {"targets": targets, "userModes": user_modes}
+
+    with SIGN_SECONDS.time(stage="batch"):
+        results, meta = await node_pool.call_with_meta("sign", payload, timeout=SIGN_TIMEOUT)
+    count_results(results)
+
+    if meta:
+        logging.info("批量签到: %s 个账号, 并发 %s, 耗时 %ss, 吞吐 %s 个/秒",
+                     meta.get("accounts"), meta.get("concurrency"), meta.get("elapsed"), meta.get("throughput"))
+    return results
+
+
+async def stats_accounts(node_pool, targets, days):
+    """targets = {uid: {账号名: cookie}}"""
+    with STATS_SECONDS.time(stage="node"):
+        return await node_pool.call("stats", {"targets": targets, "days": days}, timeout=60)
+
+
+async def run_job(node_pool, kind: str, payload: dict):
+    if kind == "sign":
+        return await sign_accounts(node_pool, payload["targets"], payload["userModes"])
+    if kind == "stats":
+        return await stats_accounts(node_pool, payload["targets"], payload["days"])
+    raise ValueError(f"未知任务类型: {kind}")
+
+
+# ========== 分片 worker 进程 ==========
+async def serve(shard: int, path: str = JOB_DB):
+    queue = JobQueue(path)
+    node_pool = NodePool()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    sem = asyncio.Semaphore(max(1, WORKER_CONCURRENCY))
+    running = set()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:   # Windows
+            pass
+
+    async def beat(job_id):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT)
+            try:
+                if not queue.heartbeat(job_id, worker_id):
+                    logger.warning("任务 #%s 已被判定超时并转交，结果将被丢弃", job_id)
+                    return
+            except Exception as e:
+                logger.warning("任务 #%s 刷新心跳失败: %s", job_id, e)
+
+    async def execute(job_id, kind, payload):
+        heartbeat = asyncio.create_task(beat(job_id))
+        try:
+            result = await run_job(node_pool, kind, payload)
+            if not queue.complete(job_id, worker_id, result):
+                logger.warning("任务 #%s 已不归本 worker，丢弃结果", job_id)
+        except Exception as e:
+            logger.error("任务 #%s (%s) 失败: %s", job_id, kind, e)
+            queue.fail(job_id, worker_id, f"{type(e).__name__}: {e}")
+        finally:
+            heartbeat.cancel()
+            sem.release()
+
+    if metrics.METRICS_PORT:
+        await metrics.start(metrics.METRICS_PORT + 1 + shard)
+    print(f"🛠️ 签到 worker 已启动：分片 {shard}, {worker_id}")
+    try:
+        while not stop.is_set():
+            await sem.acquire()
+            job = queue.claim(shard, worker_id)
+            if job is None:
+                sem.release()
+                try:
+                    await asyncio.wait_for(stop.wait(), WORKER_POLL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(execute(*job))
+            running.add(task)
+            task.add_done_callback(running.discard)
+    finally:
+        # 不再领取新任务，已领取的执行完再退出
+        await asyncio.gather(*running, return_exceptions=True)
+        await node_pool.stop()
+        await session_pool.close()
+        await metrics.stop()
+        print(f"🛑 签到 worker 已退出：分片 {shard}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python sign_worker.py <分片号> [jobs.db]")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(int(sys.argv[1]), *sys.argv[2:3]))
@@ -0,0 +1,130 @@
+# singleflight.py
+# 请求合并：同一 (操作, uid, 账号) 同时只执行一次，并发调用方共享结果，成功结果短时间缓存
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_TTL = float(os.getenv("SINGLEFLIGHT_TTL", "30"))   # 结果缓存时间（秒），0 表示只合并不缓存
+
+
+class SingleFlight:
+    def __init__(self, ttl: float = SINGLEFLIGHT_TTL):
+        self.ttl = ttl
+        self.inflight: Dict[Hashable, asyncio.Future] = {}
+        self.cache: Dict[Hashable, Tuple[float, Any]] = {}
+        self.shared = 0    # 合并或命中缓存的次数
+
+    def _cached(self, key):
+        hit = self.cache.get(key)
+        if hit is None:
+            return None
+        expires_at, value = hit
+        if time.monotonic() >= expires_at:
+            del self.cache[key]
+            return None
+        return value
+
+    def _claim(self, key) -> Tuple[asyncio.Future, bool]:
+        """返回 (future, 是否由调用方负责执行)"""
+        value = self._cached(key)
+        if value is not None:
+            fut = asyncio.get_running_loop().create_future()
+            fut.set_result(value)
+            self.shared += 1
+            return fut, False
+        fut = self.inflight.get(key)
+        if fut is not None:
+            self.shared += 1
+            return fut, False
+        fut = asyncio.get_running_loop().create_future()
+        self.inflight[key] = fut
+        return fut, True
+
+    def _resolve(self, key, fut: asyncio.Future, value=None, exc: BaseException = None, ttl: float = None,
+                 cache_if: Callable[[Any], bool] = None):
+        if self.inflight.get(key) is fut:
+            del self.inflight[key]
+        if fut.done():
+            return
+        if isinstance(exc, asyncio.CancelledError):
+            fut.cancel()      # 负责执行的调用方被取消，等待方按失败处理
+            return
+        if exc is not None:
+            fut.set_exception(exc)
+            fut.exception()   # 无人等待时不报 "exception was never retrieved"
+            return
+        fut.set_result(value)
+        ttl = self.ttl if ttl is None else ttl
+        # 失败（None，或 cache_if 判定为失败的结果）不缓存，下次调用重新执行
+        if value is not None and ttl > 0 and (cache_if is None or cache_if(value)):
+            self.cache[key] = (time.monotonic() + ttl, value)
+
+    async def do(self, key, fn: Callable[[], Awaitable[Any]], ttl: float = None):
+        """单个操作：已有相同 key 在执行时等待它的结果"""
+        fut, owner = self._claim(key)
+        if not owner:
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if fut.cancelled():
+                    return None
+                raise
+        try:
+            value = await fn()
+        except BaseException as e:
+            self._resolve(key, fut, exc=e)
+            raise
+        self._resolve(key, fut, value, ttl=ttl)
+        return value
+
+    async def batch(self, op: str, keys: Iterable[tuple],
+                    run: Callable[[list], Awaitable[Dict[tuple, Any]]], ttl: float = None,
+                    cache_if: Callable[[Any], bool] = None):
+        """
+        批量操作：keys 为 (uid, 账号, ...) 列表，只有没在执行中的 key 交给 run(本次负责的 keys) 执行，
+        返回 ({key: 结果}, 来自其他调用方的 key 集合)；没有结果的 key 不出现在返回值里。
+        cache_if(结果) 为假的结果只与同时进行的调用共享，不缓存
+        """
+        owned, waiting = {}, {}
+        for k in keys:
+            fut, owner = self._claim((op, *k))
+            (owned if owner else waiting)[k] = fut
+
+        out = {}
+        if owned:
+            try:
+                results = await run(list(owned))
+            except BaseException as e:
+                for k, fut in owned.items():
+                    self._resolve((op, *k), fut, exc=e)
+                raise
+            for k, fut in owned.items():
+                self._resolve((op, *k), fut, results.get(k), ttl=ttl, cache_if=cache_if)
+                if results.get(k) is not None:
+                    out[k] = results[k]
+
+        for k, fut in waiting.items():
+            try:
+                value = await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if fut.cancelled():
+                    continue
+                raise
+            except Exception as e:
+                logger.warning("合并的 %s %s 执行失败: %s", op, k, e)
+                continue
+            if value is not None:
+                out[k] = value
+        return out, set(waiting)
+
+    def purge(self):
+        now = time.monotonic()
+        self.cache = {k: v for k, v in self.cache.items() if v[0] > now}
+
+
+# 进程内共享
+flights = SingleFlight()
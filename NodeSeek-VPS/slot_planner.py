@@ -0,0 +1,87 @@
+# slot_planner.py
+# 签到时段容量规划：统计每个时段的账号数，限制单个时段容量，为新用户分配最空闲的时段
+# 时段 = 用户设置的起始时间 HH:MM。容量按起始时段计，不是每分钟的实际负载：
+# 账号在起始时间后 SIGN_JITTER 秒内抖动签到，会落到其后几分钟，与相邻时段的签到重叠
+import os
+import zlib
+from typing import Dict, List, Optional
+
+from slot_scheduler import Slot, slot_of, SIGN_JITTER
+
+SLOT_CAPACITY = int(os.getenv("SLOT_CAPACITY", "20"))   # 每个起始时段最多的账号数（按设置的签到时间计，非每分钟）
+SLOT_HOURS = range(0, 10)                                # 可选签到时间 0–9 点（与 /settime 一致）
+ALL_SLOTS = [(h, m) for h in SLOT_HOURS for m in range(60)]
+
+
+def slot_text(slot: Slot) -> str:
+    return f"{slot[0]:02d}:{slot[1]:02d}"
+
+
+class SlotPlanner:
+    def __init__(self, store, capacity: int = SLOT_CAPACITY):
+        self.store = store
+        self.capacity = capacity
+
+    def load(self, exclude_uid: Optional[str] = None) -> Dict[Slot, int]:
+        """每个时段已预约的账号数（可排除某个用户自己的账号）"""
+        counts: Dict[Slot, int] = {}
+        for uid, u in self.store.users().items():
+            n = len(u.get("accounts", {}))
+            if n and uid != exclude_uid:
+                slot = slot_of(u)
+                counts[slot] = counts.get(slot, 0) + n
+        return counts
+
+    @staticmethod
+    def by_hour(load: Dict[Slot, int]) -> Dict[int, int]:
+        hours: Dict[int, int] = {}
+        for (h, _), n in load.items():
+            hours[h] = hours.get(h, 0) + n
+        return hours
+
+    def fits(self, slot: Slot, accounts: int, load: Dict[Slot, int]) -> bool:
+        booked = load.get(slot, 0)
+        # 账号数本身超过容量的用户只能独占一个空时段
+        return booked + accounts <= self.capacity or booked == 0
+
+    def least_loaded(self, exclude_uid: Optional[str] = None) -> Slot:
+        """
+        负载最低的时段（exclude_uid 为正在分配的用户）。负载相同时先选总负载最低的小时，
+        小时内按 uid 哈希错开起始分钟，新用户不会依次挤在 00:00、00:01…
+        """
+        load = self.load(exclude_uid)
+        hours = self.by_hour(load)
+        offset = zlib.crc32(str(exclude_uid or "").encode("utf-8")) % 60
+        return min(ALL_SLOTS, key=lambda s: (load.get(s, 0), hours.get(s[0], 0), (s[1] - offset) % 60, s[0]))
+
+    def nearby(self, slot: Slot, accounts: int = 1, exclude_uid: Optional[str] = None, n: int = 3) -> List[Slot]:
+        """离 slot 最近、还能容纳 accounts 个账号的时段"""
+        load = self.load(exclude_uid)
+        target = slot[0] * 60 + slot[1]
+        free = [s for s in ALL_SLOTS if s != slot and self.fits(s, accounts, load)]
+        free.sort(key=lambda s: (abs(s[0] * 60 + s[1] - target), s))
+        return free[:n]
+
+    def histogram(self, width: int = 20) -> str:
+        """按小时汇总的负载直方图 + 最拥挤的时段"""
+        load = self.load()
+        if not load:
+            return "📊 暂无签到预约"
+
+        by_hour = self.by_hour(load)
+        top = max(by_hour.values())
+
+        lines = [f"📊 签到时段负载（容量按起始时段计：每个 HH:MM 最多 {self.capacity} 个账号，"
+                 f"实际签到在其后 {SIGN_JITTER // 60} 分钟内分散）:"]
+        for h in sorted(by_hour):
+            peak_slot = max((s for s in load if s[0] == h), key=lambda s: load[s])
+            bar = "█" * max(1, round(by_hour[h] / top * width))
+            lines.append(f"{h:02d}时 {bar} {by_hour[h]}  峰值 {slot_text(peak_slot)} {load[peak_slot]}")
+
+        full = [s for s, n in load.items() if n > self.capacity]
+        busiest = sorted(load, key=lambda s: (-load[s], s))[:5]
+        lines.append("")
+        lines.append("🔥 最拥挤: " + ", ".join(f"{slot_text(s)}({load[s]})" for s in busiest))
+        if full:
+            lines.append(f"⚠️ 超出容量的时段: {len(full)} 个")
+        return "\n".join(lines)
@@ -0,0 +1,164 @@
+# slot_scheduler.py
+# 按签到时段分桶的批量调度：每个 (小时, 分钟) 一个定时任务，账号抖动按哈希确定，同一窗口的账号合并为一批
+import os
+import hashlib
+import logging
+from datetime import datetime, time
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from telegram.ext import CallbackContext
+
+from metrics import SCHEDULER_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SIGN_JITTER = int(os.getenv("SIGN_JITTER", "300"))              # 每个账号在时段内的随机延后上限（秒）
+SIGN_BATCH_WINDOW = int(os.getenv("SIGN_BATCH_WINDOW", "60"))   # 抖动落在同一窗口内的账号合并为一批（秒）
+
+beijing = ZoneInfo("Asia/Shanghai")
+
+Slot = Tuple[int, int]
+Batch = Dict[str, List[str]]   # uid -> 账号名列表
+
+
+def slot_of(u: dict) -> Slot:
+    return (u.get("sign_hour") or 0, u.get("sign_minute") or 0)
+
+
+def account_jitter(uid: str, name: str, day: str, jitter: int = SIGN_JITTER) -> int:
+    """账号当天的延后秒数：由 (日期, uid, 账号) 哈希得出，每天不同但可重复计算，不需要常驻 sleep"""
+    digest = hashlib.sha1(f"{day}|{uid}|{name}".encode()).digest()
+    return int.from_bytes(digest[:4], "big") % (jitter + 1)
+
+
+class SlotScheduler:
+    def __init__(self, store,
+                 run_batch: Callable[[Batch], Awaitable[Dict[str, list]]],
+                 on_user_done: Callable[..., Awaitable[None]],
+                 jitter: int = SIGN_JITTER, window: int = SIGN_BATCH_WINDOW):
+        self.store = store
+        self.run_batch = run_batch          # 执行一批签到，返回 {uid: [结果]}
+        self.on_user_done = on_user_done    # 用户在本时段的所有账号签完后回调一次 (app, uid, 结果)
+        self.jitter = jitter
+        self.window = max(1, window)
+        self.slots: Dict[Slot, Set[str]] = {}
+        self.user_slot: Dict[str, Slot] = {}
+        self.job_queue = None
+
+    # ---------- 分桶 ----------
+    def attach(self, job_queue):
+        """按当前数据建立全部时段任务"""
+        self.job_queue = job_queue
+        for uid, u in self.store.users().items():
+            if u.get("accounts"):
+                self.update(uid)
+        logger.info("签到时段: %s 个, 用户 %s 个", len(self.slots), len(self.user_slot))
+
+    def update(self, uid: str):
+        """用户新增或修改时间后调用：只移动这一个用户，必要时增删对应时段的任务"""
+        u = self.store.user(uid)
+        if not u or not u.get("accounts"):
+            return self.remove(uid)
+        slot = slot_of(u)
+        if self.user_slot.get(uid) == slot:
+            return
+        self.remove(uid)
+        self.user_slot[uid] = slot
+        bucket = self.slots.setdefault(slot, set())
+        if not bucket:
+            self._add_job(slot)
+        bucket.add(uid)
+
+    def remove(self, uid: str):
+        slot = self.user_slot.pop(uid, None)
+        if slot is None:
+            return
+        bucket = self.slots.get(slot)
+        if bucket is not None:
+            bucket.discard(uid)
+            if not bucket:
+                del self.slots[slot]
+                self._remove_job(slot)
+
+    @staticmethod
+    def _job_name(slot: Slot) -> str:
+        return f"slot_{slot[0]:02d}{slot[1]:02d}"
+
+    def _add_job(self, slot: Slot):
+        if self.job_queue is None:
+            return
+        self.job_queue.run_daily(
+            self._fire,
+            time=time(hour=slot[0], minute=slot[1], tzinfo=beijing),
+            data=slot,
+            name=self._job_name(slot),
+        )
+
+    def _remove_job(self, slot: Slot):
+        if self.job_queue is None:
+            return
+        for job in self.job_queue.get_jobs_by_name(self._job_name(slot)):
+            job.schedule_removal()
+
+    # ---------- 拆分子批次 ----------
+    def plan(self, slot: Slot, day: str) -> List[Tuple[int, Batch]]:
+        """把时段内的账号按抖动窗口拆成子批次：[(延后秒数, {uid: [账号]})]，按时间先后"""
+        users = self.store.users()
+        windows: Dict[int, Batch] = {}
+        for uid in sorted(self.slots.get(slot, ())):
+            u = users.get(uid)
+            if not u or slot_of(u) != slot:
+                continue
+            for name in u.get("accounts", {}):
+                offset = account_jitter(uid, name, day, self.jitter)
+                windows.setdefault(offset // self.window, {}).setdefault(uid, []).append(name)
+        return [(idx * self.window, windows[idx]) for idx in sorted(windows)]
+
+    async def _fire(self, context: CallbackContext):
+        slot = context.job.data
+        now = datetime.now(beijing)
+        planned = now.replace(hour=slot[0], minute=slot[1], second=0, microsecond=0)
+        SCHEDULER_LAG_SECONDS.observe(max(0.0, (now - planned).total_seconds()), stage="slot")
+        day = now.strftime("%Y-%m-%d")
+        batches = self.plan(slot, day)
+        if not batches:
+            return
+
+        # 每个用户剩余的子批次数，全部完成后合并结果推送一次
+        run = {"pending": {}, "results": {}}
+        for _, batch in batches:
+            for uid in batch:
+                run["pending"][uid] = run["pending"].get(uid, 0) + 1
+        logger.info("时段 %02d:%02d: %s 个用户, %s 个子批次",
+                    slot[0], slot[1], len(run["pending"]), len(batches))
+
+        for i, (offset, batch) in enumerate(batches):
+            context.job_queue.run_once(
+                self._run_sub,
+                when=offset,
+                data=(run, batch, planned.timestamp() + offset),
+                name=f"{self._job_name(slot)}_{i}",
+            )
+
+    async def _run_sub(self, context: CallbackContext):
+        run, batch, planned = context.job.data
+        SCHEDULER_LAG_SECONDS.observe(max(0.0, datetime.now(beijing).timestamp() - planned), stage="batch")
+        try:
+            results = await self.run_batch(batch)
+        except Exception as e:
+            logger.error("子批次签到异常: %s", e)
+            results = {}
+
+        for uid in batch:
+            run["results"].setdefault(uid, []).extend(results.get(uid, []))
+            run["pending"][uid] -= 1
+            if run["pending"][uid] == 0:
+                try:
+                    await self.on_user_done(context.application, uid, run["results"].pop(uid))
+                except Exception as e:
+                    logger.warning("推送 %s 签到结果失败: %s", uid, e)
+
+    def stats(self) -> Dict[Slot, int]:
+        """每个时段的用户数"""
+        return {slot: len(uids) for slot, uids in sorted(self.slots.items())}
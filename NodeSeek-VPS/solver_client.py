@@ -0,0 +1,207 @@
+# solver_client.py
+# Turnstile 求解客户端：多后端（故障切换 / 竞速）、耗时直方图、按观测分位数安排轮询
+import os
+import json
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from collections import deque
+from typing import List, Optional
+
+from session_pool import pool
+
+logger = logging.getLogger(__name__)
+
+# 多个求解服务："地址|密钥,地址|密钥"；未配置时使用 API_BASE_URL / CLIENT_KEY
+SOLVER_ENDPOINTS = os.getenv("SOLVER_ENDPOINTS", "")
+SOLVER_STRATEGY = os.getenv("SOLVER_STRATEGY", "failover").lower()   # failover | race
+SOLVER_MAX_WAIT = float(os.getenv("SOLVER_MAX_WAIT", "120"))          # 单个后端最长等待（秒），另受调用方总预算约束
+SOLVER_MIN_POLL = float(os.getenv("SOLVER_MIN_POLL", "1"))
+SOLVER_MAX_POLL = float(os.getenv("SOLVER_MAX_POLL", "6"))
+
+HISTOGRAM_BOUNDS = [1, 2, 3, 5, 8, 10, 15, 20, 30, 45, 60, 90, 120]
+MIN_SAMPLES = 5         # 样本不足时使用固定轮询间隔
+RECENT_SAMPLES = 200    # 分位数只取最近的样本，跟随求解速度变化
+
+
+class LatencyHistogram:
+    """累计分桶计数（用于展示）+ 最近样本（用于分位数）"""
+
+    def __init__(self, bounds=HISTOGRAM_BOUNDS):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.recent.append(seconds)
+        self.total += 1
+        self.sum += seconds
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class SolverBackend:
+    def __init__(self, name: str, base_url: str, client_key: str):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.client_key = client_key
+        self.hist = LatencyHistogram()
+        self.success = 0
+        self.failure = 0
+
+    @property
+    def success_rate(self) -> float:
+        total = self.success + self.failure
+        return self.success / total if total else 1.0
+
+    def poll_schedule(self):
+        """
+        生成每次轮询前的等待时间：
+        样本足够时先等到 p50，再依次在 p75 / p90 / p95 处轮询，之后按 MIN_POLL 起指数退避
+        """
+        elapsed = 0.0
+        if self.hist.total >= MIN_SAMPLES:
+            for q in (0.5, 0.75, 0.9, 0.95):
+                at = self.hist.percentile(q)
+                if at - elapsed >= SOLVER_MIN_POLL:
+                    yield at - elapsed
+                    elapsed = at
+        interval = SOLVER_MIN_POLL if self.hist.total >= MIN_SAMPLES else min(2.0, SOLVER_MAX_POLL)
+        while True:
+            yield interval
+            interval = min(SOLVER_MAX_POLL, interval * 1.5)
+
+    async def solve(self, url: str, sitekey: str, max_wait: float = SOLVER_MAX_WAIT) -> Optional[str]:
+        started = time.monotonic()
+        token = None
+        try:
+            token = await asyncio.wait_for(self._solve(url, sitekey), max_wait)
+        except asyncio.TimeoutError:
+            print(f"❌ [{self.name}] Turnstile token 获取超时")
+        except asyncio.CancelledError:
+            raise   # 竞速中被取消，不计入成功率
+        except Exception as e:
+            print(f"❌ [{self.name}] Turnstile 求解异常: {e}")
+
+        if token:
+            self.success += 1
+            self.hist.observe(time.monotonic() - started)
+        else:
+            self.failure += 1
+        return token
+
+    async def _solve(self, url: str, sitekey: str) -> Optional[str]:
+        headers = {"Content-Type": "application/json"}
+        create_payload = {
+            "clientKey": self.client_key,
+            "type": "Turnstile",
+            "url": url,
+            "siteKey": sitekey
+        }
+        print(f"🧩 [{self.name}] 正在创建 Turnstile 任务...")
+        r = await pool.shared().post(f"{self.base_url}/createTask", data=json.dumps(create_payload), headers=headers, timeout=30)
+        data = r.json()
+        task_id = data.get("taskId")
+        if not task_id:
+            print(f"❌ [{self.name}] createTask 响应无 taskId:", data)
+            return None
+
+        result_payload = {"clientKey": self.client_key, "taskId": task_id}
+        for i, wait in enumerate(self.poll_schedule(), 1):
+            await asyncio.sleep(wait)
+            try:
+                rr = await pool.shared().post(f"{self.base_url}/getTaskResult", data=json.dumps(result_payload), headers=headers, timeout=30)
+                result = rr.json()
+            except Exception as e:
+                print(f"⚠️ [{self.name}] 轮询异常: {e}")
+                continue
+            if result.get("status") in ("completed", "ready"):
+                token = (
+                    result.get("solution", {}).get("token")
+                    or result.get("result", {}).get("response", {}).get("token")
+                )
+                if token:
+                    print(f"✅ [{self.name}] Turnstile token 获取成功（第 {i} 次轮询）")
+                else:
+                    print(f"❌ [{self.name}] getTaskResult 没有 token:", result)
+                return token
+            if result.get("errorId") or result.get("status") in ("failed", "error"):
+                print(f"❌ [{self.name}] 求解失败:", result)
+                return None
+
+    def report(self) -> str:
+        p50, p95 = self.hist.percentile(0.5), self.hist.percentile(0.95)
+        fmt = lambda v: f"{v:.1f}s" if v is not None else "-"
+        return (f"{self.name}: 成功率 {self.success_rate:.0%} ({self.success}/{self.success + self.failure})"
+                f"  p50 {fmt(p50)}  p95 {fmt(p95)}")
+
+
+class SolverClient:
+    def __init__(self, backends: List[SolverBackend], strategy: str = SOLVER_STRATEGY):
+        self.backends = backends
+        self.strategy = strategy
+
+    def _ranked(self) -> List[SolverBackend]:
+        # 成功率高、p50 低的后端优先
+        return sorted(self.backends, key=lambda b: (-b.success_rate, b.hist.percentile(0.5) or 0))
+
+    async def solve(self, url: str, sitekey: str, budget: Optional[float] = None) -> Optional[str]:
+        """
+        budget 为整次求解的总时限（秒）。故障切换时剩余时间在未尝试的后端间均分，
+        前一个后端提前结束省下的时间顺延给后面的，保证每个后端都有机会
+        """
+        if not self.backends:
+            print("❌ 未配置 Turnstile 求解服务")
+            return None
+        if self.strategy == "race" and len(self.backends) > 1:
+            return await self._race(url, sitekey, min(SOLVER_MAX_WAIT, budget or SOLVER_MAX_WAIT))
+        deadline = time.monotonic() + budget if budget else None
+        ranked = self._ranked()
+        for i, backend in enumerate(ranked):
+            max_wait = SOLVER_MAX_WAIT
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                max_wait = min(max_wait, remaining / (len(ranked) - i))
+            token = await backend.solve(url, sitekey, max_wait)
+            if token:
+                return token
+        return None
+
+    async def _race(self, url: str, sitekey: str, max_wait: float) -> Optional[str]:
+        """所有后端同时求解，取最先返回的 token，其余取消"""
+        pending = {asyncio.create_task(b.solve(url, sitekey, max_wait)) for b in self.backends}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None and task.result():
+                        return task.result()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def report(self) -> str:
+        lines = [f"🧩 Turnstile 求解服务（{self.strategy}）:"]
+        lines += [b.report() for b in self.backends] or ["（未配置）"]
+        return "\n".join(lines)
+
+
+def client_from_env(api_base_url: Optional[str], client_key: Optional[str]) -> SolverClient:
+    backends = []
+    for i, item in enumerate(filter(None, (x.strip() for x in SOLVER_ENDPOINTS.split(","))), 1):
+        base_url, _, key = item.partition("|")
+        backends.append(SolverBackend(f"solver{i}", base_url, key))
+    if not backends and api_base_url:
+        backends.append(SolverBackend("default", api_base_url, client_key or ""))
+    return SolverClient(backends)
@@ -0,0 +1,202 @@
+# sqlite_store.py
+# 可选的 SQLite 存储后端（STORAGE_BACKEND=sqlite），接口与 datastore.DataStore 一致
+# 一次性迁移：python sqlite_store.py migrate [data.json] [data.db]
+import sys
+import json
+import sqlite3
+from typing import Dict
+
+from datastore import DataStore, ensure_user_structure, LOG_DIR, LOG_KEEP
+from userlog import UserLog
+from metrics import STORE_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    uid         TEXT PRIMARY KEY,
+    mode        INTEGER NOT NULL DEFAULT 0,
+    tg_username TEXT NOT NULL DEFAULT '',
+    sign_hour   INTEGER NOT NULL DEFAULT 0,
+    sign_minute INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    uid      TEXT NOT NULL REFERENCES users(uid) ON DELETE CASCADE,
+    name     TEXT NOT NULL,
+    username TEXT,
+    password TEXT,
+    cookie   TEXT,
+    PRIMARY KEY (uid, name)
+);
+CREATE INDEX IF NOT EXISTS idx_accounts_name ON accounts(name);
+CREATE TABLE IF NOT EXISTS sign_logs (
+    id    INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid   TEXT NOT NULL,
+    name  TEXT,
+    date  TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sign_logs_uid ON sign_logs(uid, id);
+CREATE INDEX IF NOT EXISTS idx_sign_logs_date ON sign_logs(date);
+"""
+
+
+class SqliteStore(DataStore):
+    """users / accounts / sign_logs 三张表；用户数据仍缓存在内存，落盘时只写脏用户"""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(path, **kwargs)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    # ---------- 读取 ----------
+    def load(self) -> dict:
+        if self._data is not None:
+            return self._data
+        with STORE_SECONDS.time(backend="sqlite", op="load"):
+            return self._load()
+
+    def _load(self) -> dict:
+        users = {}
+        for uid, mode, tg_username, hour, minute in self.conn.execute(
+            "SELECT uid, mode, tg_username, sign_hour, sign_minute FROM users"
+        ):
+            users[uid] = {
+                "accounts": {},
+                "mode": bool(mode),
+                "tgUsername": tg_username,
+                "sign_hour": hour,
+                "sign_minute": minute,
+            }
+        for uid, name, username, password, cookie in self.conn.execute(
+            "SELECT uid, name, username, password, cookie FROM accounts"
+        ):
+            if uid in users:
+                users[uid]["accounts"][name] = {"username": username, "password": password, "cookie": cookie}
+
+        self._data = {"users": users}
+        return self._data
+
+    # ---------- 写入 ----------
+    def _write_user(self, uid: str, u: dict):
+        self.conn.execute(
+            "INSERT INTO users (uid, mode, tg_username, sign_hour, sign_minute) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(uid) DO UPDATE SET mode=excluded.mode, tg_username=excluded.tg_username, "
+            "sign_hour=excluded.sign_hour, sign_minute=excluded.sign_minute",
+            (uid, int(bool(u["mode"])), u["tgUsername"] or "", u["sign_hour"], u["sign_minute"]),
+        )
+        accounts = u.get("accounts", {})
+        self.conn.executemany(
+            "INSERT INTO accounts (uid, name, username, password, cookie) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(uid, name) DO UPDATE SET username=excluded.username, "
+            "password=excluded.password, cookie=excluded.cookie",
+            [(uid, name, a.get("username"), a.get("password"), a.get("cookie")) for name, a in accounts.items()],
+        )
+        placeholders = ",".join("?" * len(accounts))
+        self.conn.execute(
+            f"DELETE FROM accounts WHERE uid = ? AND name NOT IN ({placeholders})",
+            (uid, *accounts.keys()),
+        )
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._data is None or not self.is_dirty:
+            return
+
+        users = self._data["users"]
+        with STORE_SECONDS.time(backend="sqlite", op="flush"), self.conn:
+            if self._all_dirty:
+                # 整体改动：同步全部用户并删除已不存在的用户
+                existing = {row[0] for row in self.conn.execute("SELECT uid FROM users")}
+                removed = existing - set(users)
+                self.conn.executemany("DELETE FROM users WHERE uid = ?", [(uid,) for uid in removed])
+                targets = users.keys()
+            else:
+                removed = [uid for uid in self.dirty if uid not in users]
+                self.conn.executemany("DELETE FROM users WHERE uid = ?", [(uid,) for uid in removed])
+                targets = [uid for uid in self.dirty if uid in users]
+            for uid in targets:
+                self._write_user(uid, ensure_user_structure(self._data, uid))
+
+        self.dirty.clear()
+        self._all_dirty = False
+
+    # ---------- 后台任务 ----------
+    def start_background(self):
+        pass  # 日志保留在 append_log 中完成，无需压缩
+
+    async def stop_background(self):
+        self.flush()
+
+    # ---------- 签到日志 ----------
+    def init_logs(self, uid: str):
+        pass  # 表已存在，无需初始化
+
+    def read_logs(self, uid: str) -> list:
+        rows = self.conn.execute("SELECT entry FROM sign_logs WHERE uid = ? ORDER BY id", (uid,))
+        return [json.loads(row[0]) for row in rows]
+
+    def append_log(self, uid: str, entry: dict):
+        with STORE_SECONDS.time(backend="sqlite", op="append_log"), self.conn:
+            self.conn.execute(
+                "INSERT INTO sign_logs (uid, name, date, entry) VALUES (?, ?, ?, ?)",
+                (uid, entry.get("name"), str(entry.get("time", ""))[:10], json.dumps(entry, ensure_ascii=False)),
+            )
+            self.conn.execute(
+                "DELETE FROM sign_logs WHERE uid = ? AND id NOT IN "
+                "(SELECT id FROM sign_logs WHERE uid = ? ORDER BY id DESC LIMIT ?)",
+                (uid, uid, LOG_KEEP),
+            )
+
+    def delete_logs(self, uid: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM sign_logs WHERE uid = ?", (uid,))
+
+    def logs_on(self, date: str) -> Dict[str, list]:
+        result = {}
+        for uid, entry in self.conn.execute(
+            "SELECT uid, entry FROM sign_logs WHERE date = ? ORDER BY id", (date,)
+        ):
+            result.setdefault(uid, []).append(json.loads(entry))
+        return result
+
+    # ---------- 查询 ----------
+    def find_account_owners(self, name: str) -> list:
+        self.flush()  # 先落盘内存中的改动，保证查询结果一致
+        return [row[0] for row in self.conn.execute("SELECT uid FROM accounts WHERE name = ?", (name,))]
+
+
+# ========== 一次性迁移 ==========
+def migrate(json_path: str = "data.json", db_path: str = "data.db", log_dir: str = LOG_DIR):
+    """把 data.json 和 data/<uid>.json(l) 导入 SQLite（可重复执行，日志会先清空再导入）"""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data.setdefault("users", {})
+
+    store = SqliteStore(db_path)
+    for uid in data["users"]:
+        ensure_user_structure(data, uid)
+    store.save(data)
+    store.flush()
+
+    migrated_logs = 0
+    json_logs = UserLog(log_dir, LOG_KEEP)   # 兼容 data/<uid>.json 与 data/<uid>.jsonl
+    for uid in data["users"]:
+        logs = json_logs.tail(uid)
+        if not logs:
+            continue
+        store.delete_logs(uid)
+        for entry in logs[-LOG_KEEP:]:
+            store.append_log(uid, entry)
+            migrated_logs += 1
+
+    print(f"✅ 迁移完成：{len(data['users'])} 个用户，{migrated_logs} 条日志 → {db_path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        migrate(*sys.argv[2:4])
+    else:
+        print("用法: python sqlite_store.py migrate [data.json] [data.db]")
@@ -69,13 +69,57 @@ async function fetchCreditPage(page, cookie, jar) {
   }
 }
 
-async function getSigninStats(name, cookie, days = 30) {
-  const maskedCookie = cookie.length > 15
-    ? cookie.slice(0, 8) + '...' + cookie.slice(-5)
-    : cookie;
+// ---------- 本地信用账本 ----------
+// 每个账号一个 ledger/<TG 用户 id>/<账号>.json（同名账号可能属于不同用户，不能只按账号名区分；
+// 删除账号 / 用户时由 bot.py 一并删除），保存已拉取的信用记录（新 → 旧）：
+//   records     原始记录 [amount, balance, description, timestamp]
+//   coveredFrom 从该时间（毫秒）到 syncedAt 的记录是连续完整的
+//   complete    已拉到最早一页，coveredFrom 之前没有更多记录
+//   syncedAt    上次成功同步的时间（毫秒）
+const LEDGER_DIR = process.env.LEDGER_DIR || path.join(__dirname, 'ledger');
+const LEDGER_FRESH = parseInt(process.env.LEDGER_FRESH || '60', 10) * 1000;    // 多久内的同步结果直接使用（毫秒）
+const LEDGER_KEEP_DAYS = parseInt(process.env.LEDGER_KEEP_DAYS || '400', 10);  // 本地保留多少天的记录
+const MAX_PAGES = 20;
+const STATS_PREFETCH = parseInt(process.env.STATS_PREFETCH || '4', 10);        // 同一账号最多同时请求的页数
+const STATS_CONCURRENCY = parseInt(process.env.STATS_CONCURRENCY || '3', 10);  // 同时统计的账号数
 
-  writeLog(`==== 开始统计收益: ${name}, Cookie(部分隐藏): ${maskedCookie}, 天数: ${days} ====`);
-  const cutoff = dayjs().tz("Asia/Shanghai").subtract(days, 'day').toDate();
+if (!fs.existsSync(LEDGER_DIR)) fs.mkdirSync(LEDGER_DIR);
+
+const recordKey = (r) => `${r[3]}|${r[0]}|${r[1]}`;
+const recordTime = (r) => dayjs(r[3]).valueOf();
+
+function ledgerPath(userId, name) {
+  return path.join(LEDGER_DIR, encodeURIComponent(String(userId)), `${encodeURIComponent(name)}.json`);
+}
+
+function loadLedger(userId, name) {
+  try {
+    return JSON.parse(fs.readFileSync(ledgerPath(userId, name), 'utf8'));
+  } catch (e) {
+    return { records: [], coveredFrom: null, complete: false, syncedAt: 0 };
+  }
+}
+
+function saveLedger(userId, name, ledger) {
+  // 先写临时文件再 rename，避免写到一半被其他进程读到
+  const file = ledgerPath(userId, name);
+  fs.mkdirSync(path.dirname(file), { recursive: true });
+  const tmp = `${file}.${process.pid}.tmp`;
+  fs.writeFileSync(tmp, JSON.stringify(ledger));
+  fs.renameSync(tmp, file);
+}
+
+function isCovered(ledger, cutoffMs) {
+  return ledger.complete || (ledger.coveredFrom !== null && ledger.coveredFrom <= cutoffMs);
+}
+
+async function syncLedger(userId, name, cookie, cutoffMs) {
+  const ledger = loadLedger(userId, name);
+  const covered = isCovered(ledger, cutoffMs);
+  if (covered && Date.now() - ledger.syncedAt < LEDGER_FRESH) {
+    writeLog(`✅ ${name} 使用本地账本（${ledger.records.length} 条）`);
+    return { ledger, fetched: 0, synced: true };
+  }
 
   const jar = new tough.CookieJar();
 
@@ -91,26 +135,128 @@ async function getSigninStats(name, cookie, days = 30) {
     writeLog(`⚠️ ${name} 访问 /board 失败: ${e.message}`);
   }
 
-  let allRecords = [];
-  for (let page = 1; page <= 20; page++) {
-    const data = await fetchCreditPage(page, cookie, jar);
-    if (!data || !data.success || !data.data) break;
+  const known = new Set(ledger.records.map(recordKey));
+  const fresh = [];
+  let reachedKnown = false;
+  let complete = false;
+  let oldest = null;
+  // 需要翻到的时间：本地已覆盖所需天数时只到最新的本地记录，否则到截止时间
+  const target = covered && ledger.records.length ? recordTime(ledger.records[0]) : cutoffMs;
+  let estimatedLast = 1;   // 预计要翻到的页码，按第一页的记录密度估算
+  let pages = 0;
+
+  const windowFor = (page) => Math.max(1, Math.min(STATS_PREFETCH, estimatedLast - page + 1));
+  const discarded = await walkPages(cookie, jar, windowFor, (page, data) => {
+    if (!data || !data.success || !data.data) return true;
+    pages++;
 
     const records = data.data;
-    if (!records.length) break;
+    if (!records.length) {
+      complete = true;
+      return true;
+    }
 
     for (const record of records) {
-      const [amount, balance, description, timestamp] = record;
-      const recordTime = dayjs(timestamp).tz("Asia/Shanghai").toDate();
-      if (recordTime >= cutoff) {
-        allRecords.push({ amount, balance, description, time: recordTime });
+      if (known.has(recordKey(record))) {
+        reachedKnown = true;
+      } else {
+        fresh.push(record);
       }
     }
+    oldest = recordTime(records[records.length - 1]);
+
+    if (page === 1 && oldest > target) {
+      const span = recordTime(records[0]) - oldest;
+      estimatedLast = span > 0 ? 1 + Math.ceil((oldest - target) / span) : MAX_PAGES;
+    }
+
+    // 已追上本地记录且本地覆盖了所需天数 → 只拉增量
+    if (reachedKnown && covered) return true;
+    // 本地覆盖不足时继续往旧翻，直到越过截止时间
+    return oldest < cutoffMs;
+  });
+  if (discarded) writeLog(`ℹ️ ${name} 丢弃多余的预取页 ${discarded} 页`);
+
+  if (!pages) {
+    writeLog(`⚠️ ${name} 同步信用记录失败，使用本地账本（${ledger.records.length} 条）`);
+    return { ledger, fetched: 0, synced: false };
+  }
 
-    const lastTime = dayjs(records[records.length - 1][3]).tz("Asia/Shanghai").toDate();
-    if (lastTime < cutoff) break;
+  // 本次从最新一页连续翻到 oldest；与上次的连续区间相接时覆盖范围取并集
+  let coveredFrom = oldest;
+  if (complete) {
+    coveredFrom = oldest !== null ? Math.min(oldest, ledger.coveredFrom ?? oldest) : ledger.coveredFrom;
+  } else if (reachedKnown && ledger.coveredFrom !== null) {
+    coveredFrom = Math.min(oldest ?? ledger.coveredFrom, ledger.coveredFrom);
   }
 
+  const keepFrom = dayjs().subtract(LEDGER_KEEP_DAYS, 'day').valueOf();
+  let records = fresh.concat(ledger.records)
+    .sort((a, b) => recordTime(b) - recordTime(a))
+    .filter(r => recordTime(r) >= keepFrom);
+  const trimmed = records.length < fresh.length + ledger.records.length;
+
+  const updated = {
+    records,
+    coveredFrom: trimmed ? Math.max(coveredFrom ?? keepFrom, keepFrom) : coveredFrom,
+    complete: (complete || ledger.complete && reachedKnown) && !trimmed,
+    syncedAt: Date.now(),
+  };
+  saveLedger(userId, name, updated);
+  writeLog(`✅ ${name} 账本同步完成：${pages} 页，新增 ${fresh.length} 条，共 ${records.length} 条`);
+  return { ledger: updated, fetched: pages, synced: true };
+}
+
+// 按页码顺序处理信用记录，同时最多预取 windowFor(page) 页；
+// onPage 返回 true 时停止：不再发起新请求，已发出的预取结果直接丢弃
+async function walkPages(cookie, jar, windowFor, onPage) {
+  const inflight = new Map();
+  let next = 1;
+  for (let page = 1; page <= MAX_PAGES; page++) {
+    const end = Math.min(MAX_PAGES, page + windowFor(page) - 1);
+    for (; next <= end; next++) {
+      inflight.set(next, fetchCreditPage(next, cookie, jar));
+    }
+    const data = await inflight.get(page);
+    inflight.delete(page);
+    if (onPage(page, data)) break;
+  }
+  return inflight.size;
+}
+
+// 同一进程内同一账号的同步合并为一次；需要更早记录的请求排在进行中的同步之后
+const syncing = new Map();
+
+function syncLedgerOnce(userId, name, cookie, cutoffMs) {
+  const key = ledgerPath(userId, name);
+  const cur = syncing.get(key);
+  if (cur && cur.cutoffMs <= cutoffMs) return cur.promise;
+
+  const promise = (cur ? cur.promise.catch(() => {}) : Promise.resolve())
+    .then(() => syncLedger(userId, name, cookie, cutoffMs))
+    .finally(() => {
+      if (syncing.get(key)?.promise === promise) syncing.delete(key);
+    });
+  syncing.set(key, { promise, cutoffMs });
+  return promise;
+}
+
+async function getSigninStats(userId, name, cookie, days = 30) {
+  const maskedCookie = cookie.length > 15
+    ? cookie.slice(0, 8) + '...' + cookie.slice(-5)
+    : cookie;
+
+  writeLog(`==== 开始统计收益: ${name}, Cookie(部分隐藏): ${maskedCookie}, 天数: ${days} ====`);
+  const cutoff = dayjs().tz("Asia/Shanghai").subtract(days, 'day').toDate();
+
+  const { ledger } = await syncLedgerOnce(userId, name, cookie, cutoff.getTime());
+
+  const allRecords = ledger.records
+    .filter(r => recordTime(r) >= cutoff.getTime())
+    .map(([amount, balance, description, timestamp]) => ({
+      amount, balance, description, time: dayjs(timestamp).tz("Asia/Shanghai").toDate()
+    }));
+
   const signinRecords = allRecords.filter(r =>
     r.description.includes("签到收益") && r.description.includes("鸡腿")
   );
@@ -143,21 +289,31 @@ async function getSigninStats(name, cookie, days = 30) {
   };
 }
 
-async function statsAccounts(targets, days = 30) {
+async function statsAccounts(targets, days = 30, concurrency = STATS_CONCURRENCY) {
   const results = {};
+  const tasks = [];
   for (const userId in targets) {
-    results[userId] = [];
-    const accounts = targets[userId];
-    for (const [name, cookie] of Object.entries(accounts)) {
+    const accounts = Object.entries(targets[userId]);
+    results[userId] = new Array(accounts.length);
+    accounts.forEach(([name, cookie], index) => tasks.push({ userId, index, name, cookie }));
+  }
+
+  let next = 0;
+
+  async function runner() {
+    while (next < tasks.length) {
+      const { userId, index, name, cookie } = tasks[next++];
       try {
-        const res = await getSigninStats(name, cookie, days);
-        results[userId].push(res);
+        results[userId][index] = await getSigninStats(userId, name, cookie, days);
       } catch (e) {
-        results[userId].push({ name, result: `🚫 查询异常: ${e.message}` });
+        results[userId][index] = { name, result: `🚫 查询异常: ${e.message}` };
         writeLog(`⚠️ 用户 ${userId} 账号 ${name} 统计异常: ${e.stack || e.message}`);
       }
     }
   }
+
+  const workers = Math.max(1, Math.min(concurrency, tasks.length));
+  await Promise.all(Array.from({ length: workers }, runner));
   return results;
 }
 
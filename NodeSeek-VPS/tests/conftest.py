@@ -0,0 +1,8 @@
+# tests/conftest.py
+# 模块都在 NodeSeek-VPS/ 根目录下平铺导入；异步测试与本地桩服务用 aiohttp 自带的 pytest 插件
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest_plugins = ["aiohttp.pytest_plugin"]
@@ -0,0 +1,148 @@
+# tests/test_flaresolverr.py
+# 用本地 aiohttp 桩模拟 FlareSolverr 的 /v1 接口，验证会话复用、clearance 缓存与合并渲染
+import asyncio
+import types
+
+import pytest
+from aiohttp import web
+
+import flaresolverr
+from flaresolverr import FlareSolverrClient
+from session_pool import pool
+
+
+class Clock:
+    """替换 flaresolverr 模块里的 time，手动推进时间"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class FakeFlareSolverr:
+    def __init__(self):
+        self.calls = []             # 收到的 cmd，按顺序
+        self.delay = 0.0            # request.get 的渲染耗时
+        self.cookie_expires = None  # cf_clearance 的 expires（绝对时间）；None 表示会话 cookie
+        self.with_clearance = True
+        self.created = 0
+
+    async def handle(self, request):
+        body = await request.json()
+        cmd = body["cmd"]
+        self.calls.append((cmd, body.get("session")))
+        if cmd == "sessions.create":
+            self.created += 1
+            return web.json_response({"status": "ok", "session": f"s{self.created}"})
+        if cmd == "sessions.destroy":
+            return web.json_response({"status": "ok"})
+        await asyncio.sleep(self.delay)
+        cookies = [{"name": "__cf_bm", "value": "bm"}]
+        if self.with_clearance:
+            cookies.append({"name": "cf_clearance", "value": "cf", "expires": self.cookie_expires or -1})
+        return web.json_response({"status": "ok", "solution": {"cookies": cookies, "userAgent": "UA"}})
+
+    def count(self, cmd):
+        return sum(1 for c, _ in self.calls if c == cmd)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(flaresolverr, "time", types.SimpleNamespace(time=c.time))
+    return c
+
+
+@pytest.fixture
+async def stub(aiohttp_server, monkeypatch):
+    fake = FakeFlareSolverr()
+    app = web.Application()
+    app.router.add_post("/v1", fake.handle)
+    server = await aiohttp_server(app)
+    fake.url = str(server.make_url("/v1"))
+    monkeypatch.setattr(flaresolverr, "EGRESS_IP", "1.1.1.1")
+    yield fake
+    await pool.close()   # 共享会话绑定在本测试的事件循环上
+
+
+async def test_session_reused_per_egress_ip(stub, clock, monkeypatch):
+    client = FlareSolverrClient(stub.url)
+    stub.with_clearance = False   # 不缓存，每次都渲染
+
+    await client.get_clearance("https://example.com/")
+    await client.get_clearance("https://example.com/")
+    assert stub.count("sessions.create") == 1
+    assert [s for c, s in stub.calls if c == "request.get"] == ["s1", "s1"]
+
+    monkeypatch.setattr(flaresolverr, "EGRESS_IP", "2.2.2.2")
+    await client.get_clearance("https://example.com/")
+    assert stub.count("sessions.create") == 2
+    assert set(client.sessions) == {"1.1.1.1", "2.2.2.2"}
+
+
+async def test_clearance_cached_until_cookie_expiry(stub, clock):
+    client = FlareSolverrClient(stub.url)
+    stub.cookie_expires = clock.now + 300
+
+    cookies, ua = await client.get_clearance("https://example.com/")
+    assert cookies["cf_clearance"] == "cf" and ua == "UA"
+    clock.now += 300 - flaresolverr.CLEARANCE_MARGIN - 1
+    await client.get_clearance("https://example.com/")
+    assert stub.count("request.get") == 1 and client.hits == 1
+
+    clock.now += 2   # 进入提前过期的余量
+    await client.get_clearance("https://example.com/")
+    assert stub.count("request.get") == 2
+
+
+async def test_clearance_capped_by_max_ttl(stub, clock):
+    client = FlareSolverrClient(stub.url)
+    stub.cookie_expires = clock.now + 10 * flaresolverr.CLEARANCE_MAX_TTL
+
+    await client.get_clearance("https://example.com/")
+    clock.now += flaresolverr.CLEARANCE_MAX_TTL - flaresolverr.CLEARANCE_MARGIN - 1
+    await client.get_clearance("https://example.com/")
+    assert stub.count("request.get") == 1
+
+    clock.now += 2
+    await client.get_clearance("https://example.com/")
+    assert stub.count("request.get") == 2
+
+
+async def test_concurrent_logins_render_once(stub, clock):
+    client = FlareSolverrClient(stub.url)
+    stub.delay = 0.2
+
+    results = await asyncio.gather(*(client.get_clearance("https://example.com/") for _ in range(5)))
+    assert stub.count("request.get") == 1
+    assert all(cookies["cf_clearance"] == "cf" for cookies, _ in results)
+    assert client.misses == 1 and client.hits == 4
+
+
+async def test_destroy_idle(stub, clock):
+    client = FlareSolverrClient(stub.url)
+    stub.cookie_expires = clock.now + 120
+
+    await client.get_clearance("https://example.com/")
+    clock.now += flaresolverr.FLARESOLVERR_SESSION_IDLE - 1
+    await client.destroy_idle()
+    assert "1.1.1.1" in client.sessions
+    assert not client.cache   # clearance 已过期，被清理
+
+    clock.now += 2
+    await client.destroy_idle()
+    assert not client.sessions
+    assert ("sessions.destroy", "s1") in stub.calls
+
+
+async def test_no_cache_without_cf_clearance(stub, clock):
+    client = FlareSolverrClient(stub.url)
+    stub.with_clearance = False
+
+    cookies, _ = await client.get_clearance("https://example.com/")
+    assert cookies == {"__cf_bm": "bm"}
+    assert not client.cache
+    await client.get_clearance("https://example.com/")
+    assert stub.count("request.get") == 2
@@ -0,0 +1,136 @@
+# tests/test_webhook.py
+# 用 aiohttp 测试客户端向 webhook 端点 POST 录制好的 Update JSON，不连接 Telegram
+import os
+import json
+import signal
+import asyncio
+
+import pytest
+from aiohttp import ClientSession
+from telegram.ext import ApplicationBuilder, MessageHandler, filters
+from telegram.request import BaseRequest
+
+import webhook
+
+SECRET = "s3cret"
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private", "first_name": "t"},
+        "from": {"id": 42, "is_bot": False, "first_name": "t"},
+        "text": "hello",
+    },
+}
+
+
+def recorded(update_id: int) -> dict:
+    return {**UPDATE, "update_id": update_id}
+
+
+class OfflineRequest(BaseRequest):
+    """代替 HTTP 请求：getMe 返回固定的 bot 信息，其余方法一律成功"""
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if url.endswith("/getMe"):
+            result = {"id": 1, "is_bot": True, "first_name": "bot", "username": "test_bot"}
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def build_app(queue_size: int = 10):
+    return (
+        ApplicationBuilder()
+        .token("123:TEST")
+        .request(OfflineRequest())
+        .get_updates_request(OfflineRequest())
+        .updater(None)
+        .update_queue(asyncio.Queue(maxsize=queue_size))
+        .build()
+    )
+
+
+async def test_secret_required(aiohttp_client):
+    application = build_app()
+    client = await aiohttp_client(webhook.make_web_app(application, "/tg", SECRET))
+
+    r = await client.post("/tg", json=UPDATE)
+    assert r.status == 403
+    r = await client.post("/tg", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+    assert r.status == 403
+    assert application.update_queue.empty()
+
+
+async def test_valid_update_reaches_queue(aiohttp_client):
+    application = build_app()
+    client = await aiohttp_client(webhook.make_web_app(application, "/tg", SECRET))
+
+    r = await client.post("/tg", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+    assert r.status == 200
+    update = application.update_queue.get_nowait()
+    assert update.update_id == 1 and update.message.text == "hello"
+
+
+async def test_full_queue_returns_503(aiohttp_client):
+    application = build_app(queue_size=1)
+    client = await aiohttp_client(webhook.make_web_app(application, "/tg", SECRET))
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+    assert (await client.post("/tg", json=recorded(1), headers=headers)).status == 200
+    assert (await client.post("/tg", json=recorded(2), headers=headers)).status == 503
+    assert application.update_queue.qsize() == 1
+
+
+async def test_refuses_public_webhook_without_secret(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_URL", "https://bot.example.com")
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", "")
+    application = build_app()
+
+    with pytest.raises(RuntimeError):
+        await webhook.run_webhook(application)
+    assert not application.running
+
+
+async def test_queue_drained_on_shutdown(monkeypatch, aiohttp_unused_port):
+    port = aiohttp_unused_port()
+    monkeypatch.setattr(webhook, "WEBHOOK_HOST", "127.0.0.1")
+    monkeypatch.setattr(webhook, "WEBHOOK_PORT", port)
+    monkeypatch.setattr(webhook, "WEBHOOK_PATH", "/tg")
+    monkeypatch.setattr(webhook, "WEBHOOK_URL", "")
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", SECRET)
+
+    application = build_app()
+    handled = []
+
+    async def slow_handler(update, context):
+        await asyncio.sleep(0.1)
+        handled.append(update.update_id)
+
+    application.add_handler(MessageHandler(filters.ALL, slow_handler))
+    server = asyncio.create_task(webhook.run_webhook(application))
+    await asyncio.sleep(0.3)   # 等待端口开始监听
+
+    async with ClientSession() as session:
+        for i in range(1, 6):
+            async with session.post(f"http://127.0.0.1:{port}/tg", json=recorded(i),
+                                    headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as r:
+                assert r.status == 200
+
+    os.kill(os.getpid(), signal.SIGTERM)   # run_webhook 注册的退出信号
+    await asyncio.wait_for(server, 10)
+    assert handled == [1, 2, 3, 4, 5]
+    assert not application.running
@@ -0,0 +1,107 @@
+# turnstile_pool.py
+# 预先求解的 Turnstile token 池：按即将到来的签到时段预测需求补充，token 过期前丢弃
+# 池只存在于 bot 进程：所有登录（/add、签到时的 cookie 刷新、Cookie 巡检）都经 coordinator.login 在 bot 进程内执行，
+# 签到 worker 进程不登录，也不需要 token
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+TURNSTILE_POOL_MAX = int(os.getenv("TURNSTILE_POOL_MAX", "3"))              # 池中最多保留的 token
+TURNSTILE_TOKEN_TTL = int(os.getenv("TURNSTILE_TOKEN_TTL", "200"))          # token 有效约 300 秒，留足登录耗时
+TURNSTILE_POOL_INTERVAL = int(os.getenv("TURNSTILE_POOL_INTERVAL", "15"))   # 检查补充间隔（秒）
+TURNSTILE_POOL_HORIZON = int(os.getenv("TURNSTILE_POOL_HORIZON", "30"))     # 需求预测窗口（分钟）
+TURNSTILE_REFRESH_RATE = float(os.getenv("TURNSTILE_REFRESH_RATE", "0.05")) # 预计需要重新登录的账号比例
+
+
+def predicted_demand(upcoming_accounts: int, stale_accounts: int = 0,
+                     refresh_rate: float = TURNSTILE_REFRESH_RATE) -> int:
+    """窗口内将签到的账号数 × 预计刷新比例，加上已知失效的账号数"""
+    return math.ceil(upcoming_accounts * refresh_rate) + stale_accounts
+
+
+class TurnstilePool:
+    def __init__(self, solve: Callable[[], Awaitable[Optional[str]]], demand: Callable[[], int],
+                 max_size: int = TURNSTILE_POOL_MAX, ttl: int = TURNSTILE_TOKEN_TTL):
+        self.solve = solve
+        self.demand = demand
+        self.max_size = max_size
+        self.ttl = ttl
+        self.tokens = deque()    # (token, 求解完成时间)，按时间先后
+        self.inflight = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._task = None
+        self._solving = set()    # 进行中的求解任务，保留引用以便 stop() 取消
+
+    def _purge(self):
+        now = time.monotonic()
+        while self.tokens and now - self.tokens[0][1] > self.ttl:
+            self.tokens.popleft()
+            self.expired += 1
+
+    def checkout(self) -> Optional[str]:
+        """取出一个未过期的 token（最旧的优先）；池为空返回 None，由调用方现场求解"""
+        self._purge()
+        if not self.tokens:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.tokens.popleft()[0]
+
+    def target(self) -> int:
+        try:
+            return max(0, min(self.max_size, self.demand()))
+        except Exception as e:
+            logger.warning("Turnstile 需求预测失败: %s", e)
+            return 0
+
+    async def _solve_one(self):
+        self.inflight += 1
+        try:
+            token = await self.solve()
+            if token:
+                self.tokens.append((token, time.monotonic()))
+        except Exception as e:
+            logger.warning("预求解 Turnstile token 失败: %s", e)
+        finally:
+            self.inflight -= 1
+
+    def refill(self):
+        self._purge()
+        need = self.target() - len(self.tokens) - self.inflight
+        for _ in range(max(0, need)):
+            task = asyncio.create_task(self._solve_one())
+            self._solving.add(task)
+            task.add_done_callback(self._solving.discard)
+
+    async def _loop(self):
+        while True:
+            self.refill()
+            await asyncio.sleep(TURNSTILE_POOL_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """停止补充并取消进行中的求解"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        solving, self._solving = self._solving, set()
+        for task in solving:
+            task.cancel()
+        await asyncio.gather(*solving, return_exceptions=True)
+
+    def stats(self) -> dict:
+        self._purge()
+        return {"ready": len(self.tokens), "inflight": self.inflight,
+                "hits": self.hits, "misses": self.misses, "expired": self.expired}
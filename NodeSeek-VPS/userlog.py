@@ -0,0 +1,139 @@
+# userlog.py
+# 用户签到日志：data/<uid>.jsonl 只追加写入，后台定期压缩到保留条数
+import os
+import json
+import asyncio
+import logging
+import tempfile
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+COMPACT_INTERVAL = int(os.getenv("LOG_COMPACT_INTERVAL", "300"))   # 后台压缩间隔（秒）
+TAIL_BLOCK = 8192
+
+
+class UserLog:
+    def __init__(self, directory: str, keep: int):
+        self.directory = directory
+        self.keep = keep
+        self._appended = {}      # uid -> 自上次压缩以来追加的条数
+        self._task = None
+
+    def _path(self, uid: str) -> str:
+        return os.path.join(self.directory, f"{uid}.jsonl")
+
+    def _legacy_path(self, uid: str) -> str:
+        return os.path.join(self.directory, f"{uid}.json")
+
+    def _migrate_legacy(self, uid: str):
+        """旧格式 data/<uid>.json → data/<uid>.jsonl（只在首次访问时执行一次）"""
+        legacy, path = self._legacy_path(uid), self._path(uid)
+        if not os.path.exists(legacy) or os.path.exists(path):
+            return
+        try:
+            with open(legacy, "r", encoding="utf-8") as f:
+                logs = json.load(f).get("logs", [])
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("旧日志 %s 读取失败: %s", legacy, e)
+            logs = []
+        self._rewrite(uid, logs[-self.keep:])
+        os.remove(legacy)
+
+    # ---------- 写入 ----------
+    def init(self, uid: str):
+        os.makedirs(self.directory, exist_ok=True)  # 确保 data 目录存在
+        self._migrate_legacy(uid)
+        if not os.path.exists(self._path(uid)):
+            open(self._path(uid), "a", encoding="utf-8").close()
+
+    def append(self, uid: str, entry: dict):
+        """一次 write 追加一行，O(1)，不读取已有内容"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._migrate_legacy(uid)
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        fd = os.open(self._path(uid), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        self._appended[uid] = self._appended.get(uid, 0) + 1
+
+    def delete(self, uid: str):
+        self._appended.pop(uid, None)
+        for path in (self._path(uid), self._legacy_path(uid)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    # ---------- 读取 ----------
+    def tail(self, uid: str, n: int = None) -> List[dict]:
+        """从文件末尾向前按块读取最近 n 条（默认保留条数），按时间正序返回"""
+        n = n or self.keep
+        self._migrate_legacy(uid)
+        path = self._path(uid)
+        if not os.path.exists(path):
+            return []
+
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            buf = b""
+            while pos > 0 and buf.count(b"\n") <= n:
+                step = min(TAIL_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                buf = f.read(step) + buf
+
+        entries = []
+        for raw in buf.splitlines()[-n:]:
+            if not raw.strip():
+                continue
+            try:
+                entries.append(json.loads(raw))
+            except json.JSONDecodeError:
+                continue  # 块边界截断的首行或损坏行
+        return entries
+
+    # ---------- 压缩 ----------
+    def _rewrite(self, uid: str, entries: List[dict]):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tempname = tempfile.mkstemp(dir=self.directory, prefix=f".{uid}-", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tempname, self._path(uid))
+
+    def compact(self, uid: str):
+        self._rewrite(uid, self.tail(uid, self.keep))
+        self._appended.pop(uid, None)
+
+    def compact_pending(self):
+        """压缩追加条数超过保留条数的用户日志"""
+        for uid, count in list(self._appended.items()):
+            if count < self.keep:
+                continue
+            try:
+                self.compact(uid)
+            except OSError as e:
+                logger.warning("压缩日志 %s 失败: %s", uid, e)
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(COMPACT_INTERVAL)
+            self.compact_pending()
+
+    def start_compactor(self):
+        if self._task is None:
+            # 启动时无法知道历史追加量，先全部压缩一次
+            if os.path.isdir(self.directory):
+                for name in os.listdir(self.directory):
+                    if name.endswith(".jsonl"):
+                        self._appended[name[:-len(".jsonl")]] = self.keep
+            self._task = asyncio.create_task(self._compact_loop())
+
+    async def stop_compactor(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.compact_pending()
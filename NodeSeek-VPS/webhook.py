@@ -0,0 +1,143 @@
+# webhook.py
+# Webhook 模式：本地 aiohttp 服务接收 Telegram 推送，校验 secret token，有界队列背压，退出时处理完队列再停
+#   BOT_MODE=webhook 时由 bot.py 调用 run_webhook；手动回放：python webhook.py replay updates.jsonl；自动化测试见 tests/test_webhook.py
+import os
+import sys
+import hmac
+import json
+import signal
+import asyncio
+import logging
+
+from telegram import Update
+from telegram.ext import Application
+
+try:
+    from aiohttp import web, ClientSession
+except ImportError:   # 仅 webhook 模式需要 aiohttp
+    web = ClientSession = None
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")                  # 对外地址（反向代理后的 https 地址），为空则不调用 setWebhook
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")            # X-Telegram-Bot-Api-Secret-Token；设置了 WEBHOOK_URL 时必填
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))   # 待处理 update 上限，满了返回 503 让 Telegram 重试
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+
+
+def update_queue() -> asyncio.Queue:
+    """给 ApplicationBuilder.update_queue 用的有界队列"""
+    return asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+
+
+def make_web_app(application: Application, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET):
+    async def handle_update(request):
+        if secret:
+            token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not hmac.compare_digest(token, secret):
+                return web.Response(status=403)
+        try:
+            data = await request.json()
+            update = Update.de_json(data, application.bot)
+        except Exception as e:
+            logger.warning("无法解析 update: %s", e)
+            return web.Response(status=400)
+
+        try:
+            application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            logger.warning("update 队列已满（%s），返回 503", WEBHOOK_QUEUE_SIZE)
+            return web.Response(status=503)
+        return web.Response(text="ok")
+
+    async def health(request):
+        return web.json_response({"queue": application.update_queue.qsize()})
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    app.router.add_get("/healthz", health)
+    return app
+
+
+async def _drain(application: Application, timeout: float):
+    """等待已接收的 update 处理完（最多 timeout 秒）"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not application.update_queue.empty() and loop.time() < deadline:
+        await asyncio.sleep(0.1)
+    left = application.update_queue.qsize()
+    if left:
+        logger.warning("退出时仍有 %s 个 update 未处理", left)
+
+
+async def run_webhook(application: Application):
+    """替代 run_polling：手动完成 initialize / post_init / start，收到退出信号后先停收再排空队列"""
+    if web is None:
+        raise RuntimeError("webhook 模式需要安装 aiohttp: pip install aiohttp")
+    if WEBHOOK_URL and not WEBHOOK_SECRET:
+        # 公网注册的 webhook 不校验密钥，任何人都能伪造更新
+        raise RuntimeError("设置了 WEBHOOK_URL 时必须同时设置 WEBHOOK_SECRET")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:   # Windows
+            pass
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    runner = web.AppRunner(make_web_app(application, WEBHOOK_PATH, WEBHOOK_SECRET))
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    print(f"🌐 Webhook 已监听 http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    if WEBHOOK_URL:
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=40,
+        )
+
+    try:
+        await stop.wait()
+    finally:
+        print("🛑 正在停止 webhook，处理剩余 update...")
+        await site.stop()          # 先停止接收新的 update
+        await _drain(application, WEBHOOK_DRAIN_TIMEOUT)
+        await runner.cleanup()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+# ---------- 离线测试：把录制的 update 逐条 POST 到本地端点 ----------
+async def replay(file: str, url: str):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET} if WEBHOOK_SECRET else {}
+    async with ClientSession() as session:
+        with open(file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                async with session.post(url, json=json.loads(line), headers=headers) as r:
+                    print(r.status, line.strip()[:80])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "replay":
+        target = sys.argv[3] if len(sys.argv) > 3 else f"http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}"
+        asyncio.run(replay(sys.argv[2], target))
+    else:
+        print("用法: python webhook.py replay updates.jsonl [url]")
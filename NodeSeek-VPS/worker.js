@@ -0,0 +1,64 @@
+// worker.js —— 常驻 Node 进程，供 Python 端 node_pool.py 调用
+// 协议：stdin / stdout 每行一个 JSON
+//   请求 {"id": 1, "op": "sign" | "stats" | "ping", "payload": {...}}
+//   响应 {"id": 1, "ok": true, "result": ..., "meta": ...} 或 {"id": 1, "ok": false, "error": "..."}
+const readline = require('readline');
+const { signAccountsWithStats } = require('./sign');
+const { statsAccounts } = require('./stats');
+
+// stdout 只用于协议输出，其余打印一律转到 stderr，避免污染
+console.log = (...args) => console.error(...args);
+
+// 每个 handler 返回 { result, meta }，meta 为可选的附加信息（如吞吐统计）
+const handlers = {
+  ping: async () => ({ result: 'pong' }),
+  sign: async ({ targets, userModes, concurrency }) => {
+    const { results, stats } = await signAccountsWithStats(targets || {}, userModes || {}, concurrency || undefined);
+    return { result: results, meta: stats };
+  },
+  stats: async ({ targets, days }) => ({ result: await statsAccounts(targets || {}, days || 30) }),
+};
+
+function reply(msg) {
+  process.stdout.write(JSON.stringify(msg) + '\n');
+}
+
+const rl = readline.createInterface({ input: process.stdin, terminal: false });
+let inflight = 0;
+let closing = false;
+
+rl.on('line', async (line) => {
+  if (!line.trim()) return;
+
+  let req;
+  try {
+    req = JSON.parse(line);
+  } catch (e) {
+    console.error('worker.js 请求解析失败:', e.message);
+    return;
+  }
+
+  const { id, op, payload } = req;
+  const handler = handlers[op];
+  if (!handler) {
+    reply({ id, ok: false, error: `未知操作: ${op}` });
+    return;
+  }
+
+  inflight++;
+  try {
+    const { result, meta } = await handler(payload || {});
+    reply({ id, ok: true, result, meta });
+  } catch (err) {
+    reply({ id, ok: false, error: err.message || String(err) });
+  } finally {
+    inflight--;
+    if (closing && inflight === 0) process.exit(0);
+  }
+});
+
+// Python 端关闭 stdin 后，等进行中的请求完成再退出
+rl.on('close', () => {
+  closing = true;
+  if (inflight === 0) process.exit(0);
+});